@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Нужен для потока событий /api/order-events/ (SSE). Запуск:
+    uvicorn ecoprint.asgi:application --workers 2
+WSGI (gunicorn ecoprint.wsgi) продолжает работать: без ASGI страница
+заказов получает изменения опросом /api/orders/changes/.
 """
 
 import os
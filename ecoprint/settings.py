@@ -41,6 +41,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Метрики запросов и Server-Timing (первым - чтобы мерить всю цепочку)
+    'orders.metrics.MetricsMiddleware',
+    # Поиск N+1 запросов (выключен, пока QUERY_GUARD_THRESHOLD = 0)
+    'orders.query_guard.QueryGuardMiddleware',
     'django.middleware.security.SecurityMiddleware',
     # --- WhiteNoise Middleware (для раздачи статики) ---
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -143,6 +147,13 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# --- Поиск N+1 запросов (orders/query_guard.py) ---
+# Для разработки и staging: если запрос одной формы повторяется в одном
+# HTTP-запросе больше QUERY_GUARD_THRESHOLD раз, в лог пишется стек вызова
+# (а с QUERY_GUARD_RAISE=True запрос падает с ошибкой). 0 - выключено.
+QUERY_GUARD_THRESHOLD = int(os.environ.get('QUERY_GUARD_THRESHOLD', '0'))
+QUERY_GUARD_RAISE = os.environ.get('QUERY_GUARD_RAISE', 'False') == 'True'
+
 # --- Настройки входа / выхода ---
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
@@ -8,6 +8,7 @@ from django.contrib.auth import views as auth_views
 # Импорты для медиа-файлов
 from django.conf import settings
 from django.conf.urls.static import static
+from orders.images import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -30,5 +31,6 @@ urlpatterns = [
 ]
 
 # "Включаем" раздачу /media/ файлов, пока DEBUG = True
+# (уменьшенные копии изображений - с вечным кэшем, см. orders/images.py)
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, view=serve_media, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,7 +1,8 @@
 # D:\Projects\EcoPrint\orders\admin.py (ПОЛНЫЙ ИСПРАВЛЕННЫЙ КОД)
 
 from django.contrib import admin
-from .models import Order, Item, Profile, Product, CompanySettings, TelegramSettings
+from .models import (Order, Item, ArchivedItem, Profile, Product, CompanySettings,
+                     TelegramSettings, Task)
 
 # Эта строка "показывает" вашу модель Item внутри страницы заказа
 class ItemInline(admin.TabularInline):
@@ -16,7 +17,10 @@ class ItemInline(admin.TabularInline):
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     # --- 👇 ИЗМЕНЕНИЕ: Убрали 'responsible_user' отсюда ---
-    list_display = ('id', 'client', 'status', 'created_at')
+    list_display = ('id', 'client', 'status', 'items_ready', 'items_total', 'created_at')
+    
+    # Статус и счетчики товаров считаются автоматически
+    readonly_fields = ('status', 'items_total', 'items_ready', 'items_in_progress', 'items_not_ready')
     
     # --- 👇 ИЗМЕНЕНИЕ: Убрали 'responsible_user' отсюда ---
     list_filter = ('status', 'created_at') 
@@ -24,6 +28,20 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ('client',)
     inlines = [ItemInline] # Добавляет товары прямо на страницу заказа
 
+# (Архив товаров - только просмотр, переносит туда ArchivedItem.archive())
+@admin.register(ArchivedItem)
+class ArchivedItemAdmin(admin.ModelAdmin):
+    list_display = ('item_id', 'name', 'quantity', 'order', 'status', 'ready_at', 'archived_at')
+    list_filter = ('status', 'archived_at')
+    search_fields = ('name', 'order__client')
+    list_select_related = ('order',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 # --- (Мы также должны зарегистрировать наши новые модели, чтобы видеть их в админке) ---
 
 @admin.register(Product)
@@ -37,4 +55,11 @@ admin.site.register(Profile)
 
 # (Регистрируем Singleton-модели, чтобы их можно было редактировать)
 admin.site.register(CompanySettings)
-admin.site.register(TelegramSettings)
\ No newline at end of file
+admin.site.register(TelegramSettings)
+
+# (Очередь фоновых задач - чтобы видеть ошибки отправки уведомлений)
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'attempts', 'run_at', 'created_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('created_at', 'finished_at', 'locked_at', 'last_error')
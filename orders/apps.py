@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from .metrics import install_query_recorder
+        from .query_guard import install_query_guard
+
+        # Счетчик SQL для метрик (см. orders/metrics.py) и поиск N+1
+        # (orders/query_guard.py) на каждом соединении
+        connection_created.connect(install_query_recorder)
+        connection_created.connect(install_query_guard)
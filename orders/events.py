@@ -0,0 +1,145 @@
+# D:\Projects\EcoPrint\orders\events.py
+
+import asyncio
+import json
+import threading
+
+from django.db import connection, connections, transaction
+
+# Канал PostgreSQL LISTEN/NOTIFY для событий заказов
+CHANNEL = 'order_changes'
+
+# Сколько событий может ждать один медленный подписчик; лишние отбрасываются -
+# событие лишь "звонок", данные клиент берет из /api/orders/changes/
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Через сколько секунд переподключаться к базе, если LISTEN-соединение упало
+LISTEN_RECONNECT_DELAY = 5
+
+
+def publish_order_event(order_id, kind='changed'):
+    """
+    Сообщает подписчикам SSE, что заказ изменился (kind='changed')
+    или удален (kind='deleted'). Событие уходит только после COMMIT:
+    NOTIFY в PostgreSQL транзакционный, для других баз - on_commit.
+    """
+    payload = json.dumps({'type': f'order.{kind}', 'order_id': order_id})
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+    else:
+        # Без LISTEN/NOTIFY событие увидят только подписчики этого процесса
+        transaction.on_commit(lambda: broker.publish(payload))
+
+
+class EventBroker:
+    """
+    Раздает события подписчикам (SSE-соединениям) внутри процесса.
+    Подписчики живут в event loop ASGI-сервера; publish() можно вызывать
+    из любого потока. На PostgreSQL события приходят через LISTEN на одном
+    соединении на процесс, поэтому их видят подписчики всех процессов.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._loop = None
+        self._lock = threading.Lock()
+        self._listen_connection = None
+        self._listen_loop = None
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    async def subscribe(self):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._subscribers.add(queue)
+        # LISTEN-соединение привязано к event loop; новый loop (перезапуск
+        # сервера в том же процессе, тесты) требует нового соединения
+        if connections['default'].vendor == 'postgresql' and self._listen_loop is not self._loop:
+            await self._start_listening()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers.discard(queue)
+
+    def publish(self, payload):
+        with self._lock:
+            loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._fan_out, payload)
+
+    def _fan_out(self, payload):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                pass
+
+    # === LISTEN на PostgreSQL ===
+    async def _start_listening(self):
+        import psycopg2
+
+        loop = asyncio.get_running_loop()
+        if self._listen_connection is not None and self._listen_connection is not True:
+            self._listen_connection.close()
+        self._listen_connection = True  # Защита от параллельного запуска
+        self._listen_loop = loop
+        params = connections['default'].get_connection_params()
+        try:
+            listen_connection = await loop.run_in_executor(None, lambda: psycopg2.connect(**params))
+            listen_connection.autocommit = True
+            with listen_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+        except psycopg2.Error:
+            self._listen_connection = None
+            self._listen_loop = None
+            loop.call_later(LISTEN_RECONNECT_DELAY, self._restart_listening)
+            return
+
+        self._listen_connection = listen_connection
+        loop.add_reader(listen_connection.fileno(), self._read_notifies)
+
+    def _read_notifies(self):
+        import psycopg2
+
+        listen_connection = self._listen_connection
+        try:
+            listen_connection.poll()
+        except psycopg2.Error:
+            # Соединение потеряно: переподключаемся, а клиентам сообщаем,
+            # что часть событий могла пропасть
+            loop = asyncio.get_running_loop()
+            loop.remove_reader(listen_connection.fileno())
+            listen_connection.close()
+            self._listen_connection = None
+            self._listen_loop = None
+            self._fan_out(json.dumps({'type': 'resync'}))
+            loop.call_later(LISTEN_RECONNECT_DELAY, self._restart_listening)
+            return
+
+        while listen_connection.notifies:
+            self._fan_out(listen_connection.notifies.pop(0).payload)
+
+    def stop_listening(self):
+        """Закрывает LISTEN-соединение (при остановке процесса, в тестах)."""
+        listen_connection, loop = self._listen_connection, self._listen_loop
+        self._listen_connection = None
+        self._listen_loop = None
+        if listen_connection is None or listen_connection is True:
+            return
+        if loop is not None and not loop.is_closed():
+            loop.remove_reader(listen_connection.fileno())
+        listen_connection.close()
+
+    def _restart_listening(self):
+        if self._subscribers and self._listen_loop is None:
+            asyncio.ensure_future(self._start_listening())
+
+
+# Один брокер на процесс
+broker = EventBroker()
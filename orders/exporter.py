@@ -0,0 +1,161 @@
+# D:\Projects\EcoPrint\orders\exporter.py
+
+import csv
+import heapq
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Order, Item, ArchivedItem, Product
+
+# Строк из базы за один FETCH (память не зависит от размера выгрузки)
+EXPORT_CHUNK_SIZE = 2000
+
+# Сколько строк CSV отдавать клиенту одним куском
+CSV_LINES_PER_CHUNK = 500
+
+# Размер куска при отдаче готового XLSX-файла
+XLSX_BLOCK_SIZE = 64 * 1024
+
+# Заголовки совпадают с колонками импорта (orders/importer.py):
+# выгрузку можно загрузить обратно
+EXPORT_COLUMNS = [
+    "Заказ", "Клиент", "Создан", "Статус заказа", "ID товара", "Товар", "Категория",
+    "Количество", "Срок", "Статус", "Готов", "Комментарий", "Ответственный", "В архиве",
+]
+
+ARCHIVE_MODES = ('include', 'exclude', 'only')
+
+# С этих символов Excel начинает формулу: "=HYPERLINK(...)" в имени клиента
+# выполнился бы на машине бухгалтера. Такой текст выгружается с "'" впереди
+# (импорт этот апостроф снимает, см. importer.unescape_formula)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+ORDER_STATUS_LABELS = dict(Order.STATUS_CHOICES)
+ITEM_STATUS_LABELS = dict(Item.STATUS_CHOICES)
+CATEGORY_LABELS = dict(Product.CATEGORY_CHOICES)
+
+
+def _item_rows(model, id_field, order_filter):
+    """Товары (model - Item или ArchivedItem) по порядку (order_id, ID товара)."""
+    category = Product.objects.filter(name=OuterRef('name')).order_by('id').values('category')[:1]
+    return model.objects.filter(**order_filter) \
+                        .annotate(category=Subquery(category)) \
+                        .order_by('order_id', id_field) \
+                        .values_list(
+                            'order_id', 'order__client', 'order__created_at', 'order__status',
+                            id_field, 'name', 'category', 'quantity', 'deadline', 'status',
+                            'ready_at', 'comment', 'responsible_user__username',
+                            'responsible_user__first_name', 'responsible_user__last_name',
+                        ) \
+                        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def export_rows(order_filter, archive='include'):
+    """
+    Строки выгрузки (списки значений в порядке EXPORT_COLUMNS): один товар -
+    одна строка, активные и архивные товары вперемешку по заказам.
+    order_filter - условия на товары ({'order__status': ...}).
+    Обе таблицы читаются курсором и сливаются по (заказ, товар) без
+    загрузки в память.
+    """
+    sources = []
+    if archive != 'only':
+        sources.append(((*row, False) for row in _item_rows(Item, 'id', order_filter)))
+    if archive != 'exclude':
+        sources.append(((*row, True) for row in _item_rows(ArchivedItem, 'item_id', order_filter)))
+
+    for row in heapq.merge(*sources, key=lambda row: (row[0], row[4])):
+        (order_id, client, created_at, order_status, item_id, name, category, quantity, deadline,
+         status, ready_at, comment, username, first_name, last_name, archived) = row
+        yield [escape_formula(value) for value in (
+            order_id,
+            client,
+            _format_datetime(created_at),
+            ORDER_STATUS_LABELS.get(order_status, order_status),
+            item_id,
+            name,
+            CATEGORY_LABELS.get(category, category or ''),
+            quantity,
+            deadline.isoformat() if deadline else '',
+            ITEM_STATUS_LABELS.get(status, status),
+            _format_datetime(ready_at),
+            comment or '',
+            f"{first_name or ''} {last_name or ''}".strip() or username or '',
+            "да" if archived else "нет",
+        )]
+
+
+def escape_formula(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _format_datetime(value):
+    return timezone.localtime(value).strftime('%Y-%m-%d %H:%M') if value else ''
+
+
+# === CSV ===
+class _Echo:
+    """Псевдофайл для csv.writer: write() просто возвращает строку."""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(rows):
+    """
+    CSV для Excel (UTF-8 с BOM, разделитель ';') кусками по
+    CSV_LINES_PER_CHUNK строк.
+    """
+    writer = csv.writer(_Echo(), delimiter=';')
+    yield '\ufeff' + writer.writerow(EXPORT_COLUMNS)
+    rows = iter(rows)
+    while True:
+        lines = [writer.writerow(row) for row in islice(rows, CSV_LINES_PER_CHUNK)]
+        if not lines:
+            break
+        yield ''.join(lines)
+
+
+async def async_chunks(chunks):
+    """
+    Отдает синхронный генератор кусков под ASGI. Синхронный итератор Django
+    под ASGI сначала прочитал бы целиком в память; здесь каждый кусок
+    берется в потоке для синхронного кода (там же живет соединение с базой).
+    """
+    chunks = iter(chunks)
+    next_chunk = sync_to_async(lambda: next(chunks, None))
+    while True:
+        chunk = await next_chunk()
+        if chunk is None:
+            break
+        yield chunk
+
+
+# === XLSX ===
+def write_xlsx(rows, file):
+    """
+    Пишет XLSX в file. Режим write_only: строки сбрасываются во временный
+    файл на диске, в памяти не копятся.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Заказы")
+    sheet.append(EXPORT_COLUMNS)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(file)
+
+
+def file_chunks(file, block_size=XLSX_BLOCK_SIZE):
+    """Читает файл кусками и закрывает его (временный файл при этом удаляется)."""
+    try:
+        while chunk := file.read(block_size):
+            yield chunk
+    finally:
+        file.close()
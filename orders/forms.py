@@ -76,7 +76,14 @@ class TelegramSettingsForm(forms.ModelForm):
     
     class Meta:
         model = TelegramSettings
-        fields = ['bot_token', 'chat_id']
+        fields = ['bot_token', 'chat_id', 'digest_window', 'digest_max_length']
+        help_texts = {
+            'digest_window': "Например, 30: новые заказы за 30 секунд придут одним сообщением.",
+            'digest_max_length': (
+                f"От {TelegramSettings.DIGEST_MIN_LENGTH} до {TelegramSettings.MESSAGE_MAX_LENGTH}: "
+                f"Telegram не принимает сообщения длиннее {TelegramSettings.MESSAGE_MAX_LENGTH} символов."
+            ),
+        }
     
 
 class ProductForm(forms.ModelForm):
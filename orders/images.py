@@ -0,0 +1,170 @@
+# D:\Projects\EcoPrint\orders\images.py
+
+import hashlib
+import posixpath
+import warnings
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.views.static import serve
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Больше загружать нельзя: телефонные фото - 3-8 МБ
+IMAGE_MAX_UPLOAD_SIZE = 15 * 1024 * 1024
+
+# Защита от "бомб": маленький файл, который при декодировании занимает
+# гигабайты (PNG 50000x50000 весит килобайты). Размер проверяется по
+# заголовку, до декодирования. 40 Мп в RGBA - около 160 МБ памяти;
+# JPEG декодируется сразу в уменьшенном масштабе (draft), много меньше.
+IMAGE_MAX_PIXELS = 40_000_000
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+
+# Варианты изображений: имя -> (ширина, высота).
+# Размеры - удвоенные размеры на странице (для экранов HiDPI).
+# crop=True - обрезать до квадрата (аватар), иначе вписать с сохранением пропорций.
+THUMBNAIL_SPECS = {
+    'avatar': {
+        'crop': True,
+        'sizes': {'sm': (96, 96), 'md': (300, 300)},  # шапка 44px, профиль 150px
+        'main': 'md',
+    },
+    'logo': {
+        'crop': False,
+        'sizes': {'sm': (400, 160), 'lg': (1200, 480)},  # настройки / печать счетов
+        'main': 'lg',
+    },
+}
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+# Варианты лежат в <папка поля>/thumbs/ под хешем содержимого: файл по
+# имени никогда не меняется, браузер может кэшировать его навсегда
+THUMBNAILS_DIR = 'thumbs'
+THUMBNAIL_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def open_image(file):
+    """
+    Открывает изображение Pillow, не декодируя пиксели. Отклоняет
+    неизвестные форматы и слишком большие по числу пикселей (ValidationError).
+    """
+    try:
+        with warnings.catch_warnings():
+            # Pillow только предупреждает о "бомбе" до 2 * MAX_IMAGE_PIXELS
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            image = Image.open(file)
+    except (UnidentifiedImageError, Image.DecompressionBombWarning, Image.DecompressionBombError, OSError):
+        raise ValidationError("Файл не является изображением или поврежден.")
+
+    if image.format not in ALLOWED_FORMATS:
+        raise ValidationError("Поддерживаются изображения JPEG, PNG, WebP и GIF.")
+    width, height = image.size
+    if width * height > IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f"Слишком большое изображение ({width}x{height}): не больше {IMAGE_MAX_PIXELS // 1_000_000} Мп."
+        )
+    return image
+
+
+def validate_image_upload(value):
+    """Валидатор ImageField: проверяет только новые (еще не сохраненные) файлы."""
+    if not value or getattr(value, '_committed', True):
+        return
+    if value.size > IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(f"Файл больше {IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)} МБ.")
+    value.seek(0)
+    open_image(value)
+    value.seek(0)
+
+
+def build_thumbnails(file, kind, directory):
+    """
+    Декодирует изображение один раз и сохраняет варианты THUMBNAIL_SPECS[kind]
+    в WebP и в JPEG (PNG - если есть прозрачность) в default_storage.
+    Возвращает (имя основного файла, варианты) - варианты
+    {'sm': {'webp': имя, 'fallback': имя, 'width': .., 'height': ..}, ...}.
+    Файл с тем же содержимым повторно не записывается.
+    """
+    spec = THUMBNAIL_SPECS[kind]
+    data = file.read()
+    if len(data) > IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(f"Файл больше {IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)} МБ.")
+    digest = hashlib.sha256(data).hexdigest()[:20]
+
+    image = open_image(BytesIO(data))
+    if image.format == 'JPEG':
+        # Декодер JPEG умеет сразу уменьшать в 2/4/8 раз - в памяти
+        # оказывается не вся фотография, а только нужный масштаб
+        largest = max(spec['sizes'].values())
+        image.draft('RGB', largest)
+    try:
+        image.load()
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError("Файл не является изображением или поврежден.")
+    image = ImageOps.exif_transpose(image)
+
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    variants = {}
+    for size_name, size in spec['sizes'].items():
+        if spec['crop']:
+            resized = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+        else:
+            resized = image.copy()
+            resized.thumbnail(size, Image.Resampling.LANCZOS)
+
+        base = posixpath.join(directory, THUMBNAILS_DIR, f"{digest}_{size_name}")
+        webp_name = _save_variant(resized, f"{base}.webp", 'WEBP', quality=WEBP_QUALITY, method=6)
+        if has_alpha:
+            fallback_name = _save_variant(resized, f"{base}.png", 'PNG', optimize=True)
+        else:
+            fallback_name = _save_variant(resized, f"{base}.jpg", 'JPEG', quality=JPEG_QUALITY,
+                                          optimize=True, progressive=True)
+        variants[size_name] = {
+            'webp': webp_name,
+            'fallback': fallback_name,
+            'width': resized.width,
+            'height': resized.height,
+        }
+    return variants[spec['main']]['fallback'], variants
+
+
+def _save_variant(image, name, image_format, **options):
+    if default_storage.exists(name):
+        return name
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def process_image_field(instance, field_name, kind):
+    """
+    Для нового загруженного файла в поле field_name: сохраняет варианты,
+    в само поле кладет основной вариант (исходник не хранится), имена
+    вариантов - в поле '<field_name>_thumbnails'. Вызывается из save() модели.
+    """
+    field_file = getattr(instance, field_name)
+    if not field_file or field_file._committed:
+        return
+    directory = instance._meta.get_field(field_name).upload_to.rstrip('/')
+    field_file.seek(0)
+    main_name, variants = build_thumbnails(field_file, kind, directory)
+    setattr(instance, field_name, main_name)
+    setattr(instance, f'{field_name}_thumbnails', variants)
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    Раздача /media/ (как django.views.static.serve) с вечным кэшем для
+    вариантов изображений. На боевом веб-сервере для */thumbs/* нужен
+    тот же заголовок THUMBNAIL_CACHE_CONTROL.
+    """
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if f'/{THUMBNAILS_DIR}/' in f'/{path}' and response.status_code == 200:
+        response['Cache-Control'] = THUMBNAIL_CACHE_CONTROL
+    return response
@@ -0,0 +1,327 @@
+# D:\Projects\EcoPrint\orders\importer.py
+
+import csv
+import io
+import math
+from collections import Counter
+from datetime import date, datetime
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .events import publish_order_event
+from .exporter import FORMULA_PREFIXES
+from .models import Order, Item, Product, DailyStats, DailyProductStats
+
+# Сколько строк файла проверять и записывать за одну транзакцию
+IMPORT_BATCH_SIZE = 1000
+
+# Больше ошибок в отчет не кладем (счетчик ошибок при этом полный)
+MAX_REPORTED_ERRORS = 1000
+
+# Заголовок колонки (в нижнем регистре) -> поле строки импорта
+COLUMN_ALIASES = {
+    'client': 'client', 'клиент': 'client',
+    'order': 'order', 'заказ': 'order', 'номер заказа': 'order',
+    'name': 'name', 'item': 'name', 'товар': 'name', 'название': 'name',
+    'quantity': 'quantity', 'количество': 'quantity', 'кол-во': 'quantity',
+    'deadline': 'deadline', 'срок': 'deadline', 'срок сдачи': 'deadline',
+    'status': 'status', 'статус': 'status',
+    'comment': 'comment', 'комментарий': 'comment',
+    'responsible': 'responsible', 'ответственный': 'responsible',
+}
+REQUIRED_COLUMNS = ('client', 'name')
+
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%d.%m.%y')
+
+# Сколько байт начала CSV смотреть, чтобы определить кодировку
+CSV_SNIFF_SIZE = 64 * 1024
+
+
+class ImportFileError(Exception):
+    """Файл нельзя прочитать: неизвестный формат, нет обязательных колонок."""
+
+
+# === Чтение файлов (построчно, файл целиком в память не грузится) ===
+def iter_rows(file, filename):
+    """
+    Строки файла как (номер строки, {поле: значение}) по расширению имени:
+    .csv (UTF-8, разделитель ';' или ',') или .xlsx (первый лист).
+    Первая строка - заголовки колонок (см. COLUMN_ALIASES).
+    """
+    extension = filename.lower().rsplit('.', 1)[-1]
+    if extension == 'csv':
+        rows = _iter_csv(file)
+    elif extension == 'xlsx':
+        rows = _iter_xlsx(file)
+    else:
+        raise ImportFileError("Поддерживаются файлы .csv и .xlsx.")
+
+    header = next(rows, None)
+    if header is None:
+        raise ImportFileError("Файл пустой.")
+    fields = [COLUMN_ALIASES.get(str(title or '').strip().lower()) for title in header]
+    missing = [column for column in REQUIRED_COLUMNS if column not in fields]
+    if missing:
+        raise ImportFileError(f"Нет обязательных колонок: {', '.join(missing)}.")
+
+    for number, values in enumerate(rows, start=2):
+        row = {field: unescape_formula(value) for field, value in zip(fields, values) if field}
+        # Пустые строки (часто в конце таблицы) пропускаем
+        if any(value not in (None, '') for value in row.values()):
+            yield number, row
+
+
+def unescape_formula(value):
+    """Снимает "'", которым выгрузка (exporter.escape_formula) защищает формулы."""
+    if isinstance(value, str) and value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
+
+
+def _iter_csv(file):
+    text = io.TextIOWrapper(file, encoding=_detect_csv_encoding(file), newline='')
+    try:
+        first_line = text.readline()
+        # Excel в русской локали сохраняет CSV через ';'
+        delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+        yield next(csv.reader([first_line], delimiter=delimiter), [])
+        yield from csv.reader(text, delimiter=delimiter)
+    except UnicodeDecodeError:
+        raise ImportFileError("Не удалось прочитать CSV: сохраните файл в кодировке UTF-8.")
+    except csv.Error as e:
+        raise ImportFileError(f"Ошибка в CSV: {e}")
+
+
+def _detect_csv_encoding(file):
+    """
+    UTF-8 (с BOM или без) или cp1251 - так сохраняет "CSV (разделители -
+    запятые)" Excel в русской Windows. Решаем по началу файла.
+    """
+    head = file.read(CSV_SNIFF_SIZE)
+    file.seek(0)
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # Многобайтный символ мог обрезаться на границе прочитанного куска
+        if e.start < len(head) - 3:
+            return 'cp1251'
+    return 'utf-8-sig'
+
+
+def _iter_xlsx(file):
+    from openpyxl import load_workbook
+
+    # read_only: строки читаются из XML по мере обхода
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFileError(f"Не удалось открыть XLSX: {e}") from e
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+# === Импорт ===
+class OrderImporter:
+    """
+    Импорт заказов из строк таблицы: одна строка - один товар.
+    Строки одного заказа идут подряд и имеют одинаковые 'order'
+    (если колонки нет - одинакового клиента). Заказ с ошибкой хотя бы
+    в одной строке не создается целиком.
+
+    Пользователи и ассортимент загружаются в словари один раз;
+    заказы и товары пишутся bulk_create пачками по batch_size строк,
+    каждая пачка - отдельная транзакция. Сигналы при этом не вызываются,
+    поэтому счетчики заказов, дневная статистика и событие для SSE
+    записываются здесь же, одним запросом на пачку.
+    """
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.rows = 0
+        self.orders_created = 0
+        self.items_created = 0
+        self.error_count = 0
+        self.errors = []
+
+        self.statuses = {}
+        for code, label in Item.STATUS_CHOICES:
+            self.statuses[code] = code
+            self.statuses[label.lower()] = code
+        self.users = {}
+        for user_id, username, first_name, last_name in User.objects.filter(is_active=True) \
+                .values_list('id', 'username', 'first_name', 'last_name'):
+            full_name = f"{first_name} {last_name}".strip().lower()
+            if full_name:
+                self.users.setdefault(full_name, user_id)
+            self.users[username.lower()] = user_id
+        # Название из ассортимента - в написании каталога
+        self.products = {name.lower(): name for name in Product.objects.values_list('name', flat=True)}
+
+    def run(self, rows):
+        """rows - итератор (номер строки, {поле: значение}). Возвращает отчет."""
+        batch = []
+        batch_rows = 0
+        current_key = None
+        current = None
+        for number, row in rows:
+            self.rows += 1
+            key = str(row.get('order') or row.get('client') or '').strip()
+            if current is None or key != current_key:
+                # Пачка закрывается только на границе заказов
+                if batch_rows >= self.batch_size:
+                    self._flush(batch)
+                    batch, batch_rows = [], 0
+                current_key = key
+                current = {'client': str(row.get('client') or '').strip(), 'items': [], 'bad_rows': []}
+                batch.append(current)
+
+            item, errors = self._validate(row)
+            if errors:
+                self._error(number, errors)
+                current['bad_rows'].append(number)
+            else:
+                current['items'].append((number, item))
+            batch_rows += 1
+        self._flush(batch)
+        return self.report()
+
+    def report(self):
+        return {
+            'rows': self.rows,
+            'orders_created': self.orders_created,
+            'items_created': self.items_created,
+            'error_count': self.error_count,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+            'dry_run': self.dry_run,
+        }
+
+    def _error(self, number, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': number, 'errors': errors})
+
+    def _validate(self, row):
+        errors = {}
+        client = str(row.get('client') or '').strip()
+        if not client:
+            errors['client'] = "Не указан клиент."
+        elif len(client) > Order._meta.get_field('client').max_length:
+            errors['client'] = "Слишком длинное имя клиента."
+
+        name = str(row.get('name') or '').strip()
+        if not name:
+            errors['name'] = "Не указан товар."
+        elif len(name) > Item._meta.get_field('name').max_length:
+            errors['name'] = "Слишком длинное название товара."
+        name = self.products.get(name.lower(), name)
+
+        quantity = row.get('quantity')
+        if quantity in (None, ''):
+            quantity = 1
+        else:
+            try:
+                quantity = float(str(quantity).replace(',', '.'))
+            except ValueError:
+                quantity = 0
+            if not math.isfinite(quantity) or quantity < 1 or quantity != int(quantity):
+                quantity = 0
+                errors['quantity'] = "Количество - целое число от 1."
+            quantity = int(quantity)
+
+        deadline = row.get('deadline')
+        if isinstance(deadline, datetime):
+            deadline = deadline.date()
+        elif deadline not in (None, '') and not isinstance(deadline, date):
+            deadline = self._parse_date(str(deadline).strip())
+            if deadline is None:
+                errors['deadline'] = "Дата в формате ГГГГ-ММ-ДД или ДД.ММ.ГГГГ."
+        deadline = deadline or None
+
+        status = str(row.get('status') or '').strip().lower() or 'not-ready'
+        if status not in self.statuses:
+            errors['status'] = "Неизвестный статус."
+        status = self.statuses.get(status)
+
+        responsible_id = None
+        responsible = str(row.get('responsible') or '').strip()
+        if responsible:
+            responsible_id = self.users.get(responsible.lower())
+            if responsible_id is None:
+                errors['responsible'] = f"Пользователь '{responsible}' не найден."
+
+        if errors:
+            return None, errors
+        return Item(
+            name=name,
+            quantity=quantity,
+            deadline=deadline,
+            status=status,
+            comment=str(row.get('comment') or '').strip(),
+            responsible_user_id=responsible_id,
+        ), None
+
+    @staticmethod
+    def _parse_date(value):
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(value, date_format).date()
+            except ValueError:
+                continue
+        return None
+
+    def _flush(self, batch):
+        orders = []
+        items = []
+        for entry in batch:
+            if entry['bad_rows']:
+                # Заказ целиком не создается: отмечаем и его правильные строки
+                for number, _ in entry['items']:
+                    self._error(number, {'order': f"Заказ пропущен из-за ошибки в строке {entry['bad_rows'][0]}."})
+                continue
+            statuses = Counter(item.status for _, item in entry['items'])
+            total = sum(statuses.values())
+            order = Order(
+                client=entry['client'],
+                items_total=total,
+                items_ready=statuses['ready'],
+                items_in_progress=statuses['in-progress'],
+                items_not_ready=statuses['not-ready'],
+                status=Order.derive_status(total, statuses['ready'], statuses['in-progress']),
+            )
+            orders.append(order)
+            for _, item in entry['items']:
+                item.order = order
+                item.sync_ready_at()
+                items.append(item)
+
+        if not orders:
+            return
+        if self.dry_run:
+            self.orders_created += len(orders)
+            self.items_created += len(items)
+            return
+
+        with transaction.atomic():
+            Order.objects.bulk_create(orders)
+            for item in items:
+                item.order_id = item.order.pk
+            Item.objects.bulk_create(items)
+
+            # bulk_create не вызывает сигналы: статистику пишем за всю пачку сразу
+            order_statuses = Counter(order.status for order in orders)
+            DailyStats.bump(
+                timezone.localdate(),
+                orders_created=len(orders),
+                **{DailyStats.STATUS_DELTA_FIELDS[status]: count for status, count in order_statuses.items()}
+            )
+            DailyProductStats.record(added=[item.name for item in items])
+            # Одного события достаточно: клиент заберет все изменения из ленты
+            publish_order_event(orders[-1].pk)
+
+        self.orders_created += len(orders)
+        self.items_created += len(items)
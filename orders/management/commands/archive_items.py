@@ -0,0 +1,93 @@
+# D:\Projects\EcoPrint\orders\management\commands\archive_items.py
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+from orders.models import Item, ArchivedItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит в архив товары, готовые больше --days дней (по ready_at). "
+        "Работает пачками: каждая пачка - отдельная короткая транзакция, "
+        "поэтому таблица товаров не блокируется надолго. "
+        "Запускайте по расписанию (cron), например раз в ночь."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help="Архивировать товары, готовые больше стольких дней (по умолчанию 30)."
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Сколько товаров переносить за одну транзакцию (по умолчанию 500)."
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.0,
+            help="Пауза в секундах между пачками, чтобы не мешать работе днем."
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Только посчитать, что будет перенесено, ничего не менять."
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError("--days не может быть отрицательным, --batch-size должен быть больше 0.")
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        condition = Q(status='ready', ready_at__lt=cutoff)
+        dry_run = options['dry_run']
+        batch_size = options['batch_size']
+
+        total = 0
+        batches = 0
+        started = time.monotonic()
+        last = None
+        while True:
+            # Keyset по (ready_at, id) - индекс item_ready_at_idx, без OFFSET
+            candidates = Item.objects.filter(condition)
+            if last is not None:
+                candidates = candidates.filter(
+                    Q(ready_at__gt=last[0]) | Q(ready_at=last[0], pk__gt=last[1])
+                )
+            batch = list(candidates.order_by('ready_at', 'pk').values_list('ready_at', 'pk')[:batch_size])
+            if not batch:
+                break
+            last = batch[-1]
+
+            batch_started = time.monotonic()
+            if dry_run:
+                processed = len(batch)
+            else:
+                processed = ArchivedItem.archive([pk for _, pk in batch], condition=condition)
+            elapsed = time.monotonic() - batch_started
+
+            batches += 1
+            total += processed
+            self.stdout.write(
+                f"Пачка {batches}: {processed} товаров, {self._rate(processed, elapsed)} строк/с"
+            )
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        elapsed = time.monotonic() - started
+        verb = "Будет перенесено" if dry_run else "Перенесено в архив"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb}: {total} товаров за {elapsed:.1f} с ({self._rate(total, elapsed)} строк/с)."
+        ))
+
+    @staticmethod
+    def _rate(rows, seconds):
+        return round(rows / seconds) if seconds > 0 else rows
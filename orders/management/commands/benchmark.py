@@ -0,0 +1,287 @@
+# D:\Projects\EcoPrint\orders\management\commands\benchmark.py
+
+import json
+import math
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from orders.models import Order, Item, Product, Profile
+
+# Статусы товаров по возрасту заказа: старые заказы почти все сданы
+STATUS_WEIGHTS = [
+    # (возраст заказа до N дней, веса not-ready / in-progress / ready)
+    (7, (50, 40, 10)),
+    (30, (20, 30, 50)),
+    (None, (5, 5, 90)),
+]
+STATUSES = ('not-ready', 'in-progress', 'ready')
+
+PRODUCT_NAMES = ["Визитки", "Буклеты", "Листовки", "Баннер", "Плакат", "Календарь",
+                 "Блокнот", "Пакет", "Коробка", "Кружка", "Футболка", "Наклейки"]
+QUANTITIES = [50, 100, 250, 500, 1000]
+COMMENTS = ["Срочно", "Логотип клиента", "Матовая ламинация", "Согласовать макет"]
+
+SEED_BATCH_SIZE = 5000
+
+# Сколько запросов сценария выполнить под tracemalloc (он замедляет код,
+# поэтому память меряется отдельным проходом, а не вместе с временем)
+MEMORY_PASSES = 3
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный замер API: заполняет базу синтетическими данными и "
+        "замеряет основные запросы через тестовый клиент Django. "
+        "Печатает JSON с p50/p95/p99 (мс), числом SQL-запросов и пиковой "
+        "памятью по каждому сценарию - результаты разных коммитов можно "
+        "сравнивать. По умолчанию работает в отдельной временной базе."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=100_000, help="Число заказов (по умолчанию 100000).")
+        parser.add_argument('--items', type=int, default=500_000, help="Число товаров (по умолчанию 500000).")
+        parser.add_argument('--users', type=int, default=50, help="Число пользователей (по умолчанию 50).")
+        parser.add_argument('--products', type=int, default=200, help="Число позиций ассортимента (по умолчанию 200).")
+        parser.add_argument('--requests', type=int, default=50, help="Замеров на сценарий (по умолчанию 50).")
+        parser.add_argument('--warmup', type=int, default=3, help="Прогревочных запросов на сценарий (не учитываются).")
+        parser.add_argument('--seed', type=int, default=42, help="Зерно генератора: одинаковые данные от запуска к запуску.")
+        parser.add_argument('--label', default='', help="Метка запуска в отчете (например, хеш коммита).")
+        parser.add_argument('--output', help="Записать JSON в файл, а не в stdout.")
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help="Не удалять временную базу и не заполнять ее повторно при следующем запуске."
+        )
+        parser.add_argument(
+            '--use-current-db',
+            action='store_true',
+            help="Заполнять и мерить текущую базу вместо временной (данные останутся в ней!)."
+        )
+
+    def handle(self, *args, **options):
+        if options['orders'] < 1 or options['users'] < 1 or options['products'] < 1 or options['requests'] < 1:
+            raise CommandError("--orders, --users, --products и --requests должны быть больше 0.")
+        if options['items'] < 0:
+            raise CommandError("--items не может быть отрицательным.")
+
+        old_name = None
+        if not options['use_current_db']:
+            old_name = self._create_benchmark_db(options['keepdb'])
+        try:
+            if options['use_current_db'] or not (options['keepdb'] and Order.objects.exists()):
+                self._seed(options)
+            report = self._run(options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(text + '\n')
+            self.stderr.write(f"Отчет записан в {options['output']}")
+        else:
+            self.stdout.write(text)
+
+    def _create_benchmark_db(self, keepdb):
+        """Отдельная база ('<имя>_benchmark'), как у тестов, но со своим именем."""
+        if connection.vendor != 'sqlite':
+            test_settings = connection.settings_dict.setdefault('TEST', {})
+            test_settings['NAME'] = f"{connection.settings_dict['NAME']}_benchmark"
+        self.stderr.write("Создание базы для замеров (миграции)...")
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb)
+        return old_name
+
+    # === Данные ===
+    def _seed(self, options):
+        rng = random.Random(options['seed'])
+        started = time.monotonic()
+        now = timezone.now()
+
+        # Пароли не хешируем (это секунды на каждого) - входим через force_login
+        users = User.objects.bulk_create([
+            User(username=f"bench_{options['seed']}_{n}", password=make_password(None))
+            for n in range(options['users'])
+        ])
+        Profile.objects.bulk_create([Profile(user=user) for user in users])
+
+        categories = [choice[0] for choice in Product.CATEGORY_CHOICES]
+        Product.objects.bulk_create([
+            Product(name=f"{PRODUCT_NAMES[n % len(PRODUCT_NAMES)]} {n // len(PRODUCT_NAMES) + 1}",
+                    category=categories[n % len(categories)])
+            for n in range(options['products'])
+        ])
+        product_names = list(Product.objects.values_list('name', flat=True))
+
+        # Заказы равномерно за последний год
+        order_dates = []
+        for start in range(0, options['orders'], SEED_BATCH_SIZE):
+            count = min(SEED_BATCH_SIZE, options['orders'] - start)
+            orders = Order.objects.bulk_create([Order(client=f"Клиент {rng.randint(1, 5000)}") for _ in range(count)])
+            for order in orders:
+                order.created_at = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+            # created_at - auto_now_add, при вставке его не задать
+            Order.objects.bulk_update(orders, ['created_at'], batch_size=1000)
+            order_dates += [(order.pk, order.created_at) for order in orders]
+            self.stderr.write(f"Заказы: {start + count}/{options['orders']}")
+
+        for start in range(0, options['items'], SEED_BATCH_SIZE):
+            count = min(SEED_BATCH_SIZE, options['items'] - start)
+            Item.objects.bulk_create([
+                self._random_item(rng, order_dates, users, product_names, now) for _ in range(count)
+            ])
+            self.stderr.write(f"Товары: {start + count}/{options['items']}")
+
+        # bulk_create не вызывает сигналы: счетчики заказов и дневные сводки пересчитываем
+        call_command('rebuild_order_counters', stdout=StringIO())
+        call_command('rebuild_daily_stats', stdout=StringIO())
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+        self.stderr.write(f"Данные созданы за {time.monotonic() - started:.1f} с.")
+
+    @staticmethod
+    def _random_item(rng, order_dates, users, product_names, now):
+        order_id, created_at = rng.choice(order_dates)
+        age_days = (now - created_at).days
+        weights = next(w for limit, w in STATUS_WEIGHTS if limit is None or age_days < limit)
+        status = rng.choices(STATUSES, weights)[0]
+        deadline = created_at + timedelta(days=rng.randint(1, 21))
+        ready_at = None
+        if status == 'ready':
+            ready_at = min(created_at + (deadline - created_at) * rng.random(), now)
+        return Item(
+            order_id=order_id,
+            name=rng.choice(product_names),
+            quantity=rng.choice(QUANTITIES),
+            status=status,
+            deadline=deadline.date(),
+            comment=rng.choice(COMMENTS) if rng.random() < 0.2 else '',
+            responsible_user=rng.choice(users) if rng.random() < 0.7 else None,
+            ready_at=ready_at,
+        )
+
+    # === Замеры ===
+    def _scenarios(self, rng, order_ids):
+        """Сценарий -> функция, возвращающая (метод, URL, тело) очередного запроса."""
+
+        def order_update():
+            return 'patch', f'/api/orders/{rng.choice(order_ids)}/', {'client': f"Клиент {rng.randint(1, 5000)}"}
+
+        def item_create():
+            # Отдельного создания товара в API нет: товар добавляется
+            # в заказ через items_write (существующие передаются по id)
+            order = Order.objects.prefetch_related('items').get(pk=rng.choice(order_ids))
+            items = [{'id': item.pk, 'name': item.name, 'quantity': item.quantity} for item in order.items.all()]
+            items.append({'name': "Визитки", 'quantity': rng.choice(QUANTITIES), 'status': 'not-ready'})
+            return 'patch', f'/api/orders/{order.pk}/', {'items_write': items}
+
+        def statistics_cold():
+            cache.clear()
+            return 'get', '/api/statistics-data/', None
+
+        return {
+            'orders_list': lambda: ('get', '/api/orders/', None),
+            'orders_list_filtered': lambda: ('get', '/api/orders/?status=in-progress&urgency=urgent', None),
+            'orders_search': lambda: ('get', f'/api/orders/search/?q=Клиент {rng.randint(1, 5000)}', None),
+            'order_retrieve': lambda: ('get', f'/api/orders/{rng.choice(order_ids)}/', None),
+            'order_update': order_update,
+            'item_create': item_create,
+            'statistics': lambda: ('get', '/api/statistics-data/', None),
+            'statistics_cold': statistics_cold,
+        }
+
+    def _run(self, options):
+        rng = random.Random(options['seed'])
+        user = User.objects.order_by('pk').last()
+        order_ids = list(Order.objects.values_list('pk', flat=True))
+        client = Client()
+        client.force_login(user)
+
+        report = {
+            'label': options['label'],
+            'database': connection.vendor,
+            'dataset': {
+                'orders': Order.objects.count(),
+                'items': Item.objects.count(),
+                'users': User.objects.count(),
+                'products': Product.objects.count(),
+            },
+            'requests_per_scenario': options['requests'],
+            'seed': options['seed'],
+            'scenarios': {},
+        }
+
+        # DEBUG=False - как в бою (иначе Django копит все SQL в памяти)
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for name, next_request in self._scenarios(rng, order_ids).items():
+                self.stderr.write(f"Сценарий {name}...")
+                report['scenarios'][name] = self._measure(client, next_request, options)
+        return report
+
+    def _measure(self, client, next_request, options):
+        timings = []
+        queries = []
+        for n in range(options['warmup'] + options['requests']):
+            method, url, data = next_request()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                self._send(client, method, url, data)
+                elapsed = time.perf_counter() - started
+            if n >= options['warmup']:
+                timings.append(elapsed * 1000)
+                queries.append(len(captured))
+
+        peak = 0
+        tracemalloc.start()
+        try:
+            for _ in range(MEMORY_PASSES):
+                method, url, data = next_request()
+                tracemalloc.reset_peak()
+                self._send(client, method, url, data)
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(sum(timings) / len(timings), 2),
+            'max_ms': round(timings[-1], 2),
+            'queries_min': min(queries),
+            'queries_max': max(queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    @staticmethod
+    def _send(client, method, url, data):
+        # secure=True: с DEBUG=False в настройках включен SECURE_SSL_REDIRECT
+        if data is None:
+            response = getattr(client, method)(url, secure=True)
+        else:
+            response = getattr(client, method)(url, data, content_type='application/json', secure=True)
+        if response.status_code >= 300:
+            raise CommandError(f"{method.upper()} {url}: HTTP {response.status_code} {response.content[:200]!r}")
+        return response
+
+
+def percentile(sorted_values, p):
+    """Перцентиль методом ближайшего ранга по отсортированному списку."""
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
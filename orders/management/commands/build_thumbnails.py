@@ -0,0 +1,68 @@
+# D:\Projects\EcoPrint\orders\management\commands\build_thumbnails.py
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from orders.images import build_thumbnails
+from orders.models import Profile, CompanySettings
+
+
+class Command(BaseCommand):
+    help = (
+        "Создает уменьшенные копии (WebP + JPEG/PNG) для уже загруженных "
+        "аватаров и логотипа компании, у которых их еще нет. "
+        "Исходные файлы не удаляются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help="Пересоздать копии и для уже обработанных изображений."
+        )
+
+    def handle(self, *args, **options):
+        # Один и тот же файл (аватар по умолчанию) декодируем один раз
+        self.processed = {}
+        self.done = 0
+        self.failed = 0
+
+        profiles = Profile.objects.exclude(avatar='').only('id', 'avatar', 'avatar_thumbnails')
+        if not options['force']:
+            profiles = profiles.filter(avatar_thumbnails={})
+        for profile in profiles.iterator():
+            result = self._build(profile.avatar, 'avatar', f"Профиль {profile.pk}")
+            if result is not None:
+                main_name, variants = result
+                Profile.objects.filter(pk=profile.pk).update(avatar=main_name, avatar_thumbnails=variants)
+
+        company = CompanySettings.load(use_cache=False)
+        if company.company_logo and (options['force'] or not company.company_logo_thumbnails):
+            result = self._build(company.company_logo, 'logo', "Логотип компании")
+            if result is not None:
+                company.company_logo, company.company_logo_thumbnails = result
+                company.save()  # save(), а не update(): меняет версию настроек для кэша
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Обработано изображений: {self.done}. Ошибок: {self.failed}."
+        ))
+
+    def _build(self, field_file, kind, label):
+        name = field_file.name
+        if name not in self.processed:
+            directory = field_file.field.upload_to.rstrip('/')
+            try:
+                with field_file.storage.open(name, 'rb') as file:
+                    self.processed[name] = build_thumbnails(file, kind, directory)
+            except FileNotFoundError:
+                self.processed[name] = None
+                self.stderr.write(f"{label}: файл {name} не найден.")
+            except ValidationError as e:
+                self.processed[name] = None
+                self.stderr.write(f"{label}: {name} - {' '.join(e.messages)}")
+
+        result = self.processed[name]
+        if result is None:
+            self.failed += 1
+        else:
+            self.done += 1
+        return result
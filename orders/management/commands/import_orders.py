@@ -0,0 +1,56 @@
+# D:\Projects\EcoPrint\orders\management\commands\import_orders.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from orders.importer import IMPORT_BATCH_SIZE, ImportFileError, OrderImporter, iter_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Импортирует заказы из файла .csv или .xlsx (одна строка - один товар; "
+        "колонки: клиент, заказ, товар, количество, срок, статус, комментарий, "
+        "ответственный). Файл читается построчно, заказы пишутся пачками. "
+        "Печатает итог и ошибки по номерам строк."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Путь к файлу .csv или .xlsx.")
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help=f"Сколько строк записывать за одну транзакцию (по умолчанию {IMPORT_BATCH_SIZE})."
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Только проверить файл, ничего не записывать."
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size должен быть больше 0.")
+
+        started = time.monotonic()
+        importer = OrderImporter(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        try:
+            with open(options['path'], 'rb') as file:
+                report = importer.run(iter_rows(file, options['path']))
+        except OSError as e:
+            raise CommandError(f"Не удалось открыть файл: {e}")
+        except ImportFileError as e:
+            raise CommandError(str(e))
+
+        for error in report['errors']:
+            messages = "; ".join(f"{field}: {message}" for field, message in error['errors'].items())
+            self.stdout.write(f"Строка {error['row']}: {messages}")
+        if report['error_count'] > len(report['errors']):
+            self.stdout.write(f"...и еще {report['error_count'] - len(report['errors'])} ошибок")
+
+        verb = "Будет создано" if options['dry_run'] else "Создано"
+        self.stdout.write(self.style.SUCCESS(
+            f"Строк: {report['rows']}. {verb} заказов: {report['orders_created']}, "
+            f"товаров: {report['items_created']}. Ошибок: {report['error_count']}. "
+            f"Время: {time.monotonic() - started:.1f} с."
+        ))
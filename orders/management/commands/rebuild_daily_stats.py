@@ -0,0 +1,63 @@
+# D:\Projects\EcoPrint\orders\management\commands\rebuild_daily_stats.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from orders.models import Order, Item, ArchivedItem, DailyStats, DailyProductStats, StatsVersion
+
+
+def rebuild_daily_stats():
+    """
+    Пересчитывает дневные сводки с нуля по текущим заказам и товарам
+    (включая архивные). Заказы попадают в день создания вместе с их
+    ТЕКУЩИМ статусом, товары - в день создания их заказа.
+    """
+    status_fields = {
+        'not-ready': 'not_ready_delta',
+        'in-progress': 'in_progress_delta',
+        'ready': 'ready_delta',
+    }
+
+    days = {}
+    rows = Order.objects.values('created_at__date', 'status') \
+                        .annotate(count=Count('id')) \
+                        .order_by()
+    for row in rows:
+        stats = days.setdefault(row['created_at__date'], DailyStats(day=row['created_at__date']))
+        stats.orders_created += row['count']
+        setattr(stats, status_fields[row['status']], row['count'])
+
+    product_counts = {}
+    for model in (Item, ArchivedItem):
+        rows = model.objects.values('order__created_at__date', 'name') \
+                            .annotate(count=Count('id')) \
+                            .order_by()
+        for row in rows:
+            key = (row['order__created_at__date'], row['name'])
+            product_counts[key] = product_counts.get(key, 0) + row['count']
+    products = [
+        DailyProductStats(day=day, name=name, items_delta=count)
+        for (day, name), count in product_counts.items()
+    ]
+
+    with transaction.atomic():
+        StatsVersion.bump()
+        DailyStats.objects.all().delete()
+        DailyProductStats.objects.all().delete()
+        DailyStats.objects.bulk_create(days.values(), batch_size=1000)
+        DailyProductStats.objects.bulk_create(products, batch_size=1000)
+
+    return len(days), len(products)
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает дневную статистику (DailyStats, DailyProductStats) "
+        "по текущим заказам. Нужна после массовых правок данных в обход ORM."
+    )
+
+    def handle(self, *args, **options):
+        days, products = rebuild_daily_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Статистика пересчитана: дней {days}, строк по товарам {products}."
+        ))
@@ -0,0 +1,96 @@
+# D:\Projects\EcoPrint\orders\management\commands\rebuild_order_counters.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from orders.models import Order, Item, ArchivedItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет счетчики товаров заказа (items_total, items_ready, ...) "
+        "с реальными товарами (активными и архивными) и исправляет расхождения. "
+        "С --check только проверяет и завершается с ошибкой при расхождениях."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Только проверить, ничего не исправлять."
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Сколько заказов обновлять за один запрос (по умолчанию 1000)."
+        )
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        batch_size = options['batch_size']
+
+        checked = 0
+        broken = 0
+        pending = []
+        for order, real in self._orders_with_real_counts(batch_size):
+            checked += 1
+            real_total = sum(real.values())
+            real_status = Order.derive_status(real_total, real['ready'], real['in-progress'])
+            actual = (order.items_total, order.items_ready, order.items_in_progress,
+                      order.items_not_ready, order.status)
+            expected = (real_total, real['ready'], real['in-progress'],
+                        real['not-ready'], real_status)
+            if actual == expected:
+                continue
+
+            broken += 1
+            self.stdout.write(f"Заказ №{order.pk}: в базе {actual}, должно быть {expected}")
+            if check_only:
+                continue
+
+            (order.items_total, order.items_ready, order.items_in_progress,
+             order.items_not_ready, order.status) = expected
+            pending.append(order)
+            if len(pending) >= batch_size:
+                self._save(pending)
+                pending = []
+
+        if check_only:
+            if broken:
+                raise CommandError(f"Расхождения в {broken} из {checked} заказов.")
+            self.stdout.write(self.style.SUCCESS(f"Проверено заказов: {checked}. Расхождений нет."))
+            return
+
+        if pending:
+            self._save(pending)
+        self.stdout.write(self.style.SUCCESS(
+            f"Проверено заказов: {checked}. Исправлено: {broken}."
+        ))
+
+    def _orders_with_real_counts(self, batch_size):
+        """
+        Отдает пары (заказ, {статус: число товаров}) пачками по batch_size.
+        Товары считаются по обеим таблицам (Item и ArchivedItem) отдельными
+        GROUP BY: JOIN двух таблиц перемножил бы строки.
+        """
+        last_pk = 0
+        while True:
+            orders = list(Order.objects.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not orders:
+                return
+            last_pk = orders[-1].pk
+
+            counts = {order.pk: dict.fromkeys(Order.STATUS_COUNTER_FIELDS, 0) for order in orders}
+            for model in (Item, ArchivedItem):
+                rows = model.objects.filter(order_id__in=counts.keys()) \
+                                    .values('order_id', 'status') \
+                                    .annotate(count=Count('id')) \
+                                    .order_by()
+                for row in rows:
+                    counts[row['order_id']][row['status']] += row['count']
+
+            for order in orders:
+                yield order, counts[order.pk]
+
+    def _save(self, orders):
+        Order.objects.bulk_update(orders, Order.COUNTER_FIELDS + ['status'])
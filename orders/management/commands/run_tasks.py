@@ -0,0 +1,50 @@
+# D:\Projects\EcoPrint\orders\management\commands\run_tasks.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from orders.tasks import run_pending_tasks
+from orders.telegram_bot import telegram_client
+
+
+class Command(BaseCommand):
+    help = (
+        "Воркер фоновых задач (уведомления Telegram и т.п.). "
+        "Запускайте отдельным процессом рядом с gunicorn."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Выполнить все готовые задачи и выйти."
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help="Сколько задач забирать за раз (по умолчанию 10)."
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help="Пауза в секундах, если очередь пуста (по умолчанию 2)."
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        try:
+            while True:
+                processed = run_pending_tasks(batch_size)
+                total += processed
+                if processed:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Обработано задач: {total}."))
+        self.stdout.write(f"Telegram: {telegram_client.stats()}")
@@ -0,0 +1,210 @@
+# D:\Projects\EcoPrint\orders\metrics.py
+
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+# Границы корзин гистограммы времени ответа, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Метка для запросов, не дошедших до view (404, редиректы CommonMiddleware)
+UNRESOLVED_VIEW = '<unresolved>'
+
+# Метод запроса клиент присылает любой: нестандартные сводим в 'other',
+# иначе каждый новый метод - новая метка (память процесса без предела)
+KNOWN_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+OTHER_METHOD = 'other'
+
+# Статистика SQL текущего запроса. ContextVar, а не атрибут соединения:
+# под ASGI синхронный view выполняется в другом потоке, но контекст
+# (и этот объект) туда копируется.
+current_request_stats = ContextVar('current_request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'sql_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обертка выполнения SQL (connection.execute_wrappers): считает запросы
+    и их время для текущего HTTP-запроса. Вне запроса ничего не делает.
+    """
+    stats = current_request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.sql_time += time.perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """Обработчик connection_created: подключает record_query к соединению."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# === Хранилище метрик ===
+class MetricsRegistry:
+    """
+    Счетчики по view в памяти процесса. Каждый процесс (воркер gunicorn /
+    uvicorn) ведет свои метрики, как обычно для Prometheus-клиентов
+    без общего хранилища; сбрасываются при перезапуске.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}  # (view, method, status) -> количество
+        self._views = {}     # view -> [корзины..., сумма, число, SQL-запросы, SQL-время]
+
+    def observe(self, view, method, status, duration, queries, sql_time):
+        bucket = len(LATENCY_BUCKETS)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                bucket = index
+                break
+        if method not in KNOWN_METHODS:
+            method = OTHER_METHOD
+        with self._lock:
+            key = (view, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            row = self._views.get(view)
+            if row is None:
+                row = self._views[view] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0, 0, 0, 0.0]
+            row[bucket] += 1
+            row[-4] += duration
+            row[-3] += 1
+            row[-2] += queries
+            row[-1] += sql_time
+
+    def reset(self):
+        with self._lock:
+            self._requests.clear()
+            self._views.clear()
+
+    def render(self):
+        """Текст в формате Prometheus (text exposition format 0.0.4)."""
+        with self._lock:
+            requests = sorted(self._requests.items())
+            views = sorted((view, list(row)) for view, row in self._views.items())
+
+        lines = [
+            '# HELP ecoprint_http_requests_total HTTP requests by view, method and status.',
+            '# TYPE ecoprint_http_requests_total counter',
+        ]
+        for (view, method, status), count in requests:
+            lines.append(f'ecoprint_http_requests_total{{view="{_escape(view)}",method="{method}",'
+                         f'status="{status}"}} {count}')
+
+        lines += [
+            '# HELP ecoprint_http_request_duration_seconds Response time by view.',
+            '# TYPE ecoprint_http_request_duration_seconds histogram',
+        ]
+        for view, row in views:
+            label = _escape(view)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, row):
+                cumulative += count
+                lines.append(f'ecoprint_http_request_duration_seconds_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'ecoprint_http_request_duration_seconds_bucket{{view="{label}",le="+Inf"}} {row[-3]}')
+            lines.append(f'ecoprint_http_request_duration_seconds_sum{{view="{label}"}} {row[-4]:.6f}')
+            lines.append(f'ecoprint_http_request_duration_seconds_count{{view="{label}"}} {row[-3]}')
+
+        lines += [
+            '# HELP ecoprint_db_queries_total SQL queries executed by view.',
+            '# TYPE ecoprint_db_queries_total counter',
+        ]
+        lines += [f'ecoprint_db_queries_total{{view="{_escape(view)}"}} {row[-2]}' for view, row in views]
+
+        lines += [
+            '# HELP ecoprint_db_query_duration_seconds_total Time spent in SQL by view.',
+            '# TYPE ecoprint_db_query_duration_seconds_total counter',
+        ]
+        lines += [f'ecoprint_db_query_duration_seconds_total{{view="{_escape(view)}"}} {row[-1]:.6f}'
+                  for view, row in views]
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Одно хранилище на процесс
+registry = MetricsRegistry()
+
+
+def view_label(request):
+    """
+    Имя view для метрик: 'OrderViewSet.list', 'OrderViewSet.changes',
+    'statistics_data_view'. Для DRF ViewSet - класс и действие.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNRESOLVED_VIEW
+    func = match.func
+    view_class = getattr(func, 'cls', None)
+    if view_class is None:
+        return getattr(func, '__name__', match.view_name)
+    actions = getattr(func, 'actions', None)
+    if actions:
+        method = request.method.lower() if request.method in KNOWN_METHODS else OTHER_METHOD
+        return f"{view_class.__name__}.{actions.get(method, method)}"
+    return view_class.__name__
+
+
+# === Middleware ===
+class MetricsMiddleware:
+    """
+    Замеряет каждый запрос: время ответа, число SQL-запросов и время в SQL.
+    Пишет их в registry (GET /api/_metrics) и в заголовок Server-Timing
+    (видно во вкладке Network браузера). Для потоковых ответов (SSE)
+    время - до отдачи заголовков.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request_stats.reset(token)
+        self._finish(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request_stats.reset(token)
+        self._finish(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def _finish(self, request, response, stats, duration):
+        registry.observe(view_label(request), request.method, response.status_code,
+                         duration, stats.queries, stats.sql_time)
+        response['Server-Timing'] = (
+            f'app;dur={duration * 1000:.1f}, '
+            f'db;dur={stats.sql_time * 1000:.1f};desc="{stats.queries} SQL"'
+        )
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:45
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_item_counters(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    orders = Order.objects.annotate(
+        real_total=Count('items'),
+        real_ready=Count('items', filter=Q(items__status='ready')),
+        real_in_progress=Count('items', filter=Q(items__status='in-progress')),
+        real_not_ready=Count('items', filter=Q(items__status='not-ready')),
+    )
+    batch = []
+    for order in orders.iterator(chunk_size=1000):
+        order.items_total = order.real_total
+        order.items_ready = order.real_ready
+        order.items_in_progress = order.real_in_progress
+        order.items_not_ready = order.real_not_ready
+        batch.append(order)
+        if len(batch) >= 1000:
+            Order.objects.bulk_update(batch, ['items_total', 'items_ready', 'items_in_progress', 'items_not_ready'])
+            batch = []
+    if batch:
+        Order.objects.bulk_update(batch, ['items_total', 'items_ready', 'items_in_progress', 'items_not_ready'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_item_is_archived_item_ready_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_in_progress',
+            field=models.PositiveIntegerField(default=0, verbose_name='Товаров в процессе'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items_not_ready',
+            field=models.PositiveIntegerField(default=0, verbose_name='Товаров не готово'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items_ready',
+            field=models.PositiveIntegerField(default=0, verbose_name='Товаров готово'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='Всего товаров'),
+        ),
+        migrations.RunPython(fill_item_counters, migrations.RunPython.noop),
+    ]
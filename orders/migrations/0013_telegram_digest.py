@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_task'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telegramsettings',
+            name='digest_max_length',
+            field=models.PositiveIntegerField(default=3500, verbose_name='Максимальная длина сводки, символов'),
+        ),
+        migrations.AddField(
+            model_name='telegramsettings',
+            name='digest_window',
+            field=models.PositiveIntegerField(default=0, verbose_name='Окно сводки, сек. (0 - отправлять каждый заказ сразу)'),
+        ),
+    ]
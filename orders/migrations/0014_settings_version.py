@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:51
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0013_telegram_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='companysettings',
+            name='version',
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+        migrations.AddField(
+            model_name='telegramsettings',
+            name='version',
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:58
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_daily_stats(apps, schema_editor):
+    """
+    Заполняет сводки по уже существующим заказам: заказы - в день создания
+    с их текущим статусом, товары - в день создания их заказа.
+    (Копия manage.py rebuild_daily_stats на момент миграции: команда
+    может меняться, миграция - нет.)
+    """
+    Order = apps.get_model('orders', 'Order')
+    Item = apps.get_model('orders', 'Item')
+    DailyStats = apps.get_model('orders', 'DailyStats')
+    DailyProductStats = apps.get_model('orders', 'DailyProductStats')
+    status_fields = {
+        'not-ready': 'not_ready_delta',
+        'in-progress': 'in_progress_delta',
+        'ready': 'ready_delta',
+    }
+
+    days = {}
+    rows = Order.objects.values('created_at__date', 'status') \
+                        .annotate(count=Count('id')) \
+                        .order_by()
+    for row in rows:
+        stats = days.setdefault(row['created_at__date'], DailyStats(day=row['created_at__date']))
+        stats.orders_created += row['count']
+        setattr(stats, status_fields[row['status']], row['count'])
+
+    products = [
+        DailyProductStats(day=row['order__created_at__date'], name=row['name'], items_delta=row['count'])
+        for row in Item.objects.values('order__created_at__date', 'name')
+                               .annotate(count=Count('id'))
+                               .order_by()
+    ]
+
+    DailyStats.objects.bulk_create(days.values(), batch_size=1000)
+    DailyProductStats.objects.bulk_create(products, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0015_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='День')),
+                ('orders_created', models.PositiveIntegerField(default=0, verbose_name='Создано заказов')),
+                ('orders_deleted', models.PositiveIntegerField(default=0, verbose_name='Удалено заказов')),
+                ('not_ready_delta', models.IntegerField(default=0, verbose_name="Изменение 'Не готов'")),
+                ('in_progress_delta', models.IntegerField(default=0, verbose_name="Изменение 'В процессе'")),
+                ('ready_delta', models.IntegerField(default=0, verbose_name="Изменение 'Готово'")),
+            ],
+            options={
+                'verbose_name': 'Статистика за день',
+                'verbose_name_plural': 'Статистика по дням',
+                'ordering': ['day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('name', models.CharField(max_length=255, verbose_name='Название товара')),
+                ('items_delta', models.IntegerField(default=0, verbose_name='Изменение количества позиций')),
+            ],
+            options={
+                'verbose_name': 'Статистика товара за день',
+                'verbose_name_plural': 'Статистика товаров по дням',
+                'constraints': [models.UniqueConstraint(fields=('day', 'name'), name='daily_product_stats_day_name_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_daily_stats, migrations.RunPython.noop),
+    ]
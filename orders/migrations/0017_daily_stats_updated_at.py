@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0016_daily_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyproductstats',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Обновлено'),
+        ),
+        migrations.AddField(
+            model_name='dailystats',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Обновлено'),
+        ),
+    ]
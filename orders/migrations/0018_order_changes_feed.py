@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0017_daily_stats_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.BigIntegerField(verbose_name='ID заказа')),
+                ('deleted_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Удален')),
+            ],
+            options={
+                'verbose_name': 'Удаленный заказ',
+                'verbose_name_plural': 'Удаленные заказы',
+            },
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Изменен'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Изменен'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def move_archived_items(apps, schema_editor):
+    """Переносит товары с is_archived=True в таблицу архива (счетчики не меняются)."""
+    Item = apps.get_model('orders', 'Item')
+    ArchivedItem = apps.get_model('orders', 'ArchivedItem')
+    fields = ['order_id', 'name', 'quantity', 'comment', 'status',
+              'deadline', 'ready_at', 'responsible_user_id']
+    while True:
+        batch = list(Item.objects.filter(is_archived=True).order_by('pk')[:1000])
+        if not batch:
+            break
+        ArchivedItem.objects.bulk_create([
+            ArchivedItem(item_id=item.pk, **{field: getattr(item, field) for field in fields})
+            for item in batch
+        ])
+        Item.objects.filter(pk__in=[item.pk for item in batch]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0018_order_changes_feed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.BigIntegerField(unique=True, verbose_name='ID товара')),
+                ('name', models.CharField(max_length=255, verbose_name='Название товара')),
+                ('quantity', models.PositiveIntegerField(default=1, verbose_name='Количество')),
+                ('comment', models.TextField(blank=True, null=True, verbose_name='Комментарий к товару')),
+                ('status', models.CharField(choices=[('not-ready', 'Не готов'), ('in-progress', 'В процессе'), ('ready', 'Готово')], max_length=20, verbose_name='Статус товара')),
+                ('deadline', models.DateField(blank=True, null=True, verbose_name='Срок сдачи товара')),
+                ('ready_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата готовности')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='В архиве с')),
+            ],
+            options={
+                'verbose_name': 'Архивный товар',
+                'verbose_name_plural': 'Архив товаров',
+            },
+        ),
+        migrations.AddField(
+            model_name='archiveditem',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_items', to='orders.order', verbose_name='Заказ'),
+        ),
+        migrations.AddField(
+            model_name='archiveditem',
+            name='responsible_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_items', to=settings.AUTH_USER_MODEL, verbose_name='Ответственный'),
+        ),
+        migrations.AddIndex(
+            model_name='archiveditem',
+            index=models.Index(fields=['-archived_at'], name='archived_item_archived_idx'),
+        ),
+        migrations.RunPython(move_archived_items, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_active_deadline_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_active_status_dl_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_resp_archived_idx',
+        ),
+        migrations.RemoveField(
+            model_name='item',
+            name='is_archived',
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['deadline'], name='item_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['status', 'deadline'], name='item_status_deadline_idx'),
+        ),
+    ]
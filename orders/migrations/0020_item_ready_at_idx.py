@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0019_archived_items'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('status', 'ready')), fields=['ready_at', 'id'], name='item_ready_at_idx'),
+        ),
+    ]
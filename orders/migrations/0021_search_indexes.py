@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:05
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import DatabaseError, migrations, transaction
+
+
+# Выражения должны совпадать с orders/search.py, иначе PostgreSQL не
+# применит индекс. Индексы не описаны в Meta моделей: они есть только
+# на PostgreSQL, а триграммные - только при наличии pg_trgm.
+def fulltext_indexes():
+    return [
+        ('order', GinIndex(SearchVector('client', config='russian'), name='order_client_fts_idx')),
+        ('item', GinIndex(SearchVector('name', 'comment', config='russian'), name='item_fts_idx')),
+    ]
+
+
+def trigram_indexes():
+    return [
+        ('order', GinIndex(fields=['client'], opclasses=['gin_trgm_ops'], name='order_client_trgm_idx')),
+        ('item', GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='item_name_trgm_idx')),
+        ('item', GinIndex(fields=['comment'], opclasses=['gin_trgm_ops'], name='item_comment_trgm_idx')),
+    ]
+
+
+def enable_trigram(schema_editor):
+    """Включает pg_trgm, если расширение есть на сервере и хватает прав."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return False
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except DatabaseError:
+            return False
+    return True
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    indexes = fulltext_indexes()
+    if enable_trigram(schema_editor):
+        indexes += trigram_indexes()
+    for model_name, index in indexes:
+        schema_editor.add_index(apps.get_model('orders', model_name), index)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in fulltext_indexes() + trigram_indexes():
+        schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(index.name)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0020_item_ready_at_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 21:10
+
+import orders.images
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0021_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='companysettings',
+            name='company_logo_thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='companysettings',
+            name='company_logo',
+            field=models.ImageField(blank=True, null=True, upload_to='company_logo/', validators=[orders.images.validate_image_upload], verbose_name='Логотип компании (для счетов)'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='avatar',
+            field=models.ImageField(default='avatars/default.jpg', upload_to='avatars/', validators=[orders.images.validate_image_upload], verbose_name='Аватар'),
+        ),
+    ]
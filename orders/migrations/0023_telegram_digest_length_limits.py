@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:15
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def clamp_digest_max_length(apps, schema_editor):
+    """Уже сохраненные значения вне 500..4096 приводим к границам."""
+    TelegramSettings = apps.get_model('orders', 'TelegramSettings')
+    TelegramSettings.objects.filter(digest_max_length__lt=500).update(digest_max_length=500)
+    TelegramSettings.objects.filter(digest_max_length__gt=4096).update(digest_max_length=4096)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0022_image_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='telegramsettings',
+            name='digest_max_length',
+            field=models.PositiveIntegerField(default=3500, validators=[django.core.validators.MinValueValidator(500), django.core.validators.MaxValueValidator(4096)], verbose_name='Максимальная длина сводки, символов'),
+        ),
+        migrations.RunPython(clamp_digest_max_length, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:30
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import DatabaseError, migrations, transaction
+from django.db.models.functions import Upper
+
+
+# Поиск подстроки (__icontains) на PostgreSQL - это UPPER(поле) LIKE '%...%':
+# триграммный индекс по самому полю (0021_search_indexes) для него не
+# применяется. Индексы строятся по UPPER(поле), как в orders/search.py.
+def raw_trigram_indexes():
+    return [
+        ('order', GinIndex(fields=['client'], opclasses=['gin_trgm_ops'], name='order_client_trgm_idx')),
+        ('item', GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='item_name_trgm_idx')),
+        ('item', GinIndex(fields=['comment'], opclasses=['gin_trgm_ops'], name='item_comment_trgm_idx')),
+    ]
+
+
+def upper_trigram_indexes():
+    return [
+        ('order', GinIndex(OpClass(Upper('client'), name='gin_trgm_ops'), name='order_client_upper_trgm_idx')),
+        ('item', GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='item_name_upper_trgm_idx')),
+        ('item', GinIndex(OpClass(Upper('comment'), name='gin_trgm_ops'), name='item_comment_upper_trgm_idx')),
+    ]
+
+
+def enable_trigram(schema_editor):
+    """Включает pg_trgm, если расширение есть на сервере и хватает прав."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return False
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except DatabaseError:
+            return False
+    return True
+
+
+def replace_indexes(apps, schema_editor, old, new):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in old:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(index.name)}")
+    if enable_trigram(schema_editor):
+        for model_name, index in new:
+            schema_editor.add_index(apps.get_model('orders', model_name), index)
+
+
+def create_upper_indexes(apps, schema_editor):
+    replace_indexes(apps, schema_editor, raw_trigram_indexes(), upper_trigram_indexes())
+
+
+def restore_raw_indexes(apps, schema_editor):
+    replace_indexes(apps, schema_editor, upper_trigram_indexes(), raw_trigram_indexes())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0023_telegram_digest_length_limits'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_upper_indexes, restore_raw_indexes),
+    ]
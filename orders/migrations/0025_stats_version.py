@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0024_search_trigram_upper_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Версия')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Версия статистики',
+                'verbose_name_plural': 'Версия статистики',
+            },
+        ),
+    ]
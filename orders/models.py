@@ -1,11 +1,51 @@
 # D:\Projects\EcoPrint\orders\models.py (ПОЛНЫЙ ИСПРАВЛЕННЫЙ КОД)
 
-from django.db import models
+import time
+import uuid
+from datetime import timedelta
+
+from collections import Counter
+from contextvars import ContextVar
+
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 
+from .events import publish_order_event
+from .images import process_image_field, validate_image_upload
+
+# === QuerySet Заказов ===
+class OrderQuerySet(models.QuerySet):
+    def with_active_items(self, item_filter=None):
+        """
+        Подгружает активные товары (архивные лежат в ArchivedItem) и их
+        ответственных за фиксированное число запросов, вместо 1 + 2N запросов.
+        Товары кладутся в атрибут 'active_items' каждого заказа.
+
+        item_filter (Q) - дополнительное условие на товары: тогда в
+        'active_items' попадают только подходящие товары.
+        """
+        active_items = Item.objects.select_related('responsible_user') \
+                                   .order_by('id')
+        if item_filter is not None:
+            active_items = active_items.filter(item_filter)
+        return self.prefetch_related(
+            models.Prefetch('items', queryset=active_items, to_attr='active_items')
+        )
+
+    def with_matching_items(self, item_filter):
+        """
+        Оставляет только заказы, у которых есть хотя бы один активный
+        товар, подходящий под item_filter (Q). Фильтр выполняется в SQL
+        через EXISTS, без дублирования строк заказов.
+        """
+        matching_items = Item.objects.filter(order=models.OuterRef('pk')).filter(item_filter)
+        return self.filter(models.Exists(matching_items)) \
+                   .with_active_items(item_filter)
+
 # === Модель Заказа ===
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -23,23 +63,128 @@ class Order(models.Model):
         verbose_name="Статус заказа"
     )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создан")
+    # Меняется при любом изменении заказа или его товаров (лента /api/orders/changes/)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Изменен")
+
+    # --- Счетчики товаров (денормализация) ---
+    # Поддерживаются атомарными UPDATE ... SET x = x + 1 при добавлении,
+    # удалении и смене статуса товара. Статус заказа выводится из них.
+    # Архивные товары (ArchivedItem) остаются в счетчиках своего заказа.
+    items_total = models.PositiveIntegerField(default=0, verbose_name="Всего товаров")
+    items_ready = models.PositiveIntegerField(default=0, verbose_name="Товаров готово")
+    items_in_progress = models.PositiveIntegerField(default=0, verbose_name="Товаров в процессе")
+    items_not_ready = models.PositiveIntegerField(default=0, verbose_name="Товаров не готово")
+
+    objects = OrderQuerySet.as_manager()
+
+    # Какой счетчик отвечает за какой статус товара
+    STATUS_COUNTER_FIELDS = {
+        'ready': 'items_ready',
+        'in-progress': 'items_in_progress',
+        'not-ready': 'items_not_ready',
+    }
+    COUNTER_FIELDS = ['items_total', 'items_ready', 'items_in_progress', 'items_not_ready']
+
+    class Meta:
+        indexes = [
+            # Лента заказов и курсорная пагинация: ORDER BY created_at DESC,
+            # статистика по дням: created_at >= <начало дня>
+            models.Index(fields=['-created_at'], name='order_created_at_idx'),
+            # Подсчет заказов по статусу (статистика)
+            models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+        ]
 
     def __str__(self):
         return f"Заказ №{self.id} от {self.client}"
 
+    @staticmethod
+    def derive_status(total, ready, in_progress):
+        """
+        Статус заказа по счетчикам товаров:
+        - нет товаров -> 'not-ready'
+        - все готовы -> 'ready'
+        - есть 'в процессе' или часть готова (а часть нет) -> 'in-progress'
+        - иначе -> 'not-ready'
+        """
+        if total == 0:
+            return 'not-ready'
+        if ready == total:
+            return 'ready'
+        if in_progress > 0 or ready > 0:
+            return 'in-progress'
+        return 'not-ready'
+
+    @classmethod
+    def adjust_item_counters(cls, order_id, added=(), removed=()):
+        """
+        Сдвигает счетчики заказа атомарным UPDATE ... SET x = x + delta
+        и пересчитывает статус. Строка заказа блокируется (SELECT ... FOR UPDATE),
+        поэтому известны старый и новый статус: переход попадает в DailyStats.
+        added / removed - статусы добавленных / удаленных товаров
+        (смена статуса = added=[новый], removed=[старый]).
+        """
+        deltas = dict.fromkeys(cls.COUNTER_FIELDS, 0)
+        deltas['items_total'] = len(added) - len(removed)
+        for item_status in added:
+            deltas[cls.STATUS_COUNTER_FIELDS[item_status]] += 1
+        for item_status in removed:
+            deltas[cls.STATUS_COUNTER_FIELDS[item_status]] -= 1
+
+        if not any(deltas.values()):
+            return
+
+        with transaction.atomic():
+            current = cls.objects.select_for_update() \
+                                 .filter(pk=order_id) \
+                                 .values(*cls.COUNTER_FIELDS, 'status') \
+                                 .first()
+            if current is None:
+                return
+
+            new_status = cls.derive_status(
+                current['items_total'] + deltas['items_total'],
+                current['items_ready'] + deltas['items_ready'],
+                current['items_in_progress'] + deltas['items_in_progress'],
+            )
+            cls.objects.filter(pk=order_id).update(
+                status=new_status,
+                updated_at=timezone.now(),
+                **{field: models.F(field) + delta for field, delta in deltas.items() if delta}
+            )
+            if new_status != current['status']:
+                DailyStats.record_status_change(current['status'], new_status)
+            publish_order_event(order_id)
+
+    @classmethod
+    def touch(cls, *order_ids):
+        """Отмечает заказы измененными (например, у товара сменился ответственный)."""
+        cls.objects.filter(pk__in=order_ids).update(updated_at=timezone.now())
+        for order_id in order_ids:
+            publish_order_event(order_id)
+
+    def save(self, *args, **kwargs):
+        # Статус и счетчики меняются только через adjust_item_counters() и
+        # update_status(). Обычное сохранение заказа не должно затирать их
+        # значениями, которые были прочитаны раньше.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            derived = self.COUNTER_FIELDS + ['status']
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in derived
+            ]
+        super().save(*args, **kwargs)
+
     def update_status(self):
-        items = self.items.all()
-        if not items.exists():
-            self.status = 'not-ready'
-        elif all(item.status == 'ready' for item in items):
-            self.status = 'ready'
-        elif any(item.status == 'in-progress' for item in items) or \
-             (any(item.status == 'ready' for item in items) and \
-              any(item.status == 'not-ready' for item in items)):
-            self.status = 'in-progress'
-        else:
-            self.status = 'not-ready'
-        self.save()
+        """
+        Перечитывает счетчики и статус заказа из базы (без чтения товаров)
+        и сохраняет статус, если он разошелся со счетчиками.
+        """
+        self.refresh_from_db(fields=self.COUNTER_FIELDS + ['status'])
+        new_status = self.derive_status(self.items_total, self.items_ready, self.items_in_progress)
+        if new_status != self.status:
+            DailyStats.record_status_change(self.status, new_status)
+            self.status = new_status
+            self.save(update_fields=['status', 'updated_at'])
 
 # === Модель Товара в Заказе ===
 class Item(models.Model):
@@ -89,15 +234,44 @@ class Item(models.Model):
         blank=True, 
         verbose_name="Дата готовности"
     )
-    is_archived = models.BooleanField(
-        default=False, 
-        verbose_name="В архиве"
-    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Изменен")
 
     def __str__(self):
         return f"{self.name} ({self.quantity} шт.)"
 
-    def save(self, *args, **kwargs):
+    class Meta:
+        # В таблице только активные товары (архив - ArchivedItem),
+        # поэтому индексы не тащат за собой завершенную работу прошлых лет.
+        # Товары сотрудника обслуживает индекс внешнего ключа responsible_user.
+        indexes = [
+            # Фильтр срочности: deadline BETWEEN ...
+            models.Index(fields=['deadline'], name='item_deadline_idx'),
+            # Фильтр по статусу и срочные не готовые товары
+            models.Index(fields=['status', 'deadline'], name='item_status_deadline_idx'),
+            # Автоархивация: готовые товары по дате готовности (manage.py archive_items)
+            models.Index(
+                fields=['ready_at', 'id'],
+                condition=models.Q(status='ready'),
+                name='item_ready_at_idx'
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем заказ и статус из базы, чтобы в save() знать,
+        # какие счетчики заказа сдвигать
+        loaded = dict(zip(field_names, values))
+        instance._loaded_state = (loaded.get('order_id'), loaded.get('status'))
+        instance._loaded_name = loaded.get('name')
+        return instance
+
+    def sync_ready_at(self):
+        """
+        Приводит дату готовности в соответствие со статусом.
+        Вызывается из save() и перед bulk_create/bulk_update,
+        которые save() не вызывают.
+        """
         # Если статус МЕНЯЕТСЯ на "Готово" и даты еще нет
         if self.status == 'ready' and self.ready_at is None:
             self.ready_at = timezone.now()
@@ -105,12 +279,201 @@ class Item(models.Model):
         # Если статус "Готово" снимают, сбрасываем дату
         elif self.status != 'ready':
             self.ready_at = None
-            
-        super().save(*args, **kwargs)
-        
-        # Затем обновляем Order
-        if hasattr(self, 'order') and self.order:
-            self.order.update_status()
+
+    def save(self, *args, **kwargs):
+        self.sync_ready_at()
+        adding = self._state.adding
+        old_order_id, old_status = getattr(self, '_loaded_state', (None, None))
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            # Затем сдвигаем счетчики (и статус) Order
+            if adding:
+                Order.adjust_item_counters(self.order_id, added=[self.status])
+            elif old_order_id is not None and old_order_id != self.order_id:
+                Order.adjust_item_counters(old_order_id, removed=[old_status])
+                Order.adjust_item_counters(self.order_id, added=[self.status])
+            elif old_status is not None and old_status != self.status:
+                Order.adjust_item_counters(self.order_id, added=[self.status], removed=[old_status])
+            else:
+                # Счетчики не изменились, но заказ должен попасть в ленту изменений
+                Order.touch(self.order_id)
+
+            # Статистика по товарам (ассортименту)
+            old_name = getattr(self, '_loaded_name', None)
+            if adding:
+                DailyProductStats.record(added=[self.name])
+            elif old_name is not None and old_name != self.name:
+                DailyProductStats.record(added=[self.name], removed=[old_name])
+
+        self._loaded_state = (self.order_id, self.status)
+        self._loaded_name = self.name
+
+# === Сигнал: удаление товара уменьшает счетчики заказа ===
+@receiver(post_delete, sender=Item)
+def decrease_order_item_counters(sender, instance, origin=None, **kwargs):
+    # Удаление уже учел вызывающий код (перенос в архив, _reconcile_items)
+    if removal_recorded.get():
+        return
+
+    # Товар удаляется вместе с заказом: счетчики заказа уже не нужны,
+    # статистику товаров одним вызовом пишет remember_deleted_order_status
+    if deleted_with_order(origin):
+        return
+
+    DailyProductStats.record(removed=[getattr(instance, '_loaded_name', None) or instance.name])
+
+    # Берем статус, который был в базе (а не измененный в памяти)
+    _, loaded_status = getattr(instance, '_loaded_state', (None, instance.status))
+    Order.adjust_item_counters(instance.order_id, removed=[loaded_status or instance.status])
+
+# Выставляется, когда вызывающий код сам учел удаляемые товары в счетчиках
+# и статистике (перенос в архив, _reconcile_items): post_delete их пропускает
+removal_recorded = ContextVar('removal_recorded', default=False)
+
+
+def deleted_with_order(origin):
+    """Удаление начато с заказа (order.delete() или queryset заказов)."""
+    return isinstance(origin, Order) or getattr(origin, 'model', None) is Order
+
+# === Архив товаров (холодная таблица) ===
+
+
+class ArchivedItem(models.Model):
+    """
+    Архивный товар. Завершенные товары переносятся сюда из Item, чтобы
+    таблица Item и ее индексы содержали только текущую работу.
+    Товар остается в счетчиках заказа и удаляется вместе с заказом.
+    """
+    item_id = models.BigIntegerField(unique=True, verbose_name="ID товара")
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='archived_items',
+        verbose_name="Заказ"
+    )
+    name = models.CharField(max_length=255, verbose_name="Название товара")
+    quantity = models.PositiveIntegerField(default=1, verbose_name="Количество")
+    comment = models.TextField(blank=True, null=True, verbose_name="Комментарий к товару")
+    status = models.CharField(max_length=20, choices=Item.STATUS_CHOICES, verbose_name="Статус товара")
+    deadline = models.DateField(null=True, blank=True, verbose_name="Срок сдачи товара")
+    ready_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата готовности")
+    responsible_user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archived_items',
+        verbose_name="Ответственный"
+    )
+    archived_at = models.DateTimeField(default=timezone.now, verbose_name="В архиве с")
+
+    # Поля, которые копируются из Item
+    COPIED_FIELDS = ['order_id', 'name', 'quantity', 'comment', 'status',
+                     'deadline', 'ready_at', 'responsible_user_id']
+
+    class Meta:
+        verbose_name = "Архивный товар"
+        verbose_name_plural = "Архив товаров"
+        indexes = [
+            # Фильтр архива по датам (date_from / date_to)
+            models.Index(fields=['-archived_at'], name='archived_item_archived_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.quantity} шт.), архив"
+
+    @classmethod
+    def archive(cls, item_ids, condition=None):
+        """
+        Переносит товары в архив одной короткой транзакцией:
+        INSERT в архив + DELETE из Item. Возвращает число перенесенных.
+        condition (Q) перепроверяется под блокировкой строк: товар, который
+        успели изменить после отбора, не переносится.
+        """
+        with transaction.atomic():
+            items = Item.objects.select_for_update().filter(pk__in=item_ids)
+            if condition is not None:
+                items = items.filter(condition)
+            items = list(items)
+            if not items:
+                return 0
+
+            now = timezone.now()
+            cls.objects.bulk_create([
+                cls(item_id=item.pk, archived_at=now,
+                    **{field: getattr(item, field) for field in cls.COPIED_FIELDS})
+                for item in items
+            ])
+            # Перенос в архив - не удаление: счетчики и статистика не меняются
+            token = removal_recorded.set(True)
+            try:
+                Item.objects.filter(pk__in=[item.pk for item in items]).delete()
+            finally:
+                removal_recorded.reset(token)
+            # Товары пропали из активных: заказы должны попасть в ленту изменений
+            Order.touch(*{item.order_id for item in items})
+        return len(items)
+
+
+@receiver(post_delete, sender=ArchivedItem)
+def forget_archived_item(sender, instance, origin=None, **kwargs):
+    if deleted_with_order(origin):
+        return
+    DailyProductStats.record(removed=[instance.name])
+
+# === Сигналы: создание и удаление заказа (дневная статистика, события SSE) ===
+@receiver(post_save, sender=Order)
+def record_order_saved(sender, instance, created, **kwargs):
+    if created:
+        DailyStats.record_order_created(instance.status, instance.created_at)
+    publish_order_event(instance.pk)
+
+@receiver(pre_delete, sender=Order)
+def remember_deleted_order_status(sender, instance, **kwargs):
+    # Статус в памяти мог устареть (его меняют UPDATE-ом счетчики товаров)
+    instance._deleted_status = sender.objects.filter(pk=instance.pk) \
+                                             .values_list('status', flat=True) \
+                                             .first() or instance.status
+
+    # Товары заказа удалятся каскадом: статистику товаров пишем здесь
+    # одним вызовом, а не в post_delete каждого товара
+    names = list(Item.objects.filter(order=instance).values_list('name', flat=True))
+    names += ArchivedItem.objects.filter(order=instance).values_list('name', flat=True)
+    DailyProductStats.record(removed=names)
+
+@receiver(post_delete, sender=Order)
+def record_order_deleted(sender, instance, **kwargs):
+    status = getattr(instance, '_deleted_status', instance.status)
+    DailyStats.record_order_deleted(status, instance.created_at)
+    DeletedOrder.record(instance.pk)
+    publish_order_event(instance.pk, kind='deleted')
+
+# === "Надгробия" удаленных заказов (для ленты /api/orders/changes/) ===
+class DeletedOrder(models.Model):
+    """
+    ID удаленного заказа и время удаления: клиент, синхронизирующийся
+    по курсору, узнает из них, какие заказы убрать из списка.
+    Хранятся RETENTION, более старый курсор требует полной перезагрузки.
+    """
+    order_id = models.BigIntegerField(verbose_name="ID заказа")
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="Удален")
+
+    RETENTION = timedelta(days=1)
+
+    class Meta:
+        verbose_name = "Удаленный заказ"
+        verbose_name_plural = "Удаленные заказы"
+
+    def __str__(self):
+        return f"Заказ №{self.order_id} удален {self.deleted_at}"
+
+    @classmethod
+    def record(cls, order_id):
+        now = timezone.now()
+        cls.objects.create(order_id=order_id, deleted_at=now)
+        cls.objects.filter(deleted_at__lt=now - cls.RETENTION).delete()
 
 # === Модель Профиля ===
 class Profile(models.Model):
@@ -118,8 +481,11 @@ class Profile(models.Model):
     avatar = models.ImageField(
         upload_to='avatars/',
         default='avatars/default.jpg',
+        validators=[validate_image_upload],
         verbose_name="Аватар"
     )
+    # Уменьшенные копии аватара (см. orders/images.py, шаблонный тег picture)
+    avatar_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
     sound_notifications = models.BooleanField(
         default=True, 
         verbose_name="Звуковые уведомления"
@@ -136,6 +502,10 @@ class Profile(models.Model):
     def __str__(self):
         return f'Профиль: {self.user.username}'
 
+    def save(self, *args, **kwargs):
+        process_image_field(self, 'avatar', 'avatar')
+        super().save(*args, **kwargs)
+
 # === Сигналы для Профиля ===
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -149,8 +519,60 @@ def save_user_profile(sender, instance, **kwargs):
     else:
         Profile.objects.create(user=instance)
 
+# === Базовая модель для настроек-синглтонов (одна строка с pk=1) ===
+class SingletonModel(models.Model):
+    """
+    Настройки, которые хранятся одной строкой (pk=1).
+    load() отдает объект из памяти процесса. Раз в CACHE_CHECK_INTERVAL
+    секунд сверяется только метка версии (один легкий SELECT); save()
+    меняет метку, поэтому остальные процессы gunicorn увидят изменения
+    не позже чем через CACHE_CHECK_INTERVAL секунд.
+    """
+    version = models.UUIDField(default=uuid.uuid4, editable=False)
+
+    CACHE_CHECK_INTERVAL = 5  # секунд
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.pk = 1
+        self.version = uuid.uuid4()
+        super().save(*args, **kwargs)
+        type(self).clear_cache()
+
+    @classmethod
+    def clear_cache(cls):
+        cls._cached = None
+
+    @classmethod
+    def load(cls, use_cache=True):
+        """
+        Возвращает настройки. Объект из кэша общий для всего процесса -
+        его нельзя менять. Для формы редактирования используйте
+        load(use_cache=False).
+        """
+        if not use_cache:
+            obj, created = cls.objects.get_or_create(pk=1)
+            return obj
+
+        cached = cls.__dict__.get('_cached')
+        now = time.monotonic()
+        if cached is not None:
+            obj, checked_at = cached
+            if now - checked_at < cls.CACHE_CHECK_INTERVAL:
+                return obj
+            version = cls.objects.filter(pk=1).values_list('version', flat=True).first()
+            if version == obj.version:
+                cls._cached = (obj, now)
+                return obj
+
+        obj, created = cls.objects.get_or_create(pk=1)
+        cls._cached = (obj, now)
+        return obj
+
 # === Модель Настроек Компании ===
-class CompanySettings(models.Model):
+class CompanySettings(SingletonModel):
     company_name = models.CharField(
         max_length=255, 
         blank=True,
@@ -170,27 +592,26 @@ class CompanySettings(models.Model):
         upload_to='company_logo/',
         blank=True,
         null=True,
+        validators=[validate_image_upload],
         verbose_name="Логотип компании (для счетов)"
     )
+    company_logo_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return "Настройки компании"
 
     def save(self, *args, **kwargs):
-        self.pk = 1 
-        super(CompanySettings, self).save(*args, **kwargs)
-    
-    @classmethod
-    def load(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
+        process_image_field(self, 'company_logo', 'logo')
+        if not self.company_logo:
+            self.company_logo_thumbnails = {}
+        super().save(*args, **kwargs)
         
     class Meta:
         verbose_name = "Настройки компании"
         verbose_name_plural = "Настройки компании"
 
 # === Модель Настроек Telegram ===
-class TelegramSettings(models.Model):
+class TelegramSettings(SingletonModel):
     bot_token = models.CharField(
         max_length=255, 
         blank=True, 
@@ -201,18 +622,23 @@ class TelegramSettings(models.Model):
         blank=True, 
         verbose_name="Chat ID (куда отправлять уведомления)"
     )
+    digest_window = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Окно сводки, сек. (0 - отправлять каждый заказ сразу)"
+    )
+    # Telegram отклоняет сообщения длиннее 4096 символов; короче минимума
+    # в сводку не поместится ни один заказ (только "...и еще N заказ(ов)")
+    MESSAGE_MAX_LENGTH = 4096
+    DIGEST_MIN_LENGTH = 500
+
+    digest_max_length = models.PositiveIntegerField(
+        default=3500,
+        validators=[MinValueValidator(DIGEST_MIN_LENGTH), MaxValueValidator(MESSAGE_MAX_LENGTH)],
+        verbose_name="Максимальная длина сводки, символов"
+    )
 
     def __str__(self):
         return "Настройки Telegram"
-
-    def save(self, *args, **kwargs):
-        self.pk = 1 
-        super(TelegramSettings, self).save(*args, **kwargs)
-    
-    @classmethod
-    def load(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
         
     class Meta:
         verbose_name = "Настройки Telegram"
@@ -248,4 +674,209 @@ class Product(models.Model):
         ordering = ['category', 'name']
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+# === Модель Фоновой задачи (очередь в базе данных) ===
+class Task(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Выполнена'),
+        ('failed', 'Ошибка')
+    ]
+
+    kind = models.CharField(
+        max_length=100,
+        verbose_name="Тип задачи"
+    )
+    payload = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Параметры"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name="Статус"
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name="Максимум попыток")
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Выполнить не раньше"
+    )
+    locked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Взята в работу"
+    )
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создана")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершена")
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        indexes = [
+            # Выборка воркером: WHERE status = 'pending' AND run_at <= now()
+            models.Index(fields=['status', 'run_at'], name='task_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"Задача №{self.id}: {self.kind} ({self.status})"
+
+# === Дневная статистика (инкрементальная сводка для дашборда) ===
+def bump_counters(model, lookup, deltas):
+    """
+    Прибавляет deltas к счетчикам строки model с ключом lookup
+    (UPDATE ... SET x = x + delta). Если строки еще нет - создает ее.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updates = {field: models.F(field) + delta for field, delta in deltas.items()}
+    updates['updated_at'] = timezone.now()
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Строку успел создать параллельный запрос
+        model.objects.filter(**lookup).update(**updates)
+
+
+class StatsVersion(models.Model):
+    """
+    Версия дневной статистики (одна строка, pk=1) - ключ кэша и ETag
+    дашборда. Каждая транзакция, меняющая сводки, увеличивает ее на 1
+    (UPDATE ... SET version = version + 1) до изменения самих сводок.
+    В отличие от MAX(updated_at), время которого ставится до COMMIT,
+    после каждого COMMIT версия становится больше любой уже прочитанной.
+    Строка блокируется первой из строк статистики, поэтому параллельные
+    записи сводок выстраиваются в очередь на ней и не ловят deadlock.
+    """
+    version = models.BigIntegerField(default=0, verbose_name="Версия")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    class Meta:
+        verbose_name = "Версия статистики"
+        verbose_name_plural = "Версия статистики"
+
+    def __str__(self):
+        return f"Версия статистики {self.version}"
+
+    @classmethod
+    def bump(cls):
+        bump_counters(cls, {'pk': 1}, {'version': 1})
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+class DailyStats(models.Model):
+    """
+    Одна строка на день. Хранит приращения, а не снимки: например,
+    текущее число заказов в статусе 'ready' = SUM(ready_delta) по всем дням.
+    """
+    day = models.DateField(unique=True, verbose_name="День")
+    orders_created = models.PositiveIntegerField(default=0, verbose_name="Создано заказов")
+    orders_deleted = models.PositiveIntegerField(default=0, verbose_name="Удалено заказов")
+    not_ready_delta = models.IntegerField(default=0, verbose_name="Изменение 'Не готов'")
+    in_progress_delta = models.IntegerField(default=0, verbose_name="Изменение 'В процессе'")
+    ready_delta = models.IntegerField(default=0, verbose_name="Изменение 'Готово'")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Обновлено")
+
+    STATUS_DELTA_FIELDS = {
+        'not-ready': 'not_ready_delta',
+        'in-progress': 'in_progress_delta',
+        'ready': 'ready_delta',
+    }
+
+    class Meta:
+        verbose_name = "Статистика за день"
+        verbose_name_plural = "Статистика по дням"
+        ordering = ['day']
+
+    def __str__(self):
+        return f"Статистика за {self.day}"
+
+    @classmethod
+    def bump(cls, day=None, **deltas):
+        if any(deltas.values()):
+            StatsVersion.bump()
+        bump_counters(cls, {'day': day or timezone.localdate()}, deltas)
+
+    # Создание и удаление записываются в день СОЗДАНИЯ заказа: тогда
+    # orders_created - orders_deleted за день = число живых заказов этого дня
+    @classmethod
+    def record_order_created(cls, status, created_at, count=1):
+        cls.bump(timezone.localdate(created_at), orders_created=count,
+                 **{cls.STATUS_DELTA_FIELDS[status]: count})
+
+    @classmethod
+    def record_order_deleted(cls, status, created_at):
+        cls.bump(timezone.localdate(created_at), orders_deleted=1,
+                 **{cls.STATUS_DELTA_FIELDS[status]: -1})
+
+    @classmethod
+    def record_status_change(cls, old_status, new_status):
+        cls.bump(**{
+            cls.STATUS_DELTA_FIELDS[old_status]: -1,
+            cls.STATUS_DELTA_FIELDS[new_status]: 1,
+        })
+
+
+class DailyProductStats(models.Model):
+    """
+    Приращение количества товаров (позиций заказа) с данным названием за день.
+    Популярность товара = SUM(items_delta) по всем дням.
+    """
+    day = models.DateField(verbose_name="День")
+    name = models.CharField(max_length=255, verbose_name="Название товара")
+    items_delta = models.IntegerField(default=0, verbose_name="Изменение количества позиций")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Обновлено")
+
+    class Meta:
+        verbose_name = "Статистика товара за день"
+        verbose_name_plural = "Статистика товаров по дням"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'name'], name='daily_product_stats_day_name_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} за {self.day}"
+
+    @classmethod
+    def record(cls, added=(), removed=()):
+        """added / removed - названия добавленных / удаленных товаров."""
+        deltas = Counter(added)
+        deltas.subtract(Counter(removed))
+        names_by_delta = {}
+        for name, delta in deltas.items():
+            if delta:
+                names_by_delta.setdefault(delta, []).append(name)
+        if not names_by_delta:
+            return
+        StatsVersion.bump()
+
+        # Число запросов не зависит от числа названий: недостающие строки
+        # вставляются одним INSERT ... ON CONFLICT DO NOTHING, затем
+        # один UPDATE на каждое различное значение приращения (обычно +1)
+        today = timezone.localdate()
+        cls.objects.bulk_create(
+            [cls(day=today, name=name) for names in names_by_delta.values() for name in names],
+            ignore_conflicts=True
+        )
+        for delta, names in names_by_delta.items():
+            cls.objects.filter(day=today, name__in=names).update(
+                items_delta=models.F('items_delta') + delta,
+                updated_at=timezone.now()
+            )
+
+
+def daily_stats_version():
+    """Версия дневной статистики (см. StatsVersion): один SELECT по первичному ключу."""
+    return StatsVersion.current()
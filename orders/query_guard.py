@@ -0,0 +1,179 @@
+# D:\Projects\EcoPrint\orders\query_guard.py
+
+import logging
+import re
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+logger = logging.getLogger('orders.query_guard')
+
+# Сколько кадров стека (только код проекта) показывать в отчете
+STACK_DEPTH = 8
+
+# Детектор текущего запроса / блока with (см. record_query в metrics.py)
+current_query_guard = ContextVar('current_query_guard', default=None)
+
+
+class RepeatedQueryError(Exception):
+    """Один и тот же по форме SQL-запрос повторился больше порога (N+1)."""
+
+
+# === Отпечаток запроса ===
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|\?")
+_IN_LIST_RE = re.compile(r"\bIN \((?:\?, )*\?\)")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """
+    Форма запроса без значений: строки, числа и параметры -> '?',
+    списки IN (...) любой длины сводятся к одному виду.
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACES_RE.sub(' ', sql).strip()
+
+
+def project_stack():
+    """Стек вызова без кадров Django/DRF/библиотек и этого модуля."""
+    base_dir = str(Path(settings.BASE_DIR).resolve())
+    frames = [
+        frame for frame in traceback.extract_stack()[:-1]
+        if frame.filename.startswith(base_dir)
+        and 'site-packages' not in frame.filename
+        and frame.filename != __file__
+    ]
+    return ''.join(traceback.format_list(frames[-STACK_DEPTH:]))
+
+
+class QueryGuard:
+    """
+    Считает SQL-запросы по отпечаткам. Если запрос одной формы выполнился
+    больше threshold раз - это почти наверняка N+1 (запрос в цикле).
+    raise_error=True - сразу выбросить RepeatedQueryError (стек исключения
+    укажет на цикл), иначе запомнить стек и записать в лог при report().
+
+    Используется как контекстный менеджер:
+        with QueryGuard(threshold=5, raise_error=True):
+            serializer.data
+    """
+
+    def __init__(self, threshold=5, raise_error=False):
+        self.threshold = threshold
+        self.raise_error = raise_error
+        self.counts = {}
+        self.stacks = {}  # отпечаток -> стек первого превышения порога
+        self._token = None
+
+    def __enter__(self):
+        self._token = current_query_guard.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        current_query_guard.reset(self._token)
+
+    def record(self, sql):
+        shape = fingerprint(sql)
+        count = self.counts.get(shape, 0) + 1
+        self.counts[shape] = count
+        if count == self.threshold + 1:
+            if self.raise_error:
+                raise RepeatedQueryError(
+                    f"Запрос повторился больше {self.threshold} раз (N+1?): {shape}"
+                )
+            self.stacks[shape] = project_stack()
+
+    @property
+    def repeated(self):
+        """{отпечаток: число выполнений} для запросов сверх порога."""
+        return {shape: self.counts[shape] for shape in self.stacks}
+
+    def report(self, where):
+        for shape, count in self.repeated.items():
+            logger.warning(
+                "%s: запрос выполнен %d раз (N+1?): %s\nВызван из:\n%s",
+                where, count, shape, self.stacks[shape]
+            )
+
+
+def check_query(execute, sql, params, many, context):
+    """Обертка выполнения SQL: передает запрос активному QueryGuard."""
+    guard = current_query_guard.get()
+    if guard is not None:
+        guard.record(sql)
+    return execute(sql, params, many, context)
+
+
+def install_query_guard(sender, connection, **kwargs):
+    """Обработчик connection_created: подключает check_query к соединению."""
+    if check_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(check_query)
+
+
+# === Middleware (разработка, staging) ===
+class QueryGuardMiddleware:
+    """
+    Ищет N+1 в каждом запросе. Включается настройкой QUERY_GUARD_THRESHOLD
+    (0 - выключено, middleware не подключается): повтор одной формы SQL
+    больше порога пишется в лог 'orders.query_guard' со стеком, а при
+    QUERY_GUARD_RAISE=True запрос завершается ошибкой.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.threshold = getattr(settings, 'QUERY_GUARD_THRESHOLD', 0)
+        if not self.threshold:
+            raise MiddlewareNotUsed
+        self.raise_error = getattr(settings, 'QUERY_GUARD_RAISE', False)
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with QueryGuard(self.threshold, self.raise_error) as guard:
+            response = self.get_response(request)
+        guard.report(f"{request.method} {request.path}")
+        return response
+
+    async def __acall__(self, request):
+        with QueryGuard(self.threshold, self.raise_error) as guard:
+            response = await self.get_response(request)
+        guard.report(f"{request.method} {request.path}")
+        return response
+
+
+# === Бюджет запросов для тестов ===
+@contextmanager
+def assert_query_budget(view_class, action, using='default'):
+    """
+    Проверяет, что код внутри with уложился в бюджет SQL-запросов,
+    объявленный у view: view_class.query_budget[action].
+    Бюджет считается для APIClient.force_authenticate (без запросов сессии)
+    и не должен зависеть от объема данных.
+
+        with assert_query_budget(OrderViewSet, 'list'):
+            client.get('/api/orders/')
+    """
+    budget = view_class.query_budget[action]
+    with CaptureQueriesContext(connections[using]) as captured:
+        yield captured
+    if len(captured) > budget:
+        queries = '\n'.join(f"{n}. {query['sql']}" for n, query in enumerate(captured.captured_queries, 1))
+        raise AssertionError(
+            f"{view_class.__name__}.{action}: {len(captured)} SQL-запросов при бюджете {budget}:\n{queries}"
+        )
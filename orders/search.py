@@ -0,0 +1,154 @@
+# D:\Projects\EcoPrint\orders\search.py
+
+from functools import cache
+
+from django.db import connection
+from django.db.models import Case, FloatField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest, Upper
+
+from .models import Order, Item
+
+# Конфигурация полнотекстового поиска PostgreSQL (морфология русского языка)
+SEARCH_CONFIG = 'russian'
+
+# Вес совпадения подстроки (ICONTAINS) в ранге результата
+SUBSTRING_WEIGHTS = {
+    'client': 1.0,
+    'name': 1.0,
+    'comment': 0.5,
+}
+
+
+def trigram_available():
+    """
+    Установлено ли в базе расширение pg_trgm. Без него нечеткий поиск
+    отключается, а подстроки ищутся обычным LIKE без индекса.
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    return _trigram_installed(connection.settings_dict['NAME'])
+
+
+@cache
+def _trigram_installed(database_name):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+# === Выражения поиска ===
+# Индексы из миграций 0021_search_indexes и 0024_search_trigram_upper_indexes
+# построены по этим же выражениям, поэтому менять их нужно вместе с миграциями:
+# tsvector - для полнотекстового поиска, триграммы по UPPER(поле) - для
+# __icontains (на PostgreSQL это UPPER(поле) LIKE UPPER('%текст%')) и
+# нечеткого поиска.
+def order_search_vector(prefix=''):
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector(f'{prefix}client', config=SEARCH_CONFIG)
+
+
+def item_search_vector():
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector('name', 'comment', config=SEARCH_CONFIG)
+
+
+def _text_search(text, fields, vector):
+    """
+    Условие (Q) и ранг (выражение) для поиска text по полям fields.
+    fields - {поле: вес совпадения подстроки}; vector - tsvector этих
+    полей (только PostgreSQL).
+    """
+    match = Q()
+    rank = []
+    for field, weight in fields.items():
+        match |= Q(**{f'{field}__icontains': text})
+        rank.append(Case(When(**{f'{field}__icontains': text}, then=Value(weight)),
+                         default=Value(0.0), output_field=FloatField()))
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.lookups import TrigramSimilar
+        from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                    SearchVectorExact, TrigramSimilarity)
+
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+        match |= Q(SearchVectorExact(vector, query))
+        rank.append(SearchRank(vector, query))
+
+        if trigram_available():
+            # Нечеткое совпадение (опечатки): оператор % по тому же UPPER(поле),
+            # что и у __icontains, - оба условия берут один индекс gin_trgm_ops
+            for field in fields:
+                match |= Q(TrigramSimilar(Upper(field), text))
+            similarities = [TrigramSimilarity(field, text) for field in fields]
+            rank.append(Greatest(*similarities) if len(similarities) > 1 else similarities[0])
+
+    total = rank[0]
+    for part in rank[1:]:
+        total = total + part
+    return match, total
+
+
+def client_search(text, prefix=''):
+    """Поиск по клиенту заказа; prefix='order__' - для запросов к товарам."""
+    fields = {f'{prefix}client': SUBSTRING_WEIGHTS['client']}
+    vector = order_search_vector(prefix) if connection.vendor == 'postgresql' else None
+    return _text_search(text, fields, vector)
+
+
+def item_search(text):
+    """Поиск по названию и комментарию товара."""
+    fields = {field: SUBSTRING_WEIGHTS[field] for field in ('name', 'comment')}
+    vector = item_search_vector() if connection.vendor == 'postgresql' else None
+    return _text_search(text, fields, vector)
+
+
+def search_orders(queryset, text, item_filter=None, ranked=True):
+    """
+    Оставляет в queryset заказы, у которых text найден в клиенте или
+    в названии/комментарии активного товара. На PostgreSQL используются
+    полнотекстовый поиск (tsvector, русская морфология) и, если есть
+    pg_trgm, нечеткий поиск по триграммам; на SQLite - только подстрока.
+
+    item_filter (Q) - остальные фильтры списка (статус, срочность...):
+    заказ должен иметь подходящий под них товар.
+    ranked=True - сортировка по рангу (аннотация 'search_rank'),
+    затем по дате создания.
+    В 'active_items' попадают найденные товары (или все подходящие под
+    item_filter, если совпал клиент).
+    """
+    client_match, client_rank = client_search(text)
+    order_client_match, _ = client_search(text, prefix='order__')
+    item_match, item_rank = item_search(text)
+
+    # Номера найденных заказов - объединение (UNION) двух выборок, каждую
+    # из которых PostgreSQL берет по индексам поиска: совпадения в заказах
+    # и совпадения в товарах. Условие "клиент ИЛИ EXISTS(товар)" по
+    # каждому заказу проверялось бы перебором всей таблицы заказов.
+    if item_filter is None:
+        by_client = Order.objects.filter(client_match).values('pk')
+        by_item = Item.objects.filter(item_match).values('order_id')
+    else:
+        by_client = Item.objects.filter(item_filter).filter(order_client_match).values('order_id')
+        by_item = Item.objects.filter(item_filter).filter(item_match).values('order_id')
+    queryset = queryset.filter(pk__in=by_client.union(by_item))
+
+    if ranked:
+        # Ранг считается только для найденных заказов
+        matching_items = Item.objects.filter(order=OuterRef('pk')).filter(item_match)
+        if item_filter is not None:
+            matching_items = matching_items.filter(item_filter)
+        best_item_rank = matching_items.annotate(rank=item_rank) \
+                                       .order_by('-rank') \
+                                       .values('rank')[:1]
+        queryset = queryset.annotate(
+            search_rank=Greatest(
+                Case(When(client_match, then=client_rank), default=Value(0.0), output_field=FloatField()),
+                Coalesce(Subquery(best_item_rank, output_field=FloatField()), Value(0.0))
+            )
+        ).order_by('-search_rank', '-created_at')
+
+    # Товары для выдачи: найденные, а если совпал клиент - все
+    shown_items = item_match | order_client_match
+    if item_filter is not None:
+        shown_items &= item_filter
+    return queryset.with_active_items(shown_items)
@@ -1,8 +1,10 @@
 # D:\Projects\EcoPrint\orders\serializers.py (ПОЛНЫЙ ИСПРАВЛЕННЫЙ КОД)
 
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.serializers import SerializerMethodField
-from .models import Order, Item, Product
+from .models import Order, Item, ArchivedItem, Product, DailyProductStats, removal_recorded
 from django.contrib.auth.models import User
 
 # === Сериализаторы для каталогов (Users & Products) ===
@@ -41,12 +43,37 @@ class ItemSerializer(serializers.ModelSerializer):
             'comment',
             'responsible_user',
             'responsible_user_id',
-            'is_archived', # Для фильтрации в API Заказов
             'ready_at'     # Дата завершения
         ] 
 
+# === Сериализатор архивного товара (только чтение) ===
+class ArchivedItemSerializer(serializers.ModelSerializer):
+    responsible_user = UserSimpleSerializer(read_only=True)
+    client = serializers.CharField(source='order.client', read_only=True)
+
+    class Meta:
+        model = ArchivedItem
+        fields = [
+            'id',
+            'item_id',
+            'order_id',
+            'client',
+            'name',
+            'quantity',
+            'status',
+            'deadline',
+            'comment',
+            'responsible_user',
+            'ready_at',
+            'archived_at',
+        ]
+
 # === Сериализатор Товара (Item) ТОЛЬКО ДЛЯ ЗАПИСИ (POST/PUT в Order) ===
 class ItemWriteSerializer(serializers.ModelSerializer):
+    # ID существующего товара (при редактировании заказа).
+    # Без ID товар считается новым.
+    id = serializers.IntegerField(required=False)
+
     # Используем 'responsible_user_id', чтобы принимать только PK пользователя
     responsible_user_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(), 
@@ -58,6 +85,7 @@ class ItemWriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Item
         fields = [
+            'id',
             'name', 
             'quantity', 
             'status', 
@@ -66,6 +94,27 @@ class ItemWriteSerializer(serializers.ModelSerializer):
             'responsible_user_id'
         ]
 
+# === Сериализатор точечной смены статуса/ответственного у товара ===
+class ItemTransitionSerializer(serializers.Serializer):
+    # Новый статус товара
+    status = serializers.ChoiceField(choices=Item.STATUS_CHOICES, required=False)
+
+    # Статус, который клиент видел у себя (compare-and-swap).
+    # Если в базе уже другой статус, обновления не будет (409).
+    expected_status = serializers.ChoiceField(choices=Item.STATUS_CHOICES, required=False)
+
+    # Новый ответственный (PK пользователя или null)
+    responsible_user_id = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.all(),
+        allow_null=True,
+        required=False
+    )
+
+    def validate(self, attrs):
+        if 'status' not in attrs and 'responsible_user_id' not in attrs:
+            raise serializers.ValidationError("Укажите 'status' и/или 'responsible_user_id'.")
+        return attrs
+
 # === ГЛАВНЫЙ СЕРИАЛИЗАТОР ЗАКАЗА (Order) ===
 class OrderSerializer(serializers.ModelSerializer):
     
@@ -86,14 +135,24 @@ class OrderSerializer(serializers.ModelSerializer):
             'client', 
             'status', 
             'created_at', 
+            'items_total',
+            'items_ready',
+            'items_in_progress',
+            'items_not_ready',
             'items',         
             'items_write'    
         ]
+        # Счетчики ведет сервер, клиент их только читает
+        read_only_fields = ['status', 'items_total', 'items_ready', 'items_in_progress', 'items_not_ready']
 
     # Метод для получения списка товаров для чтения
     def get_items(self, obj):
-        # Отдаем только активные (не-архивированные) товары
-        active_items = obj.items.filter(is_archived=False)
+        # Отдаем только активные товары (архивные лежат в ArchivedItem).
+        # Если заказ загружен через Order.objects.with_active_items(),
+        # товары уже лежат в памяти и дополнительных запросов нет.
+        active_items = getattr(obj, 'active_items', None)
+        if active_items is None:
+            active_items = obj.items.select_related('responsible_user')
         serializer = ItemSerializer(active_items, many=True)
         return serializer.data
 
@@ -101,13 +160,33 @@ class OrderSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         # Удаляем items_write из validated_data, используя [] по умолчанию
         items_data = validated_data.pop('items_write', []) 
-        
-        # Создаем Order
-        order = Order.objects.create(**validated_data)
-        
-        # Создаем связанные Items
         for item_data in items_data:
-            Item.objects.create(order=order, **item_data)
+            item_data.pop('id', None)  # У нового заказа товаров еще нет
+        
+        # Счетчики и статус нового заказа известны заранее:
+        # заказ вставляется сразу с ними, без пересчета после каждого товара
+        statuses = [item_data.get('status', 'not-ready') for item_data in items_data]
+        counters = {
+            'items_total': len(statuses),
+            'items_ready': statuses.count('ready'),
+            'items_in_progress': statuses.count('in-progress'),
+            'items_not_ready': statuses.count('not-ready'),
+        }
+        status = Order.derive_status(
+            counters['items_total'], counters['items_ready'], counters['items_in_progress']
+        )
+
+        with transaction.atomic():
+            # Создаем Order
+            order = Order.objects.create(status=status, **counters, **validated_data)
+            
+            # Создаем связанные Items одним INSERT (Item.save() не вызывается)
+            items = [Item(order=order, **item_data) for item_data in items_data]
+            for item in items:
+                item.sync_ready_at()
+            Item.objects.bulk_create(items)
+            DailyProductStats.record(added=[item.name for item in items])
+
         return order
         
     # Логика обновления существующего заказа (PUT/PATCH)
@@ -116,19 +195,99 @@ class OrderSerializer(serializers.ModelSerializer):
         # Это предотвращает KeyError, если items_write не был передан.
         items_data = validated_data.pop('items_write', None) 
 
-        # 1. Обновляем поля Order
-        instance.client = validated_data.get('client', instance.client)
-        instance.save() 
-        
-        # 2. Обновляем Items, ТОЛЬКО если items_write был передан (items_data is not None)
-        if items_data is not None:
-            # Удаляем старые, не-архивированные товары
-            instance.items.filter(is_archived=False).delete()
+        with transaction.atomic():
+            # 1. Обновляем поля Order
+            instance.client = validated_data.get('client', instance.client)
+            instance.save() 
             
-            # Создаем новые Items
-            for item_data in items_data:
-                Item.objects.create(order=instance, **item_data)
-        
-        # 3. Обновляем общий статус Order, исходя из новых/существующих Items
-        instance.update_status() 
-        return instance
\ No newline at end of file
+            # 2. Обновляем Items, ТОЛЬКО если items_write был передан (items_data is not None)
+            if items_data is not None:
+                self._reconcile_items(instance, items_data)
+            
+            # 3. Обновляем общий статус Order, исходя из новых/существующих Items
+            instance.update_status() 
+
+        # 4. Сбрасываем предзагруженные товары, чтобы ответ отдал свежие данные
+        instance.__dict__.pop('active_items', None)
+        return instance
+
+    # Поля товара, которые можно менять через items_write
+    ITEM_WRITE_FIELDS = ['name', 'quantity', 'status', 'deadline', 'comment', 'responsible_user']
+
+    def _reconcile_items(self, order, items_data):
+        """
+        Сравнивает присланный список товаров с активными товарами заказа:
+        - товары с известным 'id' обновляются (bulk_update, только измененные),
+        - товары без 'id' создаются (bulk_create),
+        - активные товары, которых нет в списке, удаляются.
+        ID неизмененных товаров сохраняются. Item.save() не вызывается,
+        поэтому статус заказа пересчитывается один раз в update().
+        """
+        # Строки блокируются до конца транзакции update(): параллельное
+        # изменение тех же товаров (переход статуса, другой PATCH) ждет,
+        # иначе счетчики и статистика сдвигались бы от устаревших статусов.
+        # Порядок по pk - одинаковый во всех запросах, без взаимных блокировок
+        existing = {item.id: item for item in order.items.select_for_update().order_by('pk')}
+
+        to_update = []
+        to_create = []
+        # Статусы для сдвига счетчиков заказа
+        added_statuses = []
+        removed_statuses = []
+        # То же для названий (статистика товаров)
+        added_names = []
+        removed_names = []
+        for item_data in items_data:
+            item_id = item_data.pop('id', None)
+
+            if item_id is None:
+                item = Item(order=order, **item_data)
+                item.sync_ready_at()
+                to_create.append(item)
+                continue
+
+            item = existing.pop(item_id, None)
+            if item is None:
+                raise serializers.ValidationError(
+                    {'items_write': f"Товар с id={item_id} не найден среди активных товаров заказа."}
+                )
+
+            old_ready_at = item.ready_at
+            changed = False
+            for field, value in item_data.items():
+                if getattr(item, field) != value:
+                    setattr(item, field, value)
+                    changed = True
+            old_status = item._loaded_state[1]
+            item.sync_ready_at()
+            if changed or item.ready_at != old_ready_at:
+                to_update.append(item)
+                if item.status != old_status:
+                    added_statuses.append(item.status)
+                    removed_statuses.append(old_status)
+                if item.name != item._loaded_name:
+                    added_names.append(item.name)
+                    removed_names.append(item._loaded_name)
+
+        # Все, что осталось в existing, из формы удалили. Счетчики и
+        # статистику сдвигаем вместе с остальными, а не в post_delete каждого
+        if existing:
+            removed_statuses += [item._loaded_state[1] for item in existing.values()]
+            removed_names += [item._loaded_name for item in existing.values()]
+            token = removal_recorded.set(True)
+            try:
+                Item.objects.filter(pk__in=existing.keys()).delete()
+            finally:
+                removal_recorded.reset(token)
+        if to_update:
+            now = timezone.now()
+            for item in to_update:
+                item.updated_at = now
+            Item.objects.bulk_update(to_update, self.ITEM_WRITE_FIELDS + ['ready_at', 'updated_at'])
+        if to_create:
+            Item.objects.bulk_create(to_create)
+            added_statuses += [item.status for item in to_create]
+            added_names += [item.name for item in to_create]
+
+        Order.adjust_item_counters(order.id, added=added_statuses, removed=removed_statuses)
+        DailyProductStats.record(added=added_names, removed=removed_names)
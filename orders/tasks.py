@@ -0,0 +1,125 @@
+# D:\Projects\EcoPrint\orders\tasks.py
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+# === Обработчики задач ===
+# Тип задачи -> путь к функции. Функция получает payload как **kwargs
+# и должна выбросить исключение, если задачу нужно повторить.
+TASK_HANDLERS = {
+    'telegram.new_order': 'orders.telegram_bot.notify_new_order',
+    'telegram.new_orders_digest': 'orders.telegram_bot.notify_new_orders_digest',
+}
+
+# Задержка перед повтором: 10с, 20с, 40с, ... но не больше часа
+RETRY_BASE_DELAY = timedelta(seconds=10)
+RETRY_MAX_DELAY = timedelta(hours=1)
+
+# Если воркер упал посреди задачи, через это время ее заберет другой воркер
+LOCK_TIMEOUT = timedelta(minutes=10)
+
+
+class RetryLater(Exception):
+    """
+    Обработчик просит перенести задачу на delay секунд, не расходуя попытку
+    (например, Telegram ответил 429 или сервис временно отключен).
+    """
+    def __init__(self, message='', delay=0):
+        super().__init__(message)
+        self.delay = delay
+
+
+def enqueue_task(kind, run_at=None, **payload):
+    """
+    Ставит задачу в очередь. Вызывайте внутри той же транзакции, что и
+    изменение данных: тогда задача появится только вместе с ними.
+    """
+    if kind not in TASK_HANDLERS:
+        raise ValueError(f"Неизвестный тип задачи: {kind}")
+    return Task.objects.create(
+        kind=kind,
+        payload=payload,
+        run_at=run_at or timezone.now()
+    )
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка перед попыткой номер attempts + 1."""
+    return min(RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0)), RETRY_MAX_DELAY)
+
+
+def claim_tasks(limit=10):
+    """
+    Забирает до limit готовых к запуску задач через
+    SELECT ... FOR UPDATE SKIP LOCKED: несколько воркеров не возьмут
+    одну и ту же задачу и не будут ждать друг друга.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        tasks = list(
+            Task.objects.select_for_update(skip_locked=True)
+                        .filter(Q(status='pending', run_at__lte=now) |
+                                Q(status='running', locked_at__lt=now - LOCK_TIMEOUT))
+                        .order_by('run_at')[:limit]
+        )
+        if tasks:
+            Task.objects.filter(pk__in=[task.pk for task in tasks]).update(
+                status='running',
+                locked_at=now,
+                attempts=F('attempts') + 1
+            )
+    for task in tasks:
+        task.status = 'running'
+        task.locked_at = now
+        task.attempts += 1
+    return tasks
+
+
+def run_task(task):
+    """
+    Выполняет одну задачу и записывает результат.
+    Возвращает True, если задача выполнена успешно.
+    """
+    try:
+        handler = import_string(TASK_HANDLERS[task.kind])
+        handler(**task.payload)
+    except RetryLater as e:
+        task.status = 'pending'
+        task.attempts -= 1
+        task.locked_at = None
+        task.last_error = f"{type(e).__name__}: {e}"
+        task.run_at = timezone.now() + timedelta(seconds=e.delay)
+        task.save(update_fields=['status', 'attempts', 'locked_at', 'last_error', 'run_at'])
+        return False
+    except Exception as e:
+        task.last_error = f"{type(e).__name__}: {e}"
+        task.locked_at = None
+        if task.attempts >= task.max_attempts:
+            task.status = 'failed'
+            task.finished_at = timezone.now()
+        else:
+            task.status = 'pending'
+            task.run_at = timezone.now() + retry_delay(task.attempts)
+        task.save(update_fields=['status', 'last_error', 'locked_at', 'run_at', 'finished_at'])
+        print(f"Задача №{task.id} ({task.kind}) завершилась с ошибкой: {task.last_error}")
+        return False
+
+    task.status = 'done'
+    task.locked_at = None
+    task.finished_at = timezone.now()
+    task.save(update_fields=['status', 'locked_at', 'finished_at'])
+    return True
+
+
+def run_pending_tasks(limit=10):
+    """Забирает и выполняет одну пачку задач. Возвращает их количество."""
+    tasks = claim_tasks(limit)
+    for task in tasks:
+        run_task(task)
+    return len(tasks)
@@ -1,65 +1,277 @@
 # D:\Projects\EcoPrint\orders\telegram_bot.py (ПОЛНЫЙ ИСПРАВЛЕННЫЙ КОД)
 
+import html
+import threading
+import time
+from datetime import timedelta
+
 import requests
-from .models import TelegramSettings
+from requests.adapters import HTTPAdapter
 
-def send_telegram_notification(order):
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, Task, TelegramSettings
+from .tasks import RetryLater, enqueue_task
+
+
+class TelegramError(Exception):
+    """Telegram не принял сообщение (сеть, неверный токен и т.п.)."""
+
+
+class TelegramUnavailable(TelegramError, RetryLater):
     """
-    Отправляет уведомление о НОВОМ заказе в Telegram.
+    Отправка сейчас невозможна: сработал предохранитель (circuit breaker)
+    или Telegram попросил подождать (429, retry_after).
+    delay - через сколько секунд имеет смысл попробовать снова.
     """
-    
-    # 1. Загружаем наши настройки (токен и ID) из базы
-    try:
-        settings = TelegramSettings.load()
-        bot_token = settings.bot_token
-        chat_id = settings.chat_id
-        
-        # 2. Если токен или ID не заданы, ничего не делаем
-        if not bot_token or not chat_id:
-            print("Telegram-бот не настроен. Уведомление не отправлено.")
-            return
-
-        # 3. Собираем красивое сообщение
-        items_list = ""
-        for item in order.items.all():
-            items_list += f"  - {item.name} ({item.quantity} шт.)\n"
-            
-        # --- 👇 ВОТ ИСПРАВЛЕНИЕ ---
-        # У заказа больше нет 'deadline', он есть у 'item'.
-        # Возьмем дедлайн у первого товара, если он есть.
-        first_item = order.items.first()
-        deadline_str = "Не указан"
-        if first_item and first_item.deadline:
-            deadline_str = first_item.deadline.strftime('%d.%m.%Y')
-        # --- 👆 КОНЕЦ ИСПРАВЛЕНИЯ ---
-            
-        message_text = (
-            f"<b>🎉 Новый заказ! (№{order.id})</b>\n\n"
-            f"<b>Клиент:</b> {order.client}\n"
-            f"<b>Срок сдачи:</b> {deadline_str}\n\n" # 👈 Используем нашу новую 'deadline_str'
-            f"<b>Состав заказа:</b>\n"
-            f"{items_list}\n"
-            f"<i>(Сообщение от EcoPrint CRM)</i>"
-        )
-        
-        # 4. Собираем URL для API
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-        
-        # 5. Собираем данные для отправки
+
+
+# === Клиент Telegram (одно соединение + предохранитель) ===
+class TelegramClient:
+    """
+    Клиент Bot API с постоянной keep-alive сессией (TLS-соединение
+    переиспользуется между сообщениями) и предохранителем:
+    после failure_threshold ошибок подряд отправка не выполняется
+    cooldown секунд, вместо ожидания таймаута на каждом сообщении.
+    Учитывает 'retry_after' из ответов 429.
+    """
+
+    def __init__(self, base_url='https://api.telegram.org', timeout=5,
+                 failure_threshold=5, cooldown=60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self.session = requests.Session()
+        self.session.mount(self.base_url, HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._blocked_until = 0.0  # monotonic-время, до которого не отправляем
+
+        # Счетчики для мониторинга
+        self.sent = 0
+        self.failed = 0
+        self.short_circuited = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sent': self.sent,
+                'failed': self.failed,
+                'short_circuited': self.short_circuited,
+                'consecutive_failures': self._consecutive_failures,
+                'blocked_for': max(0.0, round(self._blocked_until - time.monotonic(), 1)),
+            }
+
+    def _check_blocked(self):
+        with self._lock:
+            wait = self._blocked_until - time.monotonic()
+            if wait > 0:
+                self.short_circuited += 1
+                raise TelegramUnavailable(
+                    f"Отправка приостановлена еще на {wait:.0f} с.", delay=wait
+                )
+
+    def _record_success(self):
+        with self._lock:
+            self.sent += 1
+            self._consecutive_failures = 0
+            self._blocked_until = 0.0
+
+    def _record_failure(self, retry_after=None):
+        with self._lock:
+            self.failed += 1
+            if retry_after:
+                # Ограничение частоты - не поломка: предохранитель не трогаем
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+                return
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= self.failure_threshold:
+                self._blocked_until = time.monotonic() + self.cooldown
+
+    def send_message(self, bot_token, chat_id, text):
+        """
+        Отправляет сообщение. При ошибке выбрасывает TelegramError,
+        а если отправка сейчас невозможна - TelegramUnavailable.
+        """
+        self._check_blocked()
+
+        url = f"{self.base_url}/bot{bot_token}/sendMessage"
         payload = {
             'chat_id': chat_id,
-            'text': message_text,
+            'text': text,
             'parse_mode': 'HTML' # Используем HTML для форматирования
         }
+        try:
+            response = self.session.post(url, data=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            self._record_failure()
+            raise TelegramError(str(e)) from e
+
+        if response.status_code == 429:
+            retry_after = _retry_after(response) or 1
+            self._record_failure(retry_after=retry_after)
+            raise TelegramUnavailable(
+                f"Telegram ограничил частоту, повтор через {retry_after} с.", delay=retry_after
+            )
+
+        if response.status_code != 200:
+            self._record_failure()
+            raise TelegramError(f"HTTP {response.status_code}: {response.text}")
+
+        self._record_success()
+
+
+def _retry_after(response):
+    try:
+        return int(response.json().get('parameters', {}).get('retry_after', 0))
+    except (ValueError, AttributeError):
+        return 0
+
+
+# Один клиент на процесс: соединение и состояние предохранителя общие
+telegram_client = TelegramClient()
+
+
+def build_new_order_message(order):
+    """
+    Собирает текст уведомления о НОВОМ заказе.
+    """
+    items = list(order.items.all())
 
-        # 6. Отправляем запрос!
-        response = requests.post(url, data=payload, timeout=5)
-        
-        if response.status_code == 200:
-            print(f"Уведомление для заказа №{order.id} успешно отправлено.")
+    items_list = ""
+    for item in items:
+        items_list += f"  - {html.escape(item.name)} ({item.quantity} шт.)\n"
+
+    # У заказа нет 'deadline', он есть у 'item'.
+    # Возьмем дедлайн у первого товара, если он есть.
+    deadline_str = "Не указан"
+    if items and items[0].deadline:
+        deadline_str = items[0].deadline.strftime('%d.%m.%Y')
+
+    return (
+        f"<b>🎉 Новый заказ! (№{order.id})</b>\n\n"
+        f"<b>Клиент:</b> {html.escape(order.client)}\n"
+        f"<b>Срок сдачи:</b> {deadline_str}\n\n"
+        f"<b>Состав заказа:</b>\n"
+        f"{items_list}\n"
+        f"<i>(Сообщение от EcoPrint CRM)</i>"
+    )
+
+
+# Сколько товаров одного заказа показывать в сводке
+DIGEST_ITEMS_PER_ORDER = 5
+
+
+def build_digest_message(orders, max_length):
+    """
+    Собирает одно сообщение о нескольких новых заказах.
+    Товары каждого заказа обрезаются до DIGEST_ITEMS_PER_ORDER ("+N еще"),
+    а весь текст - до max_length символов ("...и еще N заказов").
+    """
+    header = f"<b>🎉 Новые заказы: {len(orders)}</b>\n\n"
+    footer = "\n<i>(Сообщение от EcoPrint CRM)</i>"
+
+    blocks = []
+    for order in orders:
+        items = list(order.items.all())
+        shown = ", ".join(
+            f"{html.escape(item.name)} ({item.quantity} шт.)"
+            for item in items[:DIGEST_ITEMS_PER_ORDER]
+        )
+        if len(items) > DIGEST_ITEMS_PER_ORDER:
+            shown += f" +{len(items) - DIGEST_ITEMS_PER_ORDER} еще"
+        blocks.append(f"<b>№{order.id}</b> {html.escape(order.client)}: {shown or 'без товаров'}\n")
+
+    body = ""
+    for index, block in enumerate(blocks):
+        rest = len(blocks) - index
+        tail = f"...и еще {rest - 1} заказ(ов)\n" if rest > 1 else ""
+        # Оставляем место под "хвост", если этот блок окажется не последним
+        if len(header) + len(body) + len(block) + len(tail) + len(footer) > max_length:
+            body += f"...и еще {rest} заказ(ов)\n"
+            break
+        body += block
+
+    return header + body + footer
+
+
+def queue_new_order_notification(order_id):
+    """
+    Ставит уведомление о новом заказе в очередь (вызывать в транзакции заказа).
+    Если в настройках задано окно сводки, заказы, созданные в пределах окна,
+    добавляются в одну ожидающую задачу-сводку вместо отдельных сообщений.
+    """
+    settings = TelegramSettings.load()
+    if not settings.digest_window:
+        enqueue_task('telegram.new_order', order_id=order_id)
+        return
+
+    with transaction.atomic():
+        digest = Task.objects.select_for_update() \
+                             .filter(kind='telegram.new_orders_digest', status='pending') \
+                             .order_by('run_at') \
+                             .first()
+        if digest is None:
+            enqueue_task(
+                'telegram.new_orders_digest',
+                run_at=timezone.now() + timedelta(seconds=settings.digest_window),
+                order_ids=[order_id]
+            )
         else:
-            print(f"Ошибка отправки уведомления: {response.text}")
+            digest.payload['order_ids'].append(order_id)
+            digest.save(update_fields=['payload'])
 
+
+def notify_new_orders_digest(order_ids):
+    """
+    Обработчик фоновой задачи 'telegram.new_orders_digest':
+    одно сообщение о всех заказах, накопленных за окно сводки.
+    """
+    settings = TelegramSettings.load()
+    if not settings.bot_token or not settings.chat_id:
+        print("Telegram-бот не настроен. Уведомление не отправлено.")
+        return
+
+    # Удаленные за время ожидания заказы просто не попадут в сводку
+    orders = list(Order.objects.filter(pk__in=order_ids).prefetch_related('items').order_by('id'))
+    if not orders:
+        return
+
+    message = build_digest_message(orders, settings.digest_max_length)
+    telegram_client.send_message(settings.bot_token, settings.chat_id, message)
+    print(f"Сводка о {len(orders)} новых заказах успешно отправлена.")
+
+
+def notify_new_order(order_id):
+    """
+    Обработчик фоновой задачи 'telegram.new_order' (см. orders/tasks.py).
+    Выбрасывает TelegramError, чтобы очередь повторила попытку позже.
+    """
+    settings = TelegramSettings.load()
+    if not settings.bot_token or not settings.chat_id:
+        print("Telegram-бот не настроен. Уведомление не отправлено.")
+        return
+
+    order = Order.objects.filter(pk=order_id).first()
+    if order is None:
+        # Заказ успели удалить, пока задача ждала в очереди
+        return
+
+    telegram_client.send_message(settings.bot_token, settings.chat_id, build_new_order_message(order))
+    print(f"Уведомление для заказа №{order.id} успешно отправлено.")
+
+
+def send_telegram_notification(order):
+    """
+    Отправляет уведомление о НОВОМ заказе в Telegram прямо сейчас (синхронно).
+    В API заказы отправляют уведомление через очередь задач (notify_new_order).
+    """
+    try:
+        notify_new_order(order.id)
     except Exception as e:
         # Ловим любую ошибку (например, нет интернета)
-        print(f"Критическая ошибка при отправке Telegram-уведомления: {e}")
\ No newline at end of file
+        print(f"Критическая ошибка при отправке Telegram-уведомления: {e}")
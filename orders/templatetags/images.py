@@ -0,0 +1,37 @@
+# D:\Projects\EcoPrint\orders\templatetags\images.py
+
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(image, size, **attrs):
+    """
+    <picture> с уменьшенной копией изображения (варианты из orders/images.py):
+    WebP для браузеров, которые его понимают, иначе JPEG/PNG.
+
+        {% load images %}
+        {% picture request.user.profile.avatar 'sm' class="header-avatar-img" alt="Аватар" %}
+
+    Если копий еще нет (файл не обработан, см. manage.py build_thumbnails),
+    выводится исходное изображение.
+    """
+    if not image:
+        return ''
+    thumbnails = getattr(image.instance, f'{image.field.name}_thumbnails', None) or {}
+    variant = thumbnails.get(size)
+    extra = format_html_join('', ' {}="{}"', sorted(attrs.items()))
+    if variant is None:
+        return format_html('<img src="{}"{}>', image.url, extra)
+    return format_html(
+        '<picture><source srcset="{}" type="image/webp">'
+        '<img src="{}" width="{}" height="{}"{}></picture>',
+        default_storage.url(variant['webp']),
+        default_storage.url(variant['fallback']),
+        variant['width'],
+        variant['height'],
+        extra,
+    )
@@ -1,8 +1,61 @@
 # D:\Projects\EcoPrint\orders\tests.py (ПОЛНЫЙ КОД)
 
-from django.test import TestCase
+from datetime import date, datetime, timedelta
+from io import StringIO
+import io
+import asyncio
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
+
+import psycopg2
+from PIL import Image
+import requests
+
+from django.conf import settings
+from django.test import TestCase, RequestFactory, override_settings
+from django.template import Context, Template
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
 from django.contrib.auth.models import User
-from .models import Order, Item
+from rest_framework.test import APIClient
+from .models import (Order, Item, ArchivedItem, Task, TelegramSettings, CompanySettings, DailyStats, Profile, Product,
+                     daily_stats_version)
+from .views import get_statistics_payload
+from .search import item_search_vector, order_search_vector, search_orders, trigram_available
+from . import events
+from .metrics import registry as metrics_registry
+from .exporter import async_chunks
+from .forms import ProfileUpdateForm, TelegramSettingsForm
+from .images import serve_media
+from .query_guard import QueryGuard, RepeatedQueryError, assert_query_budget, fingerprint
+from .views import OrderViewSet, ItemViewSet, ArchivedItemViewSet, ProductViewSet, UserViewSet
+from .events import broker
+from .tasks import run_pending_tasks
+from .telegram_bot import TelegramClient, TelegramError, TelegramUnavailable, build_digest_message
+
+class ApiTestCase(TestCase):
+    """Тесты API: self.client_api авторизован как self.user ('manager')."""
+
+    def setUp(self):
+        self.client_api = APIClient()
+        self.user = User.objects.create_user(username='manager', password='123')
+        self.client_api.force_authenticate(self.user)
+
 
 class OrderStatusTests(TestCase):
     
@@ -92,4 +145,1572 @@ class OrderStatusTests(TestCase):
         #     (Товары: [ready], [not-ready])
         #     Это считается 'in-progress' по вашей логике
         order.refresh_from_db()
-        self.assertEqual(order.status, 'in-progress')
\ No newline at end of file
+        self.assertEqual(order.status, 'in-progress')
+
+class OrderListQueryCountTests(ApiTestCase):
+
+    def _create_orders(self, count):
+        for i in range(count):
+            order = Order.objects.create(client=f"Клиент {i}")
+            Item.objects.create(order=order, name="Визитки", responsible_user=self.user)
+            Item.objects.create(order=order, name="Буклеты", responsible_user=self.user)
+            old = Item.objects.create(order=order, name="Старый товар")
+            ArchivedItem.archive([old.pk])
+
+    def _count_list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client_api.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()['results']
+
+    def test_query_count_does_not_grow_with_orders(self):
+        """
+        Количество SQL-запросов в GET /api/orders/ не зависит
+        от количества заказов (нет N+1).
+        """
+        self._create_orders(2)
+        queries_small, data = self._count_list_queries()
+        self.assertEqual(len(data), 2)
+
+        self._create_orders(10)
+        queries_large, data = self._count_list_queries()
+        self.assertEqual(len(data), 12)
+
+        self.assertEqual(queries_small, queries_large)
+
+    def test_archived_items_are_hidden(self):
+        self._create_orders(1)
+        _, data = self._count_list_queries()
+        names = [item['name'] for item in data[0]['items']]
+        self.assertEqual(names, ["Визитки", "Буклеты"])
+        self.assertEqual(data[0]['items'][0]['responsible_user']['username'], 'manager')
+
+
+
+class OrderListFilterTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other_user = User.objects.create_user(username='designer', password='123')
+
+        today = date.today()
+        self.order_a = Order.objects.create(client="Альфа")
+        Item.objects.create(order=self.order_a, name="Визитки", status='ready',
+                            deadline=today, responsible_user=self.user)
+        Item.objects.create(order=self.order_a, name="Баннер", status='not-ready',
+                            deadline=today + timedelta(days=10), responsible_user=self.other_user)
+
+        self.order_b = Order.objects.create(client="Бета")
+        Item.objects.create(order=self.order_b, name="Буклеты", status='in-progress',
+                            deadline=today + timedelta(days=1), responsible_user=self.other_user)
+
+    def _get(self, **params):
+        response = self.client_api.get('/api/orders/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_filter_by_item_status(self):
+        data = self._get(status='ready')
+        self.assertEqual([o['id'] for o in data], [self.order_a.id])
+        self.assertEqual([i['name'] for i in data[0]['items']], ["Визитки"])
+
+    def test_filter_by_urgency(self):
+        data = self._get(urgency='very-urgent')
+        self.assertEqual([o['id'] for o in data], [self.order_b.id, self.order_a.id])
+        self.assertEqual([i['name'] for i in data[1]['items']], ["Визитки"])
+
+        data = self._get(urgency='0')
+        self.assertEqual([o['id'] for o in data], [self.order_a.id])
+
+    def test_filter_by_responsible_user_and_search(self):
+        data = self._get(responsible_user=self.other_user.id, q='Альф')
+        self.assertEqual([o['id'] for o in data], [self.order_a.id])
+        self.assertEqual([i['name'] for i in data[0]['items']], ["Баннер"])
+
+        data = self._get(q='Букл')
+        self.assertEqual([o['id'] for o in data], [self.order_b.id])
+
+    def test_invalid_filter_returns_400(self):
+        response = self.client_api.get('/api/orders/', {'status': 'lost'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_pagination(self):
+        for i in range(3):
+            Order.objects.create(client=f"Клиент {i}")
+        response = self.client_api.get('/api/orders/', {'page_size': 2})
+        page = response.json()
+        self.assertEqual(len(page['results']), 2)
+        self.assertIsNotNone(page['next'])
+
+        seen = [o['id'] for o in page['results']]
+        while page['next']:
+            page = self.client_api.get(page['next']).json()
+            seen += [o['id'] for o in page['results']]
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+
+class ItemTransitionTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.order = Order.objects.create(client="Тестовый Клиент")
+        self.item1 = Item.objects.create(order=self.order, name="Визитки")
+        self.item2 = Item.objects.create(order=self.order, name="Буклеты", status='ready')
+
+    def _transition(self, item, **data):
+        return self.client_api.patch(
+            f'/api/items/{item.id}/transition/', data, format='json'
+        )
+
+    def test_status_transition_keeps_item_ids(self):
+        response = self._transition(self.item1, status='ready', expected_status='not-ready')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['item']['id'], self.item1.id)
+        self.assertEqual(response.json()['item']['status'], 'ready')
+        self.assertEqual(response.json()['order_status'], 'ready')
+
+        self.item1.refresh_from_db()
+        self.assertIsNotNone(self.item1.ready_at)
+        self.assertEqual(
+            sorted(self.order.items.values_list('id', flat=True)),
+            sorted([self.item1.id, self.item2.id])
+        )
+
+    def test_stale_expected_status_conflicts(self):
+        response = self._transition(self.item2, status='not-ready', expected_status='in-progress')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['item']['status'], 'ready')
+
+        self.item2.refresh_from_db()
+        self.assertEqual(self.item2.status, 'ready')
+        self.assertIsNotNone(self.item2.ready_at)
+
+    def test_responsible_user_transition(self):
+        response = self._transition(self.item1, responsible_user_id=self.user.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['item']['responsible_user']['id'], self.user.id)
+        self.assertEqual(response.json()['order_status'], 'in-progress')
+
+    def test_transition_without_expected_status_is_unconditional(self):
+        # Без expected_status - не compare-and-swap: строка читается под
+        # блокировкой, UPDATE не сравнивает статус и не может дать 409
+        with CaptureQueriesContext(connection) as queries:
+            response = self._transition(self.item2, status='in-progress')
+        self.assertEqual(response.status_code, 200)
+        item_queries = [query['sql'] for query in queries.captured_queries if 'orders_item' in query['sql']]
+        select = next(sql for sql in item_queries if sql.startswith('SELECT'))
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', select)
+        update = next(sql for sql in item_queries if sql.startswith('UPDATE "orders_item"'))
+        self.assertNotIn('status', update.rsplit(' WHERE ', 1)[1])
+
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.items_ready, self.order.items_in_progress), (0, 1))
+        call_command('rebuild_order_counters', '--check', stdout=StringIO())
+
+    def test_unknown_item_returns_404(self):
+        response = self.client_api.patch('/api/items/999999/transition/', {'status': 'ready'}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+class OrderItemsReconcileTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.order = Order.objects.create(client="Тестовый Клиент")
+        self.keep = Item.objects.create(order=self.order, name="Визитки", quantity=100)
+        self.change = Item.objects.create(order=self.order, name="Буклеты", quantity=50)
+        self.remove = Item.objects.create(order=self.order, name="Баннер")
+        self.archived = Item.objects.create(order=self.order, name="Старый")
+        ArchivedItem.archive([self.archived.pk])
+
+    def _put(self, items):
+        return self.client_api.put(
+            f'/api/orders/{self.order.id}/',
+            {'client': "Тестовый Клиент", 'items_write': items},
+            format='json'
+        )
+
+    def test_update_diffs_items_by_id(self):
+        response = self._put([
+            {'id': self.keep.id, 'name': "Визитки", 'quantity': 100, 'status': 'not-ready'},
+            {'id': self.change.id, 'name': "Буклеты", 'quantity': 50, 'status': 'ready'},
+            {'name': "Календарь", 'quantity': 10, 'status': 'ready'},
+        ])
+        self.assertEqual(response.status_code, 200)
+
+        ids = set(self.order.items.values_list('id', flat=True))
+        self.assertIn(self.keep.id, ids)
+        self.assertIn(self.change.id, ids)
+        self.assertNotIn(self.remove.id, ids)
+        self.assertEqual(len(ids), 3)
+        self.assertTrue(ArchivedItem.objects.filter(item_id=self.archived.pk).exists())
+
+        self.change.refresh_from_db()
+        self.assertEqual(self.change.status, 'ready')
+        self.assertIsNotNone(self.change.ready_at)
+        new_item = self.order.items.get(name="Календарь")
+        self.assertIsNotNone(new_item.ready_at)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'in-progress')
+        self.assertEqual(len(response.json()['items']), 3)
+
+    @skipUnless(connection.features.has_select_for_update, "Нет SELECT ... FOR UPDATE")
+    def test_existing_items_are_locked(self):
+        with CaptureQueriesContext(connection) as queries:
+            self._put([{'id': self.keep.id, 'name': "Визитки", 'quantity': 100, 'status': 'ready'}])
+        locks = [query['sql'] for query in queries.captured_queries
+                 if query['sql'].startswith('SELECT') and query['sql'].endswith('FOR UPDATE')]
+        self.assertTrue(any(
+            re.search(r'FROM "orders_item" WHERE .*"order_id" = .* ORDER BY "orders_item"\."id" ASC FOR UPDATE$', sql)
+            for sql in locks
+        ), locks)
+
+    def test_unknown_item_id_is_rejected(self):
+        response = self._put([{'id': self.archived.id, 'name': "Старый", 'status': 'ready'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.order.items.count(), 3)
+
+
+class OrderCounterTests(TestCase):
+
+    def setUp(self):
+        self.order = Order.objects.create(client="Тестовый Клиент")
+
+    def _counters(self):
+        self.order.refresh_from_db()
+        return (self.order.items_total, self.order.items_ready,
+                self.order.items_in_progress, self.order.items_not_ready)
+
+    def test_counters_follow_item_changes(self):
+        item1 = Item.objects.create(order=self.order, name="Визитки")
+        item2 = Item.objects.create(order=self.order, name="Буклеты", status='ready')
+        self.assertEqual(self._counters(), (2, 1, 0, 1))
+        self.assertEqual(self.order.status, 'in-progress')
+
+        item1.status = 'ready'
+        item1.save()
+        self.assertEqual(self._counters(), (2, 2, 0, 0))
+        self.assertEqual(self.order.status, 'ready')
+
+        item2.delete()
+        self.assertEqual(self._counters(), (1, 1, 0, 0))
+        self.assertEqual(self.order.status, 'ready')
+
+        Item.objects.filter(pk=item1.pk).delete()
+        self.assertEqual(self._counters(), (0, 0, 0, 0))
+        self.assertEqual(self.order.status, 'not-ready')
+
+    def test_update_status_does_not_read_items(self):
+        Item.objects.create(order=self.order, name="Визитки", status='in-progress')
+        with self.assertNumQueries(1):
+            self.order.update_status()
+        self.assertEqual(self.order.status, 'in-progress')
+
+    def test_rebuild_command_fixes_drift(self):
+        Item.objects.create(order=self.order, name="Визитки", status='ready')
+        Order.objects.filter(pk=self.order.pk).update(items_total=5, items_ready=0, status='not-ready')
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_order_counters', '--check', stdout=StringIO())
+
+        call_command('rebuild_order_counters', stdout=StringIO())
+        self.assertEqual(self._counters(), (1, 1, 0, 0))
+        self.assertEqual(self.order.status, 'ready')
+        call_command('rebuild_order_counters', '--check', stdout=StringIO())
+
+
+class OrderCreateTests(ApiTestCase):
+
+    def _post(self, items):
+        return self.client_api.post(
+            '/api/orders/',
+            {'client': "Новый Клиент", 'items_write': items},
+            format='json'
+        )
+
+    def test_create_sets_counters_status_and_ready_at(self):
+        response = self._post([
+            {'name': "Визитки", 'status': 'ready', 'responsible_user_id': self.user.id},
+            {'name': "Буклеты", 'status': 'not-ready'},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['status'], 'in-progress')
+        self.assertEqual(len(response.json()['items']), 2)
+
+        order = Order.objects.get(pk=response.json()['id'])
+        self.assertEqual((order.items_total, order.items_ready, order.items_not_ready), (2, 1, 1))
+        self.assertIsNotNone(order.items.get(name="Визитки").ready_at)
+        self.assertIsNone(order.items.get(name="Буклеты").ready_at)
+
+    def test_create_query_count_does_not_grow_with_items(self):
+        small = [{'name': f"Товар {i}"} for i in range(2)]
+        large = [{'name': f"Товар {i}", 'status': 'ready'} for i in range(30)]
+        self._post(small)  # Прогрев: первое обращение создает настройки Telegram
+
+        with CaptureQueriesContext(connection) as ctx_small:
+            self._post(small)
+        with CaptureQueriesContext(connection) as ctx_large:
+            response = self._post(large)
+
+        self.assertEqual(len(ctx_small.captured_queries), len(ctx_large.captured_queries))
+        self.assertEqual(response.json()['status'], 'ready')
+
+
+class TaskQueueTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        settings = TelegramSettings.load(use_cache=False)
+        settings.bot_token = 'test-token'
+        settings.chat_id = '42'
+        settings.save()
+        self.addCleanup(TelegramSettings.clear_cache)
+
+        # Свежий клиент на каждый тест, чтобы не тянуть состояние предохранителя
+        self.telegram_client = TelegramClient()
+        patcher = mock.patch('orders.telegram_bot.telegram_client', self.telegram_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _create_order(self):
+        response = self.client_api.post(
+            '/api/orders/',
+            {'client': "Клиент", 'items_write': [{'name': "Визитки"}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def test_order_creation_enqueues_notification(self):
+        with mock.patch.object(self.telegram_client.session, 'post') as post:
+            order_id = self._create_order()
+            post.assert_not_called()
+
+        task = Task.objects.get()
+        self.assertEqual(task.kind, 'telegram.new_order')
+        self.assertEqual(task.payload, {'order_id': order_id})
+        self.assertEqual(task.status, 'pending')
+
+    def test_worker_sends_and_marks_done(self):
+        self._create_order()
+        with mock.patch.object(self.telegram_client.session, 'post') as post:
+            post.return_value.status_code = 200
+            self.assertEqual(run_pending_tasks(), 1)
+            post.assert_called_once()
+
+        task = Task.objects.get()
+        self.assertEqual(task.status, 'done')
+        self.assertEqual(task.attempts, 1)
+
+    def test_worker_retries_with_backoff_then_fails(self):
+        self._create_order()
+        Task.objects.update(max_attempts=2)
+
+        with mock.patch.object(self.telegram_client.session, 'post',
+                               side_effect=requests.ConnectionError("нет сети")):
+            self.assertEqual(run_pending_tasks(), 1)
+            task = Task.objects.get()
+            self.assertEqual(task.status, 'pending')
+            self.assertIn("нет сети", task.last_error)
+            self.assertGreater(task.run_at, timezone.now())
+
+            # До истечения задержки задача не берется повторно
+            self.assertEqual(run_pending_tasks(), 0)
+
+            Task.objects.update(run_at=timezone.now())
+            self.assertEqual(run_pending_tasks(), 1)
+
+        task = Task.objects.get()
+        self.assertEqual(task.status, 'failed')
+        self.assertEqual(task.attempts, 2)
+        self.assertIsNotNone(task.finished_at)
+
+
+
+    def test_rate_limit_reschedules_without_spending_attempt(self):
+        self._create_order()
+        response = mock.Mock(status_code=429)
+        response.json.return_value = {'ok': False, 'parameters': {'retry_after': 120}}
+        with mock.patch.object(self.telegram_client.session, 'post', return_value=response):
+            run_pending_tasks()
+
+        task = Task.objects.get()
+        self.assertEqual(task.status, 'pending')
+        self.assertEqual(task.attempts, 0)
+        self.assertGreater(task.run_at, timezone.now() + timedelta(seconds=100))
+
+
+    def test_digest_window_coalesces_orders(self):
+        settings = TelegramSettings.load(use_cache=False)
+        settings.digest_window = 30
+        settings.save()
+
+        first_id = self._create_order()
+        second_id = self._create_order()
+
+        task = Task.objects.get()
+        self.assertEqual(task.kind, 'telegram.new_orders_digest')
+        self.assertEqual(task.payload, {'order_ids': [first_id, second_id]})
+        self.assertGreater(task.run_at, timezone.now() + timedelta(seconds=20))
+
+        Task.objects.update(run_at=timezone.now())
+        with mock.patch.object(self.telegram_client.session, 'post') as post:
+            post.return_value.status_code = 200
+            self.assertEqual(run_pending_tasks(), 1)
+            post.assert_called_once()
+            text = post.call_args.kwargs['data']['text']
+        self.assertIn(f"№{first_id}", text)
+        self.assertIn(f"№{second_id}", text)
+
+    def test_digest_message_respects_size_budget(self):
+        orders = []
+        for i in range(20):
+            order = Order.objects.create(client=f"Клиент <{i}>")
+            Item.objects.bulk_create([Item(order=order, name=f"Товар {n}") for n in range(8)])
+            orders.append(order)
+
+        text = build_digest_message(orders, max_length=600)
+        self.assertLessEqual(len(text), 600)
+        self.assertIn("+3 еще", text)
+        self.assertIn("...и еще", text)
+        self.assertIn("&lt;0&gt;", text)
+
+    def test_digest_max_length_limits(self):
+        data = {'bot_token': "token", 'chat_id': "1", 'digest_window': 30}
+        for length, valid in ((0, False), (499, False), (500, True), (4096, True), (4097, False)):
+            form = TelegramSettingsForm({**data, 'digest_max_length': length},
+                                        instance=TelegramSettings.load(use_cache=False))
+            self.assertEqual(form.is_valid(), valid, length)
+
+
+class StubTelegramHandler(BaseHTTPRequestHandler):
+    """Локальная заглушка Bot API: отвечает по очереди из server.responses."""
+    # keep-alive: по server.client_ports видно, переиспользуется ли соединение
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests_count += 1
+        self.server.client_ports.append(self.client_address[1])
+        status_code, body = self.server.responses.pop(0) if self.server.responses else (200, {'ok': True})
+        data = json.dumps(body).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TelegramClientTests(TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubTelegramHandler)
+        self.server.responses = []
+        self.server.requests_count = 0
+        self.server.client_ports = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.client = TelegramClient(
+            base_url=f'http://127.0.0.1:{self.server.server_port}',
+            failure_threshold=2,
+            cooldown=60
+        )
+
+    def test_success_reuses_session(self):
+        self.client.send_message('token', '42', "Привет")
+        self.client.send_message('token', '42', "Еще раз")
+        self.assertEqual(self.client.stats()['sent'], 2)
+        self.assertEqual(self.server.requests_count, 2)
+        # Оба запроса пришли по одному TCP-соединению из пула сессии
+        self.assertEqual(len(set(self.server.client_ports)), 1)
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        self.server.responses = [(500, {'ok': False}), (502, {'ok': False})]
+        for _ in range(2):
+            with self.assertRaises(TelegramError):
+                self.client.send_message('token', '42', "Привет")
+
+        with self.assertRaises(TelegramUnavailable) as ctx:
+            self.client.send_message('token', '42', "Привет")
+        self.assertGreater(ctx.exception.delay, 0)
+
+        stats = self.client.stats()
+        self.assertEqual((stats['sent'], stats['failed'], stats['short_circuited']), (0, 2, 1))
+        self.assertEqual(self.server.requests_count, 2)
+
+    def test_retry_after_is_honoured(self):
+        self.server.responses = [(429, {'ok': False, 'parameters': {'retry_after': 30}})]
+        with self.assertRaises(TelegramUnavailable) as ctx:
+            self.client.send_message('token', '42', "Привет")
+        self.assertEqual(ctx.exception.delay, 30)
+
+        with self.assertRaises(TelegramUnavailable):
+            self.client.send_message('token', '42', "Привет")
+        self.assertEqual(self.server.requests_count, 1)
+        self.assertEqual(self.client.stats()['consecutive_failures'], 0)
+
+
+
+class SingletonSettingsCacheTests(TestCase):
+
+    def setUp(self):
+        CompanySettings.clear_cache()
+        self.addCleanup(CompanySettings.clear_cache)
+
+    def test_steady_state_reads_are_zero_query(self):
+        CompanySettings.load()
+        with self.assertNumQueries(0):
+            settings = CompanySettings.load()
+        self.assertEqual(settings.pk, 1)
+
+    def test_local_save_invalidates_cache(self):
+        CompanySettings.load()
+        editable = CompanySettings.load(use_cache=False)
+        editable.company_name = "ЭкоПринт"
+        editable.save()
+        self.assertEqual(CompanySettings.load().company_name, "ЭкоПринт")
+
+    def test_other_worker_save_is_seen_after_version_check(self):
+        cached = CompanySettings.load()
+
+        # Другой процесс сохранил настройки (новая метка версии),
+        # а в памяти нашего процесса остался старый объект
+        CompanySettings.objects.filter(pk=1).update(company_name="Новое имя", version=uuid.uuid4())
+
+        self.assertEqual(CompanySettings.load().company_name, "")
+
+        # Истек интервал проверки: одна проверка метки версии и перечитывание
+        CompanySettings._cached = (cached, -CompanySettings.CACHE_CHECK_INTERVAL)
+        self.assertEqual(CompanySettings.load().company_name, "Новое имя")
+
+        # Метка не менялась: только легкий SELECT версии
+        CompanySettings._cached = (CompanySettings._cached[0], -CompanySettings.CACHE_CHECK_INTERVAL)
+        with self.assertNumQueries(1):
+            CompanySettings.load()
+
+
+@skipUnless(connection.vendor == 'postgresql', "EXPLAIN-тесты рассчитаны на PostgreSQL")
+class HotPathQueryPlanTests(TestCase):
+    """
+    Проверяет, что горячие запросы обслуживаются индексами.
+    Планировщику запрещаются последовательные сканирования
+    (enable_seqscan = off): если в плане все равно остался Seq Scan,
+    значит ни один индекс не подходит к запросу.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='manager', password='123')
+        today = date.today()
+        statuses = ['not-ready', 'in-progress', 'ready']
+
+        orders = Order.objects.bulk_create(
+            [Order(client=f"Клиент {i}", status=statuses[i % 3]) for i in range(3000)]
+        )
+        # Активны товары каждого десятого заказа, остальные - в архиве
+        items = []
+        archived = []
+        for i, order in enumerate(orders):
+            for n in range(3):
+                fields = dict(
+                    order=order,
+                    name=f"Товар {n}",
+                    status=statuses[(i + n) % 3],
+                    deadline=today + timedelta(days=(i + n) % 60 - 30),
+                    responsible_user=cls.user if n == 0 else None,
+                )
+                if i % 10 == 0:
+                    items.append(Item(**fields))
+                else:
+                    archived.append(ArchivedItem(item_id=len(archived) + 1_000_000, **fields))
+        Item.objects.bulk_create(items, batch_size=2000)
+        ArchivedItem.objects.bulk_create(archived, batch_size=2000)
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE orders_order")
+            cursor.execute("ANALYZE orders_item")
+            cursor.execute("ANALYZE orders_archiveditem")
+
+    def assertUsesIndex(self, queryset):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        self.assertNotIn("Seq Scan", plan, plan)
+
+    def test_order_list_page(self):
+        self.assertUsesIndex(Order.objects.order_by('-created_at')[:50])
+
+    def test_orders_by_status(self):
+        self.assertUsesIndex(Order.objects.filter(status='in-progress').values('id'))
+
+    def test_orders_created_today(self):
+        start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.assertUsesIndex(Order.objects.filter(created_at__gte=start).values('id'))
+
+    def test_active_items_by_deadline(self):
+        today = date.today()
+        self.assertUsesIndex(Item.objects.filter(
+            deadline__gte=today, deadline__lte=today + timedelta(days=2)
+        ))
+
+    def test_active_items_by_status_and_deadline(self):
+        today = date.today()
+        self.assertUsesIndex(Item.objects.filter(
+            status='not-ready', deadline__lte=today + timedelta(days=1)
+        ))
+
+    def test_active_items_of_responsible_user(self):
+        self.assertUsesIndex(Item.objects.filter(responsible_user=self.user))
+
+    def test_auto_archive_candidates(self):
+        cutoff = timezone.now() - timedelta(days=30)
+        self.assertUsesIndex(
+            Item.objects.filter(status='ready', ready_at__lt=cutoff).order_by('ready_at', 'pk')[:500]
+        )
+
+    def test_urgent_items(self):
+        today = date.today()
+        self.assertUsesIndex(Item.objects.filter(
+            status__in=['not-ready', 'in-progress'],
+            deadline__gte=today, deadline__lte=today + timedelta(days=1)
+        ))
+
+    def test_fulltext_search(self):
+        from django.contrib.postgres.search import SearchQuery, SearchVectorExact
+
+        query = SearchQuery("товары", config='russian', search_type='websearch')
+        self.assertUsesIndex(Item.objects.filter(SearchVectorExact(item_search_vector(), query)))
+        self.assertUsesIndex(Order.objects.filter(SearchVectorExact(order_search_vector(), query)))
+
+    def test_search_orders(self):
+        if not trigram_available():
+            self.skipTest("Без pg_trgm подстрока ищется без индекса")
+        self.assertUsesIndex(search_orders(Order.objects.order_by('-created_at'), "иент 12"))
+        self.assertUsesIndex(search_orders(
+            Order.objects.order_by('-created_at'), "вар 1", Q(status='ready'), ranked=False
+        ))
+
+
+class DailyStatsTests(ApiTestCase):
+    """
+    Дашборд читает дневные сводки; результат должен совпадать
+    с подсчетом "в лоб" по таблицам заказов и товаров.
+    """
+
+    def setUp(self):
+        # Версия статистики в каждом тесте начинается заново (откат
+        # транзакции), кэш с прошлых тестов подсунул бы чужие данные
+        cache.clear()
+        self.addCleanup(cache.clear)
+        super().setUp()
+
+    def _expected(self):
+        statuses = {}
+        for order in Order.objects.all():
+            statuses[order.status] = statuses.get(order.status, 0) + 1
+        names = {}
+        for item in Item.objects.all():
+            names[item.name] = names.get(item.name, 0) + 1
+        today = timezone.localdate()
+        return {
+            'total_orders': Order.objects.count(),
+            'pending_orders': statuses.get('in-progress', 0),
+            'created_today': Order.objects.filter(created_at__date=today).count(),
+            'status_counts': {'labels': sorted(statuses), 'counts': [statuses[s] for s in sorted(statuses)]},
+            'top_product_count': max(names.values(), default=0),
+            'names': names,
+        }
+
+    def assertStatsMatch(self):
+        data = self.client_api.get('/api/statistics-data/').json()
+        expected = self._expected()
+        self.assertEqual(data['total_orders'], expected['total_orders'])
+        self.assertEqual(data['pending_orders'], expected['pending_orders'])
+        self.assertEqual(data['created_today'], expected['created_today'])
+        self.assertEqual(data['activity_last_7_days']['counts'][-1], expected['created_today'])
+        self.assertEqual(data['status_counts'], expected['status_counts'])
+        if expected['names']:
+            self.assertEqual(expected['names'][data['top_product']], expected['top_product_count'])
+        else:
+            self.assertEqual(data['top_product'], "Нет")
+
+    def test_rollups_follow_order_changes(self):
+        self.assertStatsMatch()
+
+        response = self.client_api.post('/api/orders/', {
+            'client': "Альфа",
+            'items_write': [{'name': "Визитки"}, {'name': "Визитки", 'status': 'ready'}],
+        }, format='json')
+        first = Order.objects.get(pk=response.json()['id'])
+        second = Order.objects.create(client="Бета")
+        item = Item.objects.create(order=second, name="Буклеты")
+        self.assertStatsMatch()
+
+        item.status = 'ready'
+        item.name = "Календарь"
+        item.save()
+        self.assertStatsMatch()
+
+        self.client_api.put(f'/api/orders/{first.id}/', {
+            'client': "Альфа",
+            'items_write': [{'name': "Календарь", 'status': 'ready'}],
+        }, format='json')
+        self.assertStatsMatch()
+
+        third = Order.objects.create(client="Гамма")
+        Item.objects.create(order=third, name="Баннер", status='in-progress')
+        second.delete()
+        self.assertStatsMatch()
+
+        # Удаление заказа не пишет промежуточных переходов статуса
+        self.assertEqual(DailyStats.objects.get().ready_delta, 1)
+
+    def test_rebuild_command_matches_incremental_rollups(self):
+        order = Order.objects.create(client="Альфа")
+        Item.objects.create(order=order, name="Визитки", status='ready')
+        Item.objects.create(order=Order.objects.create(client="Бета"), name="Визитки")
+        before = self.client_api.get('/api/statistics-data/').json()
+
+        call_command('rebuild_daily_stats', stdout=StringIO())
+        self.assertEqual(self.client_api.get('/api/statistics-data/').json(), before)
+        self.assertStatsMatch()
+
+
+class StatisticsCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client_api = APIClient()
+        Item.objects.create(order=Order.objects.create(client="Альфа"), name="Визитки")
+
+    def test_etag_and_not_modified(self):
+        response = self.client_api.get('/api/statistics-data/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        # Повторный запрос с тем же ETag: только чтение версии, без агрегатов
+        with self.assertNumQueries(1):
+            response = self.client_api.get('/api/statistics-data/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Без If-None-Match ответ берется из кэша
+        with self.assertNumQueries(1):
+            response = self.client_api.get('/api/statistics-data/')
+        self.assertEqual(response.json()['total_orders'], 1)
+
+        Order.objects.create(client="Бета")
+        response = self.client_api.get('/api/statistics-data/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['total_orders'], 2)
+
+    def test_version_grows_with_every_stats_change(self):
+        versions = [daily_stats_version()]
+        order = Order.objects.create(client="Бета")
+        versions.append(daily_stats_version())
+        item = Item.objects.create(order=order, name="Буклеты")
+        versions.append(daily_stats_version())
+        item.status = 'ready'
+        item.save()
+        versions.append(daily_stats_version())
+        call_command('rebuild_daily_stats', stdout=StringIO())
+        versions.append(daily_stats_version())
+        self.assertEqual(versions, sorted(set(versions)))
+
+    def test_concurrent_misses_compute_payload_once(self):
+        calls = []
+        started = threading.Event()
+
+        def slow_build():
+            calls.append(1)
+            started.set()
+            time.sleep(0.3)
+            return {'total_orders': 42}
+
+        results = []
+        with mock.patch('orders.views.build_statistics_payload', side_effect=slow_build):
+            threads = [
+                threading.Thread(target=lambda: results.append(get_statistics_payload('v1')))
+                for _ in range(5)
+            ]
+            threads[0].start()
+            started.wait(1)
+            for thread in threads[1:]:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'total_orders': 42}] * 5)
+
+
+class OrderChangesFeedTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.order = Order.objects.create(client="Альфа")
+        self.item = Item.objects.create(order=self.order, name="Визитки")
+        self.other = Order.objects.create(client="Бета")
+
+    def _changes(self, cursor=None):
+        url = '/api/orders/changes/' + (f'?since={cursor}' if cursor else '')
+        response = self.client_api.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _age_all(self):
+        # Все, что было до курсора, сдвигаем за пределы запаса CHANGES_OVERLAP
+        past = timezone.now() - timedelta(minutes=1)
+        Order.objects.update(updated_at=past)
+
+    def test_changes_since_cursor(self):
+        first = self._changes()
+        self.assertTrue(first['reset'])
+        self._age_all()
+
+        # Смена ответственного не меняет счетчики, но заказ должен попасть в ленту
+        self.client_api.patch(
+            f'/api/items/{self.item.id}/transition/', {'responsible_user_id': self.user.id}, format='json'
+        )
+        new_order = Order.objects.create(client="Гамма")
+        deleted_id = self.other.id
+        self.other.delete()
+
+        data = self._changes(first['cursor'])
+        self.assertFalse(data['reset'])
+        self.assertEqual(sorted(o['id'] for o in data['orders']), sorted([self.order.id, new_order.id]))
+        changed = next(o for o in data['orders'] if o['id'] == self.order.id)
+        self.assertEqual(changed['items'][0]['responsible_user']['id'], self.user.id)
+        self.assertEqual(data['deleted'], [deleted_id])
+
+        self._age_all()
+        data = self._changes(data['cursor'])
+        self.assertEqual(data['orders'], [])
+
+    def test_item_status_change_touches_order(self):
+        cursor = self._changes()['cursor']
+        self._age_all()
+        self.item.status = 'ready'
+        self.item.save()
+        data = self._changes(cursor)
+        self.assertEqual([o['status'] for o in data['orders']], ['ready'])
+
+    def test_stale_or_invalid_cursor(self):
+        stale = int((timezone.now() - timedelta(days=2)).timestamp() * 1_000_000)
+        self.assertTrue(self._changes(stale)['reset'])
+        response = self.client_api.get('/api/orders/changes/?since=abc')
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderEventsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='manager', password='123')
+
+    async def _open_stream(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/api/order-events/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertIn("retry:", (await anext(stream)).decode())
+        return stream
+
+    def test_wsgi_request_does_not_open_stream(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/api/order-events/')
+        self.assertEqual(response.status_code, 204)
+
+    async def test_stream_delivers_published_events(self):
+        stream = await self._open_stream()
+        self.assertEqual(broker.subscriber_count, 1)
+
+        # publish() вызывается из потоков синхронного кода
+        payload = json.dumps({'type': 'order.changed', 'order_id': 7})
+        await asyncio.to_thread(broker.publish, payload)
+        chunk = await asyncio.wait_for(anext(stream), 5)
+        self.assertEqual(chunk.decode(), f"data: {payload}\n\n")
+
+        # Клиент отключился: ASGI-сервер отменяет задачу, читающую поток
+        reader = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.05)
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+        self.assertEqual(broker.subscriber_count, 0)
+
+    @skipUnless(connection.vendor == 'postgresql', "LISTEN/NOTIFY есть только в PostgreSQL")
+    async def test_stream_receives_notify_from_other_connection(self):
+        stream = await self._open_stream()
+        self.addCleanup(broker.stop_listening)
+
+        # NOTIFY из другого процесса (отдельное соединение, сразу COMMIT)
+        def notify():
+            other = psycopg2.connect(**connection.get_connection_params())
+            other.autocommit = True
+            with other.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", [events.CHANNEL, '{"order_id": 5}'])
+            other.close()
+        await asyncio.to_thread(notify)
+
+        chunk = await asyncio.wait_for(anext(stream), 5)
+        self.assertEqual(chunk.decode(), 'data: {"order_id": 5}\n\n')
+
+
+class UrgentItemsTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        today = date.today()
+        order = Order.objects.create(client="Альфа")
+        self.due_today = Item.objects.create(order=order, name="Визитки", deadline=today)
+        self.due_tomorrow = Item.objects.create(
+            order=order, name="Буклеты", deadline=today + timedelta(days=1), status='in-progress'
+        )
+        Item.objects.create(order=order, name="Готово", deadline=today, status='ready')
+        ArchivedItem.archive([Item.objects.create(order=order, name="Архив", deadline=today).pk])
+        Item.objects.create(order=order, name="Позже", deadline=today + timedelta(days=5))
+
+    def _ids(self, url):
+        response = self.client_api.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()]
+
+    def test_default_respects_day_before_setting(self):
+        self.assertEqual(self._ids('/api/items/urgent/'), [self.due_today.id, self.due_tomorrow.id])
+
+        Profile.objects.filter(user=self.user).update(day_before_notifications=False)
+        self.assertEqual(self._ids('/api/items/urgent/'), [self.due_today.id])
+
+    def test_compact_payload_and_days_param(self):
+        with self.assertNumQueries(1):
+            response = self.client_api.get('/api/items/urgent/?days=0')
+        self.assertEqual(response.json(), [{
+            'id': self.due_today.id,
+            'order_id': self.due_today.order_id,
+            'client': "Альфа",
+            'name': "Визитки",
+            'status': 'not-ready',
+            'deadline': date.today().isoformat(),
+            'days_left': 0,
+        }])
+        self.assertEqual(len(self._ids('/api/items/urgent/?days=7')), 3)
+        self.assertEqual(self.client_api.get('/api/items/urgent/?days=x').status_code, 400)
+        self.assertEqual(self.client_api.get('/api/items/urgent/?days=365').status_code, 400)
+
+
+class ArchiveTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.order = Order.objects.create(client="Альфа")
+        self.done = Item.objects.create(order=self.order, name="Визитки", status='ready')
+        self.live = Item.objects.create(order=self.order, name="Буклеты")
+
+    def test_archive_moves_item_and_keeps_counters(self):
+        self.assertEqual(ArchivedItem.archive([self.done.pk]), 1)
+
+        self.assertFalse(Item.objects.filter(pk=self.done.pk).exists())
+        archived = ArchivedItem.objects.get(item_id=self.done.pk)
+        self.assertEqual((archived.order_id, archived.name, archived.status),
+                         (self.order.id, "Визитки", 'ready'))
+        self.assertIsNotNone(archived.ready_at)
+
+        # Архивный товар остается в счетчиках и статусе заказа
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.items_total, self.order.items_ready), (2, 1))
+        self.assertEqual(self.order.status, 'in-progress')
+        call_command('rebuild_order_counters', '--check', stdout=StringIO())
+
+        # Удаление заказа удаляет и архив
+        self.order.delete()
+        self.assertFalse(ArchivedItem.objects.exists())
+
+    def test_archive_api_keyset_pages_and_filters(self):
+        other = Order.objects.create(client="Бета")
+        ids = [Item.objects.create(order=other, name=f"Товар {i}").pk for i in range(5)]
+        ArchivedItem.archive([self.done.pk])
+        ArchivedItem.archive(ids)
+        ArchivedItem.objects.filter(item_id=self.done.pk) \
+                            .update(archived_at=timezone.now() - timedelta(days=10))
+
+        response = self.client_api.get('/api/archive/?page_size=4')
+        page = response.json()
+        self.assertEqual(len(page['results']), 4)
+        self.assertIn('cursor=', page['next'])
+        rest = self.client_api.get(page['next']).json()
+        self.assertEqual(len(rest['results']), 2)
+        self.assertEqual(rest['results'][-1]['item_id'], self.done.pk)
+
+        by_client = self.client_api.get('/api/archive/?client=Альф').json()['results']
+        self.assertEqual([row['item_id'] for row in by_client], [self.done.pk])
+        self.assertEqual(by_client[0]['client'], "Альфа")
+
+        old_day = (timezone.localdate() - timedelta(days=10)).isoformat()
+        by_date = self.client_api.get(f'/api/archive/?date_from={old_day}&date_to={old_day}').json()
+        self.assertEqual([row['item_id'] for row in by_date['results']], [self.done.pk])
+        self.assertEqual(self.client_api.get('/api/archive/?date_from=вчера').status_code, 400)
+
+    def test_archive_pages_with_equal_archived_at(self):
+        # Один вызов archive() - одно archived_at на все строки,
+        # больше offset_cutoff (1000) строк: курсор не должен зацикливаться
+        items = Item.objects.bulk_create([Item(order=self.order, name=f"Товар {i}") for i in range(1300)])
+        ArchivedItem.archive([item.pk for item in items])
+        self.assertEqual(ArchivedItem.objects.values('archived_at').distinct().count(), 1)
+
+        seen = []
+        url = '/api/archive/?page_size=200'
+        pages = 0
+        while url and pages < 20:
+            page = self.client_api.get(url).json()
+            seen += [row['item_id'] for row in page['results']]
+            url = page['next']
+            pages += 1
+        self.assertEqual(pages, 7)
+        self.assertEqual(len(seen), 1300)
+        self.assertEqual(set(seen), {item.pk for item in items})
+
+    def test_archive_items_command(self):
+        old = Item.objects.create(order=self.order, name="Старый", status='ready')
+        Item.objects.filter(pk__in=[old.pk, self.done.pk]) \
+                    .update(ready_at=timezone.now() - timedelta(days=40))
+
+        out = StringIO()
+        call_command('archive_items', '--days', '30', '--dry-run', stdout=out)
+        self.assertIn("Будет перенесено: 2", out.getvalue())
+        self.assertEqual(Item.objects.count(), 3)
+
+        out = StringIO()
+        call_command('archive_items', '--days', '30', '--batch-size', '1', stdout=out)
+        self.assertIn("Пачка 2:", out.getvalue())
+        self.assertIn("Перенесено в архив: 2", out.getvalue())
+        self.assertEqual(list(Item.objects.values_list('pk', flat=True)), [self.live.pk])
+        self.assertEqual(ArchivedItem.objects.count(), 2)
+
+
+class OrderSearchTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.by_client = Order.objects.create(client="Альфа")
+        Item.objects.create(order=self.by_client, name="Визитки", status='ready')
+        Item.objects.create(order=self.by_client, name="Баннер", status='not-ready')
+
+        self.by_comment = Order.objects.create(client="Гамма")
+        Item.objects.create(order=self.by_comment, name="Буклеты", comment="логотип как у Альфа")
+        Item.objects.create(order=self.by_comment, name="Плакат")
+
+        Order.objects.create(client="Бета")
+
+    def _search(self, **params):
+        response = self.client_api.get('/api/orders/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ranked_and_paginated(self):
+        page = self._search(q="Альфа", page_size=1)
+        self.assertEqual(page['count'], 2)
+        self.assertEqual([o['id'] for o in page['results']], [self.by_client.id])
+        # Совпал клиент - показываем все товары заказа
+        self.assertEqual([i['name'] for i in page['results'][0]['items']], ["Визитки", "Баннер"])
+
+        rest = self.client_api.get(page['next']).json()
+        self.assertEqual([o['id'] for o in rest['results']], [self.by_comment.id])
+        # Совпал комментарий - только найденный товар
+        self.assertEqual([i['name'] for i in rest['results'][0]['items']], ["Буклеты"])
+        self.assertGreater(page['results'][0]['search_rank'], rest['results'][0]['search_rank'])
+
+    def test_search_with_filters(self):
+        data = self._search(q="Альфа", status='not-ready')['results']
+        self.assertEqual([o['id'] for o in data], [self.by_client.id, self.by_comment.id])
+        self.assertEqual([i['name'] for i in data[0]['items']], ["Баннер"])
+
+        data = self._search(q="Альфа", status='in-progress')['results']
+        self.assertEqual(data, [])
+
+    def test_query_is_required(self):
+        response = self.client_api.get('/api/orders/search/', {'q': '  '})
+        self.assertEqual(response.status_code, 400)
+
+    @skipUnless(connection.vendor == 'postgresql', "Морфология есть только в полнотекстовом поиске PostgreSQL")
+    def test_russian_word_forms(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_tsvector('russian', 'визитки') = ''::tsvector")
+            if cursor.fetchone()[0]:
+                self.skipTest("База в кодировке без кириллицы (SQL_ASCII): стемминг не работает")
+        data = self._search(q="визитками")['results']
+        self.assertEqual([o['id'] for o in data], [self.by_client.id])
+        self.assertEqual([i['name'] for i in data[0]['items']], ["Визитки"])
+
+    def test_fuzzy_match(self):
+        if not trigram_available():
+            self.skipTest("Нечеткий поиск требует pg_trgm")
+        data = self._search(q="Букледы")['results']
+        self.assertEqual([o['id'] for o in data], [self.by_comment.id])
+
+
+class MetricsTests(ApiTestCase):
+    def setUp(self):
+        metrics_registry.reset()
+        super().setUp()
+        self.admin = User.objects.create_superuser(username='admin', password='123')
+        Order.objects.create(client="Альфа")
+
+    def test_server_timing_and_prometheus_output(self):
+        self.client_api.force_authenticate(self.user)
+        response = self.client_api.get('/api/orders/')
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ SQL"$')
+        self.client_api.get('/api/orders/changes/')
+        self.client_api.get('/api/statistics-data/')
+
+        self.assertEqual(self.client_api.get('/api/_metrics').status_code, 403)
+
+        self.client_api.force_authenticate(self.admin)
+        response = self.client_api.get('/api/_metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('ecoprint_http_requests_total{view="OrderViewSet.list",method="GET",status="200"} 1', text)
+        self.assertIn('ecoprint_http_requests_total{view="OrderViewSet.changes",method="GET",status="200"} 1', text)
+        self.assertIn('ecoprint_http_requests_total{view="metrics_view",method="GET",status="403"} 1', text)
+        self.assertIn('ecoprint_http_request_duration_seconds_count{view="statistics_data_view"} 1', text)
+        self.assertIn('ecoprint_http_request_duration_seconds_bucket{view="OrderViewSet.list",le="+Inf"} 1', text)
+
+        queries = re.search(r'ecoprint_db_queries_total\{view="OrderViewSet.list"\} (\d+)', text)
+        self.assertGreater(int(queries.group(1)), 0)
+
+    def test_unknown_methods_share_one_label(self):
+        for method in ('FOO', 'BAR"}\nfake 1'):
+            self.client.generic(method, '/api/orders/')
+        text = metrics_registry.render()
+        self.assertIn('{view="OrderViewSet.other",method="other",status="403"} 2', text)
+        self.assertNotIn('FOO', text)
+        self.assertNotIn('fake', text)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_seeds_and_reports_percentiles(self):
+        out = StringIO()
+        call_command('benchmark', '--use-current-db', '--orders', '30', '--items', '90', '--users', '3',
+                     '--products', '5', '--requests', '3', '--warmup', '1', '--label', 'test',
+                     stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(report['label'], 'test')
+        self.assertEqual(report['dataset']['orders'], 30)
+        self.assertEqual(report['dataset']['items'], 90)
+        self.assertEqual(set(report['scenarios']), {
+            'orders_list', 'orders_list_filtered', 'orders_search', 'order_retrieve',
+            'order_update', 'item_create', 'statistics', 'statistics_cold',
+        })
+        for result in report['scenarios'].values():
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertLessEqual(result['p95_ms'], result['p99_ms'])
+            self.assertGreater(result['queries_max'], 0)
+            self.assertGreater(result['peak_memory_kb'], 0)
+
+        # Счетчики заказов после заполнения через bulk_create пересчитаны
+        call_command('rebuild_order_counters', '--check', stdout=StringIO())
+
+
+class QueryGuardTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        for n in range(4):
+            order = Order.objects.create(client=f"Клиент {n}")
+            Item.objects.create(order=order, name="Визитки")
+
+    def test_fingerprint_strips_literals(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 15 AND name = 'O''Brien' AND x IN (%s, %s, %s)"),
+            "SELECT * FROM t WHERE id = ? AND name = ? AND x IN (...)"
+        )
+
+    def test_repeated_query_raises_with_stack(self):
+        with self.assertRaises(RepeatedQueryError):
+            with QueryGuard(threshold=3, raise_error=True):
+                for order in Order.objects.all():
+                    list(order.items.all())
+
+        with QueryGuard(threshold=3, raise_error=True):
+            for order in Order.objects.prefetch_related('items'):
+                list(order.items.all())
+
+    def test_middleware_logs_repeated_queries(self):
+        with self.settings(QUERY_GUARD_THRESHOLD=2):
+            with self.assertLogs('orders.query_guard', level='WARNING') as logs:
+                with mock.patch.object(ItemViewSet, 'queryset', Item.objects.all()):
+                    Item.objects.update(responsible_user=self.user)
+                    self.client_api.get('/api/items/')
+        self.assertIn('GET /api/items/: запрос выполнен 4 раз', logs.output[0])
+        self.assertIn('auth_user', logs.output[0])
+
+
+class QueryBudgetTests(ApiTestCase):
+    """Каждое действие API укладывается в query_budget своего ViewSet."""
+
+    def setUp(self):
+        super().setUp()
+        self.users = [self.user] + [User.objects.create_user(username=f'user{n}', password='123') for n in (1, 2)]
+        Product.objects.create(name="Визитки", category='polygraphy')
+
+        self.orders = []
+        for n in range(5):
+            order = Order.objects.create(client=f"Клиент {n}")
+            for k in range(4):
+                Item.objects.create(order=order, name=f"Товар {k}", deadline=date.today(),
+                                    responsible_user=self.users[k % 3])
+            self.orders.append(order)
+        ArchivedItem.archive(list(self.orders[-1].items.values_list('pk', flat=True)))
+        self.order = self.orders[0]
+        self.item = self.order.items.first()
+
+    def _check(self, view_class, action, method, url, data=None):
+        with assert_query_budget(view_class, action):
+            response = getattr(self.client_api, method)(url, data, format='json')
+        self.assertLess(response.status_code, 400, response.content)
+        return response
+
+    def test_order_actions(self):
+        cursor = self.client_api.get('/api/orders/changes/').json()['cursor']
+        self._check(OrderViewSet, 'list', 'get', '/api/orders/')
+        self._check(OrderViewSet, 'retrieve', 'get', f'/api/orders/{self.order.pk}/')
+        self._check(OrderViewSet, 'search', 'get', '/api/orders/search/', {'q': "Клиент"})
+        self._check(OrderViewSet, 'changes', 'get', '/api/orders/changes/', {'since': cursor})
+        self._check(OrderViewSet, 'create', 'post', '/api/orders/', {
+            'client': "Новый", 'items_write': [{'name': f"Товар {k}"} for k in range(5)]
+        })
+        self._check(OrderViewSet, 'partial_update', 'patch', f'/api/orders/{self.order.pk}/', {
+            'items_write': [{'id': self.item.pk, 'status': 'ready'}, {'name': "Баннер"}, {'name': "Плакат"}]
+        })
+        self._check(OrderViewSet, 'destroy', 'delete', f'/api/orders/{self.orders[1].pk}/')
+
+        # Импорт: бюджет на одну пачку (IMPORT_BATCH_SIZE строк) при любом числе строк в ней
+        rows = "".join(f"{n // 3};Клиент {n // 3};Товар {n % 3};2;;;;user1\n" for n in range(60))
+        upload = SimpleUploadedFile('orders.csv', ("Заказ;Клиент;Товар;Количество;Срок;Статус;Комментарий;Ответственный\n" + rows).encode('utf-8'))
+        with assert_query_budget(OrderViewSet, 'import_orders'):
+            response = self.client_api.post('/api/orders/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.json()['items_created'], 60, response.content)
+
+    def test_item_actions(self):
+        self._check(ItemViewSet, 'list', 'get', '/api/items/')
+        self._check(ItemViewSet, 'retrieve', 'get', f'/api/items/{self.item.pk}/')
+        self._check(ItemViewSet, 'urgent', 'get', '/api/items/urgent/')
+        self._check(ItemViewSet, 'transition', 'patch', f'/api/items/{self.item.pk}/transition/',
+                    {'status': 'ready'})
+        self._check(ItemViewSet, 'partial_update', 'patch', f'/api/items/{self.item.pk}/', {'quantity': 5})
+        self._check(ItemViewSet, 'destroy', 'delete', f'/api/items/{self.item.pk}/')
+
+    def test_read_only_viewsets(self):
+        archived = ArchivedItem.objects.first()
+        self._check(ArchivedItemViewSet, 'list', 'get', '/api/archive/')
+        self._check(ArchivedItemViewSet, 'retrieve', 'get', f'/api/archive/{archived.pk}/')
+        self._check(ProductViewSet, 'list', 'get', '/api/products/')
+        self._check(UserViewSet, 'list', 'get', '/api/users/')
+
+
+class OrderImportTests(ApiTestCase):
+    CSV = (
+        "Заказ;Клиент;Товар;Количество;Срок;Статус;Комментарий;Ответственный\n"
+        "1;Альфа;визитки;100;2030-01-15;Готово;;manager\n"
+        "1;Альфа;Баннер;1;15.01.2030;В процессе;2x1 м;\n"
+        "2;Альфа;Буклеты;50;;;;\n"
+        "3;Бета;Плакат;10;завтра;;;\n"
+        "3;Бета;Листовки;0;;;;nobody\n"
+        ";;;;;;;\n"
+    )
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.create(name="Визитки", category='polygraphy')
+
+    def _upload(self, content, name='orders.csv', **data):
+        upload = SimpleUploadedFile(name, content.encode('utf-8') if isinstance(content, str) else content)
+        return self.client_api.post('/api/orders/import/', {'file': upload, **data}, format='multipart')
+
+    def test_csv_import_with_row_errors(self):
+        response = self._upload(self.CSV)
+        self.assertEqual(response.status_code, 200, response.content)
+        report = response.json()
+        self.assertEqual((report['rows'], report['orders_created'], report['items_created']), (5, 2, 3))
+        self.assertEqual([error['row'] for error in report['errors']], [5, 6])
+        self.assertIn('deadline', report['errors'][0]['errors'])
+        self.assertEqual(set(report['errors'][1]['errors']), {'quantity', 'responsible'})
+
+        first = Order.objects.get(items__name="Визитки")  # Написание из ассортимента
+        self.assertEqual((first.client, first.status, first.items_total, first.items_ready), ("Альфа", 'in-progress', 2, 1))
+        ready = first.items.get(status='ready')
+        self.assertEqual((ready.responsible_user, ready.quantity, ready.deadline), (self.user, 100, date(2030, 1, 15)))
+        self.assertIsNotNone(ready.ready_at)
+        self.assertEqual(first.items.get(name="Баннер").deadline, date(2030, 1, 15))
+        self.assertFalse(Order.objects.filter(client="Бета").exists())
+
+        # Счетчики и дневная статистика сходятся с пересчетом с нуля
+        call_command('rebuild_order_counters', '--check', stdout=StringIO())
+        stats = DailyStats.objects.get()
+        self.assertEqual((stats.orders_created, stats.in_progress_delta, stats.not_ready_delta), (2, 1, 1))
+
+    def test_cp1251_csv(self):
+        # "CSV (разделители - запятые)" из Excel в русской Windows
+        response = self._upload(self.CSV.encode('cp1251'))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['orders_created'], 2)
+        self.assertTrue(Order.objects.filter(client="Альфа").exists())
+
+        # Начало в UTF-8, дальше битые байты - ошибка файла, а не 500
+        with mock.patch('orders.importer.CSV_SNIFF_SIZE', 16):
+            response = self._upload(self.CSV.encode('utf-8') + "Гамма;Плакат\n".encode('cp1251'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("UTF-8", response.json()['file'])
+
+    def test_dry_run_and_bad_files(self):
+        report = self._upload(self.CSV, dry_run='1').json()
+        self.assertEqual(report['orders_created'], 2)
+        self.assertFalse(Order.objects.exists())
+
+        self.assertEqual(self._upload("a;b", name='orders.txt').status_code, 400)
+        self.assertEqual(self._upload("Клиент;Количество\nАльфа;1\n").status_code, 400)
+
+    def test_xlsx_import_command_in_batches(self):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(["Client", "Order", "Item", "Quantity", "Deadline"])
+        for n in range(300):
+            sheet.append([f"Клиент {n // 3}", n // 3, f"Товар {n % 3}", 5, datetime(2030, 1, 1)])
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'orders.xlsx')
+        workbook.save(path)
+
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('import_orders', path, '--batch-size', '100', stdout=out)
+        self.assertIn("Создано заказов: 100, товаров: 300. Ошибок: 0", out.getvalue())
+        # Запросы на пачку, а не на строку
+        self.assertLess(len(queries), 40)
+        self.assertEqual(Item.objects.filter(deadline=date(2030, 1, 1)).count(), 300)
+        self.assertEqual(Order.objects.filter(items_total=3, status='not-ready').count(), 100)
+
+
+class OrderExportTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        User.objects.filter(pk=self.user.pk).update(first_name='Анна')
+        Product.objects.create(name="Визитки", category='polygraphy')
+
+        self.first = Order.objects.create(client="Альфа")
+        self.done = Item.objects.create(order=self.first, name="Визитки", quantity=100, status='ready',
+                                        deadline=date(2030, 1, 15), responsible_user=self.user)
+        Item.objects.create(order=self.first, name="Баннер", comment='2x1 м; "люверсы"')
+        self.second = Order.objects.create(client="Бета")
+        Item.objects.create(order=self.second, name="Плакат", status='ready')
+        Order.objects.filter(pk=self.second.pk).update(created_at=timezone.now() - timedelta(days=40))
+        # Архивный товар встает на свое место среди товаров заказа
+        ArchivedItem.archive([self.done.pk])
+
+    def _export(self, query=''):
+        response = self.client_api.get(f'/api/orders/export/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def _csv_rows(self, query=''):
+        response, content = self._export(query)
+        self.assertTrue(content.startswith('﻿'.encode('utf-8')))
+        return [line.split(';') for line in content.decode('utf-8-sig').splitlines()]
+
+    def test_csv_export_merges_archive(self):
+        response, _ = self._export()
+        self.assertIn('attachment; filename="orders_', response['Content-Disposition'])
+
+        rows = self._csv_rows()
+        self.assertEqual(rows[0][:6], ["Заказ", "Клиент", "Создан", "Статус заказа", "ID товара", "Товар"])
+        self.assertEqual([(row[1], row[5], row[-1]) for row in rows[1:]],
+                         [("Альфа", "Визитки", "да"), ("Альфа", "Баннер", "нет"), ("Бета", "Плакат", "нет")])
+        archived = dict(zip(rows[0], rows[1]))
+        self.assertEqual((archived["Категория"], archived["Срок"], archived["Статус"], archived["Ответственный"]),
+                         ("Полиграфия", "2030-01-15", "Готово", "Анна"))
+        # Кавычки и разделитель в комментарии экранированы по правилам CSV
+        self.assertIn('"2x1 м; ""люверсы"""', self._export()[1].decode('utf-8-sig'))
+
+    def test_export_filters(self):
+        self.assertEqual([row[5] for row in self._csv_rows('archive=exclude')[1:]], ["Баннер", "Плакат"])
+        self.assertEqual([row[5] for row in self._csv_rows('archive=only')[1:]], ["Визитки"])
+        self.assertEqual([row[1] for row in self._csv_rows('status=ready')[1:]], ["Бета"])
+        date_to = (timezone.localdate() - timedelta(days=30)).isoformat()
+        self.assertEqual([row[1] for row in self._csv_rows(f'date_to={date_to}')[1:]], ["Бета"])
+        date_from = timezone.localdate().isoformat()
+        self.assertEqual(len(self._csv_rows(f'date_from={date_from}&archive=exclude')), 2)
+
+        for query in ('type=pdf', 'archive=all', 'status=lost', 'date_from=15.01.2030'):
+            self.assertEqual(self.client_api.get(f'/api/orders/export/?{query}').status_code, 400, query)
+
+    def test_formulas_are_escaped(self):
+        Order.objects.filter(pk=self.first.pk).update(client="=1+2")
+        Item.objects.filter(name="Баннер").update(comment="@SUM(A1)", name="-1+1")
+
+        rows = self._csv_rows()
+        self.assertEqual((rows[2][1], rows[2][5], rows[2][11]), ("'=1+2", "'-1+1", "'@SUM(A1)"))
+
+        from openpyxl import load_workbook
+        _, content = self._export('type=xlsx')
+        sheet = load_workbook(io.BytesIO(content)).worksheets[0]
+        self.assertEqual(sheet['B3'].data_type, 's')
+        self.assertEqual(sheet['B3'].value, "'=1+2")
+
+        # Импорт выгрузки снимает защитный апостроф
+        upload = SimpleUploadedFile('orders.csv', self._export()[1])
+        self.client_api.post('/api/orders/import/', {'file': upload}, format='multipart')
+        imported = Item.objects.exclude(order=self.first).get(name="-1+1")
+        self.assertEqual((imported.comment, imported.order.client), ("@SUM(A1)", "=1+2"))
+
+    def test_xlsx_export(self):
+        from openpyxl import load_workbook
+
+        response, content = self._export('type=xlsx')
+        self.assertTrue(response['Content-Disposition'].endswith('.xlsx"'))
+        sheet = load_workbook(io.BytesIO(content), read_only=True).worksheets[0]
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual((rows[1][1], rows[1][5], rows[1][7]), ("Альфа", "Визитки", 100))
+
+    def test_export_query_budget_and_import_round_trip(self):
+        for n in range(20):
+            Item.objects.create(order=self.second, name=f"Товар {n}")
+        # Число запросов не зависит от числа строк
+        with assert_query_budget(OrderViewSet, 'export_orders'):
+            _, content = self._export()
+
+        # Выгрузку можно загрузить обратно импортом
+        upload = SimpleUploadedFile('orders.csv', content)
+        report = self.client_api.post('/api/orders/import/', {'file': upload, 'dry_run': '1'}, format='multipart').json()
+        self.assertEqual((report['orders_created'], report['items_created'], report['error_count']), (2, 23, 0), report['errors'][:2])
+
+    def test_async_chunks(self):
+        async def collect():
+            return [chunk async for chunk in async_chunks(iter(['a', 'b']))]
+
+        self.assertEqual(asyncio.run(collect()), ['a', 'b'])
+
+
+def image_file(name, size, image_format='JPEG', mode='RGB', color=(200, 60, 40)):
+    buffer = io.BytesIO()
+    Image.new(mode, size, color).save(buffer, image_format)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class ImagePipelineTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username='manager', password='123')
+        self.profile = self.user.profile
+
+    def _upload_avatar(self, upload):
+        form = ProfileUpdateForm({}, {'avatar': upload}, instance=self.profile)
+        if form.is_valid():
+            form.save()
+        return form
+
+    def test_avatar_thumbnails(self):
+        form = self._upload_avatar(image_file('photo.jpg', (3000, 2000)))
+        self.assertTrue(form.is_valid(), form.errors)
+
+        self.profile.refresh_from_db()
+        thumbnails = self.profile.avatar_thumbnails
+        self.assertEqual(set(thumbnails), {'sm', 'md'})
+        self.assertEqual((thumbnails['sm']['width'], thumbnails['sm']['height']), (96, 96))
+        # В поле - основной вариант, исходник не сохраняется
+        self.assertEqual(self.profile.avatar.name, thumbnails['md']['fallback'])
+        self.assertRegex(self.profile.avatar.name, r'^avatars/thumbs/[0-9a-f]{20}_md\.jpg$')
+        with default_storage.open(thumbnails['sm']['webp']) as file, Image.open(file) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (96, 96)))
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, 'avatars')), ['thumbs'])
+
+        # Тот же файл у другого пользователя - те же имена, файлы не дублируются
+        other = User.objects.create_user(username='other', password='123').profile
+        ProfileUpdateForm({}, {'avatar': image_file('copy.jpg', (3000, 2000))}, instance=other).save()
+        other.refresh_from_db()
+        self.assertEqual(other.avatar_thumbnails, thumbnails)
+        self.assertEqual(len(os.listdir(os.path.join(settings.MEDIA_ROOT, 'avatars', 'thumbs'))), 4)
+
+    def test_rejects_bombs_and_non_images(self):
+        # Несколько килобайт PNG, но 50 Мп после декодирования
+        form = self._upload_avatar(image_file('bomb.png', (10000, 5000), 'PNG', mode='1', color=0))
+        self.assertIn('Мп', str(form.errors['avatar']))
+        form = self._upload_avatar(SimpleUploadedFile('photo.jpg', b'not an image'))
+        self.assertIn('avatar', form.errors)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.avatar.name, 'avatars/default.jpg')
+
+    def test_logo_keeps_transparency_and_proportions(self):
+        settings_obj = CompanySettings.load(use_cache=False)
+        settings_obj.company_logo = image_file('logo.png', (1000, 200), 'PNG', mode='RGBA', color=(0, 0, 0, 0))
+        settings_obj.save()
+
+        sm = CompanySettings.load(use_cache=False).company_logo_thumbnails['sm']
+        self.assertEqual((sm['width'], sm['height']), (400, 80))
+        self.assertTrue(sm['fallback'].endswith('.png'))
+
+        settings_obj.company_logo = None
+        settings_obj.save()
+        self.assertEqual(CompanySettings.load(use_cache=False).company_logo_thumbnails, {})
+
+    def test_picture_tag(self):
+        template = Template("{% load images %}{% picture profile.avatar 'sm' alt='Аватар' class='avatar' %}")
+        # Файл еще не обработан - исходное изображение
+        self.assertEqual(template.render(Context({'profile': self.profile})),
+                         '<img src="/media/avatars/default.jpg" alt="Аватар" class="avatar">')
+
+        self._upload_avatar(image_file('photo.jpg', (500, 500)))
+        html = template.render(Context({'profile': self.profile}))
+        self.assertRegex(html, r'^<picture><source srcset="/media/avatars/thumbs/\w+_sm\.webp" type="image/webp">'
+                               r'<img src="/media/avatars/thumbs/\w+_sm\.jpg" width="96" height="96" '
+                               r'alt="Аватар" class="avatar"></picture>$')
+
+    def test_thumbnails_served_with_long_cache(self):
+        self._upload_avatar(image_file('photo.jpg', (500, 500)))
+        self.profile.refresh_from_db()
+        request = RequestFactory().get('/media/')
+        response = serve_media(request, self.profile.avatar.name, document_root=settings.MEDIA_ROOT)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_build_thumbnails_command(self):
+        default_storage.save('avatars/default.jpg', image_file('default.jpg', (800, 800)))
+        other = User.objects.create_user(username='other', password='123').profile
+        Profile.objects.filter(pk=other.pk).update(avatar='avatars/missing.jpg')
+
+        out, err = StringIO(), StringIO()
+        call_command('build_thumbnails', stdout=out, stderr=err)
+        self.assertIn("Обработано изображений: 1. Ошибок: 1.", out.getvalue())
+        self.assertIn('avatars/missing.jpg', err.getvalue())
+        self.profile.refresh_from_db()
+        self.assertEqual(set(self.profile.avatar_thumbnails), {'sm', 'md'})
+
+        # Повторный запуск обрабатывает только то, что еще не обработано
+        out = StringIO()
+        call_command('build_thumbnails', stdout=out, stderr=StringIO())
+        self.assertIn("Обработано изображений: 0. Ошибок: 1.", out.getvalue())
@@ -10,6 +10,7 @@ router = DefaultRouter()
 # 2. Регистрируем наши ViewSet'ы
 router.register(r'orders', views.OrderViewSet, basename='order')
 router.register(r'items', views.ItemViewSet, basename='item')
+router.register(r'archive', views.ArchivedItemViewSet, basename='archived-item')
 router.register(r'products', views.ProductViewSet, basename='product')
 router.register(r'users', views.UserViewSet, basename='user')
 
@@ -22,4 +23,14 @@ urlpatterns = [
     path('statistics-data/', 
          views.statistics_data_view, 
          name='api-statistics-data'),
+
+    # Поток событий заказов (SSE, работает под ASGI)
+    path('order-events/',
+         views.order_events_view,
+         name='api-order-events'),
+
+    # Метрики для Prometheus (только суперпользователи)
+    path('_metrics',
+         views.metrics_view,
+         name='api-metrics'),
 ]
\ No newline at end of file
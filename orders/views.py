@@ -5,16 +5,40 @@ from django.contrib.auth.decorators import login_required
 from rest_framework import viewsets, status, permissions
 from .serializers import OrderSerializer, ProductSerializer, UserSimpleSerializer
 from rest_framework.decorators import api_view
-from .models import Order, Item, Profile, CompanySettings, TelegramSettings, Product
+from .models import (Order, Item, ArchivedItem, Profile, CompanySettings, TelegramSettings,
+                     Product, DailyStats, DailyProductStats, DeletedOrder, daily_stats_version)
 from django.contrib.auth.models import User
-from django.db.models import Count
+from django.db.models import Q, F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from rest_framework.response import Response
-from datetime import date, timedelta
-from .serializers import OrderSerializer, ItemSerializer, ProductSerializer, UserSimpleSerializer
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.exceptions import ValidationError, PermissionDenied
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+import asyncio
+import hashlib
+import tempfile
+import time
+from .serializers import (OrderSerializer, ItemSerializer, ProductSerializer, UserSimpleSerializer,
+                          ItemTransitionSerializer, ArchivedItemSerializer)
 from .forms import (UserUpdateForm, ProfileUpdateForm, AdminUserCreationForm, 
                     AdminUserUpdateForm, NotificationSettingsForm, CompanySettingsForm,
                     TelegramSettingsForm, ProductForm)
-from .telegram_bot import send_telegram_notification
+from .telegram_bot import queue_new_order_notification
+from .events import broker
+from .metrics import registry as metrics_registry
+from .search import search_orders
+from .importer import OrderImporter, ImportFileError, iter_rows
+from .exporter import ARCHIVE_MODES, export_rows, csv_chunks, write_xlsx, file_chunks, async_chunks
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash, logout
 from django.contrib import messages
@@ -35,35 +59,436 @@ def logout_view(request):
     messages.success(request, 'Вы успешно вышли из системы.')
     return redirect('index')
 
+# --- Пагинация заказов (keyset / cursor) ---
+class OrderCursorPagination(CursorPagination):
+    """
+    Постраничная выдача заказов по курсору (keyset): следующая страница
+    берется через WHERE created_at < <курсор>, без OFFSET.
+    """
+    ordering = '-created_at'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+# --- Пагинация результатов поиска ---
+class SearchPagination(PageNumberPagination):
+    """
+    Результаты поиска отсортированы по рангу, а не по дате,
+    поэтому курсор не подходит - используются номера страниц.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+# Синонимы для фильтра срочности (как в селекте на главной странице)
+URGENCY_ALIASES = {
+    'urgent': 2,
+    'very-urgent': 1,
+}
+
+def build_item_filter(params):
+    """
+    Собирает условие (Q) на товары из GET-параметров:
+    status, urgency, responsible_user. Поиск (q) - в search_orders().
+    Возвращает None, если ни один фильтр не задан.
+    """
+    item_filter = Q()
+
+    item_status = params.get('status')
+    if item_status and item_status != 'all':
+        valid_statuses = [choice[0] for choice in Item.STATUS_CHOICES]
+        if item_status not in valid_statuses:
+            raise ValidationError({'status': f"Неизвестный статус: {item_status}"})
+        item_filter &= Q(status=item_status)
+
+    urgency = params.get('urgency')
+    if urgency and urgency != 'all':
+        days = URGENCY_ALIASES.get(urgency, urgency)
+        try:
+            days = int(days)
+        except (TypeError, ValueError):
+            raise ValidationError({'urgency': "Ожидается число дней или 'urgent'/'very-urgent'."})
+        today = date.today()
+        item_filter &= Q(deadline__gte=today, deadline__lte=today + timedelta(days=days))
+
+    responsible_user = params.get('responsible_user')
+    if responsible_user:
+        try:
+            item_filter &= Q(responsible_user_id=int(responsible_user))
+        except ValueError:
+            raise ValidationError({'responsible_user': "Ожидается ID пользователя."})
+
+    return item_filter if item_filter else None
+
+def build_day_range_filter(params, field):
+    """
+    Условия на поле-дату из GET-параметров date_from / date_to
+    (ГГГГ-ММ-ДД, обе даты включительно, по местному времени).
+    """
+    lookups = {}
+    for param, lookup, shift in (('date_from', 'gte', 0), ('date_to', 'lt', 1)):
+        value = params.get(param)
+        if not value:
+            continue
+        try:
+            day = date.fromisoformat(value)
+        except ValueError:
+            raise ValidationError({param: "Ожидается дата в формате ГГГГ-ММ-ДД."})
+        day_start = timezone.make_aware(datetime.combine(day + timedelta(days=shift), datetime.min.time()))
+        lookups[f'{field}__{lookup}'] = day_start
+    return lookups
+
+# Запас при выборке изменений по курсору (см. OrderViewSet.changes)
+CHANGES_OVERLAP = timedelta(seconds=5)
+
+# Максимальный горизонт для /api/items/urgent/
+URGENT_MAX_DAYS = 30
+
 # --- Наши API ViewSets ---
 class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all().order_by('-created_at')
+    """
+    Заказы. Список (GET /api/orders/) фильтруется в SQL по параметрам
+    status, urgency, responsible_user, q и отдается постранично по курсору.
+    В 'items' каждого заказа попадают только подходящие товары.
+    """
+    queryset = Order.objects.order_by('-created_at')
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OrderCursorPagination
+
+    # Максимум SQL-запросов на действие при любом объеме данных
+    # (проверяется в тестах, см. query_guard.assert_query_budget)
+    query_budget = {
+        'list': 2,
+        'retrieve': 2,
+        'search': 4,
+        'changes': 3,
+        'export_orders': 2,
+        # На одну пачку импорта (IMPORT_BATCH_SIZE строк); +2 на первую за день запись статистики
+        'import_orders': 14,
+        'create': 19,
+        'update': 24,
+        'partial_update': 24,
+        'destroy': 17,
+    }
 
-    def perform_create(self, serializer):
-        order = serializer.save()
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'search'):
+            item_filter = build_item_filter(self.request.query_params)
+            search = self.request.query_params.get('q', '').strip()
+            if search:
+                # В списке порядок задает курсор (по дате), ранг не нужен
+                return search_orders(queryset, search, item_filter, ranked=self.action == 'search')
+            if item_filter is not None:
+                return queryset.with_matching_items(item_filter)
+        return queryset.with_active_items()
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        GET /api/orders/search/?q=<текст>[&status=...&urgency=...&page=N]
+        Поиск по клиенту, названиям и комментариям товаров, самые
+        релевантные заказы первыми (поле search_rank), постранично.
+        """
+        if not request.query_params.get('q', '').strip():
+            raise ValidationError({'q': "Введите текст для поиска."})
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(self.get_queryset(), request, view=self)
+        data = self.get_serializer(page, many=True).data
+        for row, order in zip(data, page):
+            row['search_rank'] = round(order.search_rank, 4)
+        return paginator.get_paginated_response(data)
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        GET /api/orders/changes/?since=<cursor>
+        Заказы, созданные или измененные после курсора (с активными товарами),
+        ID удаленных заказов и новый курсор для следующего запроса.
+        Без since или со слишком старым курсором возвращает reset=true:
+        клиент должен перезагрузить список целиком.
+        """
+        now = timezone.now()
+        data = {
+            'cursor': str(int(now.timestamp() * 1_000_000)),
+            'reset': False,
+            'orders': [],
+            'deleted': [],
+        }
+
+        since = request.query_params.get('since')
+        if not since:
+            data['reset'] = True
+            return Response(data)
+        try:
+            since = datetime.fromtimestamp(int(since) / 1_000_000, tz=dt_timezone.utc)
+        except (ValueError, OverflowError, OSError):
+            raise ValidationError({'since': "Неверный курсор."})
+        if since < now - DeletedOrder.RETENTION:
+            data['reset'] = True
+            return Response(data)
+
+        # updated_at ставится до COMMIT: транзакция, закоммиченная после
+        # прошлого запроса, могла получить время раньше курсора.
+        # Берем изменения с запасом, клиент просто перезапишет дубли.
+        since -= CHANGES_OVERLAP
+        changed = Order.objects.filter(updated_at__gte=since) \
+                               .order_by('updated_at') \
+                               .with_active_items()
+        data['orders'] = self.get_serializer(changed, many=True).data
+        data['deleted'] = list(
+            DeletedOrder.objects.filter(deleted_at__gte=since)
+                                .values_list('order_id', flat=True)
+                                .distinct()
+        )
+        return Response(data)
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_orders(self, request):
+        """
+        POST /api/orders/import/ (multipart, поле file: .csv или .xlsx)
+        Массовый импорт заказов: одна строка - один товар. Возвращает
+        число созданных заказов/товаров и ошибки по номерам строк.
+        dry_run=1 - только проверить файл. Уведомления в Telegram
+        об импортированных заказах не отправляются.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': "Прикрепите файл .csv или .xlsx."})
+        importer = OrderImporter(dry_run=request.data.get('dry_run') in ('1', 'true'))
         try:
-            send_telegram_notification(order)
-        except Exception as e:
-            print(f"Ошибка при вызове telegram_bot: {e}")
+            report = importer.run(iter_rows(upload, upload.name))
+        except ImportFileError as e:
+            raise ValidationError({'file': str(e)})
+        return Response(report, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export_orders(self, request):
+        """
+        GET /api/orders/export/?type=csv|xlsx[&date_from=&date_to=&status=&archive=]
+        Выгрузка для бухгалтерии: одна строка - один товар, с клиентом,
+        категорией из ассортимента и ответственным (все JOIN-ами в SQL).
+        date_from / date_to - дата создания заказа, status - статус заказа,
+        archive: include (по умолчанию) / exclude / only - архивные товары.
+        Строки читаются из базы курсором и сразу отдаются клиенту:
+        память не зависит от размера выгрузки. Параметр называется type:
+        'format' DRF использует для выбора рендерера.
+        """
+        params = request.query_params
+        file_type = params.get('type', 'csv')
+        if file_type not in ('csv', 'xlsx'):
+            raise ValidationError({'type': "Ожидается csv или xlsx."})
+        archive = params.get('archive', 'include')
+        if archive not in ARCHIVE_MODES:
+            raise ValidationError({'archive': f"Ожидается одно из: {', '.join(ARCHIVE_MODES)}."})
+
+        order_filter = build_day_range_filter(params, 'order__created_at')
+        order_status = params.get('status')
+        if order_status and order_status != 'all':
+            if order_status not in dict(Order.STATUS_CHOICES):
+                raise ValidationError({'status': f"Неизвестный статус: {order_status}"})
+            order_filter['order__status'] = order_status
+
+        rows = export_rows(order_filter, archive)
+        if file_type == 'csv':
+            chunks = csv_chunks(rows)
+            content_type = 'text/csv; charset=utf-8'
+        else:
+            # XLSX - zip-архив, его нельзя писать потоком: собираем во
+            # временный файл на диске и отдаем кусками
+            file = tempfile.TemporaryFile()
+            write_xlsx(rows, file)
+            file.seek(0)
+            chunks = file_chunks(file)
+            content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+        if isinstance(request, ASGIRequest):
+            chunks = async_chunks(chunks)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        filename = f"orders_{timezone.localdate().isoformat()}.{file_type}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['X-Accel-Buffering'] = 'no'  # nginx: не копить выгрузку целиком
+        return response
+
+    def perform_create(self, serializer):
+        # Уведомление в Telegram отправит воркер (manage.py run_tasks).
+        # Задача пишется в той же транзакции, что и заказ: нет заказа - нет задачи.
+        with transaction.atomic():
+            order = serializer.save()
+            queue_new_order_notification(order.id)
 
 class ItemViewSet(viewsets.ModelViewSet):
-    queryset = Item.objects.all()
+    # Ответственный выводится у каждого товара - подгружаем JOIN-ом
+    queryset = Item.objects.select_related('responsible_user')
     serializer_class = ItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    query_budget = {
+        'list': 1,
+        'retrieve': 1,
+        'urgent': 2,
+        'transition': 12,
+        'partial_update': 8,
+        'destroy': 12,
+    }
+
+    @action(detail=False, methods=['get'])
+    def urgent(self, request):
+        """
+        GET /api/items/urgent/?days=N
+        Активные неготовые товары со сроком сдачи от сегодня до сегодня + N дней.
+        Без days: 1 (сегодня и завтра), если у пользователя включены
+        уведомления за день до срока, иначе 0 (только сегодня).
+        Один запрос по индексу item_status_deadline_idx.
+        """
+        days = request.query_params.get('days')
+        if days is None:
+            day_before = Profile.objects.filter(user=request.user) \
+                                        .values_list('day_before_notifications', flat=True) \
+                                        .first()
+            days = 0 if day_before is False else 1
+        else:
+            try:
+                days = int(days)
+            except ValueError:
+                raise ValidationError({'days': "Ожидается число дней."})
+            if not 0 <= days <= URGENT_MAX_DAYS:
+                raise ValidationError({'days': f"Допустимо от 0 до {URGENT_MAX_DAYS} дней."})
+
+        today = date.today()
+        items = Item.objects.filter(
+            status__in=['not-ready', 'in-progress'],
+            deadline__gte=today,
+            deadline__lte=today + timedelta(days=days),
+        ).order_by('deadline', 'order_id', 'id') \
+         .values('id', 'order_id', 'order__client', 'name', 'status', 'deadline')
+
+        return Response([
+            {
+                'id': item['id'],
+                'order_id': item['order_id'],
+                'client': item['order__client'],
+                'name': item['name'],
+                'status': item['status'],
+                'deadline': item['deadline'],
+                'days_left': (item['deadline'] - today).days,
+            }
+            for item in items
+        ])
+
+    @action(detail=True, methods=['patch'])
+    def transition(self, request, pk=None):
+        """
+        PATCH /api/items/<pk>/transition/
+        Меняет статус и/или ответственного ОДНОГО товара одним UPDATE.
+        Если передан expected_status, обновление идет как compare-and-swap:
+        UPDATE ... WHERE id=<pk> AND status=<expected_status>, и 409, если
+        статус уже другой. Без него товар меняется всегда (под блокировкой).
+        Возвращает измененный товар и пересчитанный статус заказа.
+        """
+        serializer = ItemTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        changes = {}
+        if 'status' in data:
+            changes['status'] = data['status']
+            # Как в Item.save(): дата готовности ставится один раз и сбрасывается при откате
+            if data['status'] == 'ready':
+                changes['ready_at'] = Coalesce(F('ready_at'), Value(timezone.now()))
+            else:
+                changes['ready_at'] = None
+        if 'responsible_user_id' in data:
+            changes['responsible_user'] = data['responsible_user_id']
+        changes['updated_at'] = timezone.now()
+
+        with transaction.atomic():
+            if 'expected_status' in data:
+                current = Item.objects.filter(pk=pk).values('status', 'order_id').first()
+                if current is None:
+                    raise Http404
+                expected_status = data['expected_status']
+                updated = Item.objects.filter(pk=pk, status=expected_status).update(**changes)
+            else:
+                # Без expected_status переход безусловный: строка блокируется
+                # до конца транзакции, и счетчики заказа сдвигаются ровно
+                # от прочитанного под блокировкой статуса
+                current = Item.objects.select_for_update().filter(pk=pk).values('status', 'order_id').first()
+                if current is None:
+                    raise Http404
+                expected_status = current['status']
+                updated = Item.objects.filter(pk=pk).update(**changes)
+            new_status = data.get('status', expected_status)
+            if updated and new_status != expected_status:
+                Order.adjust_item_counters(
+                    current['order_id'], added=[new_status], removed=[expected_status]
+                )
+            elif updated:
+                Order.touch(current['order_id'])
+
+        item = get_object_or_404(
+            Item.objects.select_related('responsible_user', 'order'), pk=pk
+        )
+        if not updated:
+            # Кто-то успел изменить товар раньше - отдаем актуальное состояние
+            return Response(
+                {'item': ItemSerializer(item).data, 'order_status': item.order.status},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        return Response({'item': ItemSerializer(item).data, 'order_status': item.order.status})
+
+class ArchiveCursorPagination(CursorPagination):
+    """
+    Архив по курсору (keyset): WHERE id < <курсор>, без OFFSET.
+    Ключ - id, а не archived_at: у всех товаров одного вызова archive()
+    одинаковое archived_at, а на неуникальном ключе DRF листает по
+    смещению (и обрезает его на offset_cutoff). id растут в порядке
+    переноса в архив.
+    """
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+class ArchivedItemViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Архив товаров (GET /api/archive/). Фильтры:
+    date_from / date_to (дата переноса в архив, ГГГГ-ММ-ДД), client (часть имени).
+    Выдается постранично по курсору, архив целиком никогда не читается.
+    """
+    queryset = ArchivedItem.objects.select_related('order', 'responsible_user')
+    serializer_class = ArchivedItemSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ArchiveCursorPagination
+
+    query_budget = {'list': 1, 'retrieve': 1}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+
+        queryset = queryset.filter(**build_day_range_filter(params, 'archived_at'))
+
+        client = params.get('client', '').strip()
+        if client:
+            queryset = queryset.filter(order__client__icontains=client)
+        return queryset
+
 class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = None
+    query_budget = {'list': 1}
 
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.filter(is_active=True).order_by('first_name')
     serializer_class = UserSimpleSerializer
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = None
+    query_budget = {'list': 1}
 
 @login_required
 def profile_view(request):
@@ -204,7 +629,7 @@ def notification_settings_view(request):
 
 @user_passes_test(is_superuser)
 def company_settings_view(request):
-    settings_obj = CompanySettings.load()
+    settings_obj = CompanySettings.load(use_cache=False)
 
     if request.method == 'POST':
         form = CompanySettingsForm(request.POST, request.FILES, instance=settings_obj)
@@ -222,7 +647,7 @@ def company_settings_view(request):
 
 @user_passes_test(is_superuser)
 def settings_integrations_view(request):
-    settings_obj = TelegramSettings.load()
+    settings_obj = TelegramSettings.load(use_cache=False)
 
     if request.method == 'POST':
         form = TelegramSettingsForm(request.POST, instance=settings_obj)
@@ -304,7 +729,7 @@ def statistics_page(request):
 @api_view(['GET', 'POST'])
 def order_list_create(request):
     if request.method == 'GET':
-        orders = Order.objects.all().order_by('-created_at')
+        orders = Order.objects.with_active_items().order_by('-created_at')
         serializer = OrderSerializer(orders, many=True)
         return Response(serializer.data)
 
@@ -349,40 +774,101 @@ def user_catalog(request):
     serializer = UserSimpleSerializer(users, many=True)
     return Response(serializer.data)
 
+# === Статистика: кэш, условный GET и объединение одновременных запросов ===
+# Сколько секунд хранить посчитанную статистику одной версии
+STATISTICS_CACHE_TTL = 30
+# Сколько секунд остальные запросы ждут, пока первый считает статистику
+STATISTICS_LOCK_TIMEOUT = 10
+STATISTICS_WAIT_STEP = 0.05
+
+def statistics_etag(request):
+    """
+    ETag статистики: версия сводок + текущая дата (от нее зависят
+    'created_today' и график за 7 дней). Версия запоминается в запросе,
+    чтобы view не читала ее второй раз.
+    """
+    version = f"{timezone.localdate().isoformat()}:{daily_stats_version()}"
+    request.statistics_version = version
+    return hashlib.md5(version.encode()).hexdigest()
+
+def get_statistics_payload(version):
+    """
+    Возвращает статистику версии version из кэша. При промахе считает ее
+    только один запрос (блокировка через cache.add), остальные ждут
+    его результат, а не считают те же агрегаты параллельно.
+    """
+    key = f'statistics:{version}'
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    lock_key = f'{key}:lock'
+    deadline = time.monotonic() + STATISTICS_LOCK_TIMEOUT
+    locked = cache.add(lock_key, True, STATISTICS_LOCK_TIMEOUT)
+    while not locked:
+        time.sleep(STATISTICS_WAIT_STEP)
+        data = cache.get(key)
+        if data is not None:
+            return data
+        if time.monotonic() > deadline:
+            break  # Считающий запрос завис или упал - считаем сами
+        locked = cache.add(lock_key, True, STATISTICS_LOCK_TIMEOUT)
+
+    try:
+        data = build_statistics_payload()
+        cache.set(key, data, STATISTICS_CACHE_TTL)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return data
+
 @api_view(['GET'])
+@condition(etag_func=statistics_etag)
 def statistics_data_view(request):
-    total_orders = Order.objects.count()
-    pending_orders = Order.objects.filter(status='in-progress').count()
-    
-    today = date.today()
-    created_today = Order.objects.filter(created_at__date=today).count()
-    
-    top_product_query = Item.objects.values('name') \
-                            .annotate(name_count=Count('name')) \
-                            .order_by('-name_count') \
-                            .first()
+    # Версию уже прочитал statistics_etag (декоратор condition);
+    # если ETag совпал с If-None-Match, сюда не дойдем - ответ 304
+    response = Response(get_statistics_payload(request.statistics_version))
+    # Браузер хранит ответ, но каждый раз сверяет ETag (получая 304)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+def build_statistics_payload():
+    # Все показатели читаются из дневных сводок (DailyStats, DailyProductStats),
+    # которые обновляются при каждом изменении заказа. Запросы не зависят
+    # от числа заказов и товаров - только от числа дней / названий.
+    totals = DailyStats.objects.aggregate(
+        created=Sum('orders_created'),
+        deleted=Sum('orders_deleted'),
+        **{status: Sum(field) for status, field in DailyStats.STATUS_DELTA_FIELDS.items()}
+    )
+    total_orders = (totals['created'] or 0) - (totals['deleted'] or 0)
+    status_counts = {
+        status: totals[status]
+        for status in sorted(DailyStats.STATUS_DELTA_FIELDS)
+        if totals[status]
+    }
+    pending_orders = status_counts.get('in-progress', 0)
+
+    today = timezone.localdate()
+    seven_days_ago = today - timedelta(days=6)
+
+    activity_data_dict = { (today - timedelta(days=i)): 0 for i in range(7) }
+    for row in DailyStats.objects.filter(day__gte=seven_days_ago, day__lte=today):
+        activity_data_dict[row.day] = row.orders_created - row.orders_deleted
+    created_today = activity_data_dict[today]
+
+    top_product_query = DailyProductStats.objects.values('name') \
+                                         .annotate(name_count=Sum('items_delta')) \
+                                         .filter(name_count__gt=0) \
+                                         .order_by('-name_count') \
+                                         .first()
     top_product_name = top_product_query['name'] if top_product_query else "Нет"
 
-    status_counts_query = Order.objects.values('status') \
-                                 .annotate(count=Count('status')) \
-                                 .order_by('status')
-    
     status_data = {
-        'labels': [item['status'] for item in status_counts_query],
-        'counts': [item['count'] for item in status_counts_query],
+        'labels': list(status_counts),
+        'counts': list(status_counts.values()),
     }
 
-    seven_days_ago = today - timedelta(days=6)
-    
-    activity_query = Order.objects.filter(created_at__date__gte=seven_days_ago) \
-                            .values('created_at__date') \
-                            .annotate(count=Count('id')) \
-                            .order_by('created_at__date')
-    
-    activity_data_dict = { (today - timedelta(days=i)): 0 for i in range(7) }
-    for item in activity_query:
-        activity_data_dict[item['created_at__date']] = item['count']
-        
     sorted_activity = sorted(activity_data_dict.items())
     activity_data = {
         'labels': [day.strftime('%d.%m') for day, count in sorted_activity],
@@ -399,7 +885,62 @@ def statistics_data_view(request):
         'activity_last_7_days': activity_data,
     }
     
-    return Response(data)
+    return data
+
+# === События заказов (Server-Sent Events) ===
+# Как часто слать комментарий-пинг, чтобы прокси не закрыли тихое соединение
+EVENTS_KEEPALIVE = 20
+
+async def order_events_view(request):
+    """
+    GET /api/order-events/ - поток SSE: "order.changed" / "order.deleted"
+    с order_id. Само событие лишь сигнал, данные клиент забирает
+    из /api/orders/changes/. Асинхронная view: сотни простаивающих
+    соединений держит event loop ASGI-сервера, а не потоки.
+    Под WSGI поток не открывается (ответ 204, браузер не переподключается):
+    клиент продолжает опрашивать /api/orders/changes/.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    # request.auser() есть только с Django 5.0; ленивый request.user
+    # читает сессию из базы - в потоке для синхронного кода
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not is_authenticated:
+        return HttpResponse(status=403)
+
+    queue = await broker.subscribe()
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {payload}\n\n"
+        finally:
+            broker.unsubscribe(queue)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: не буферизовать поток
+    return response
+
+# === Метрики (Prometheus) ===
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+@api_view(['GET'])
+def metrics_view(request):
+    """
+    GET /api/_metrics - метрики этого процесса в формате Prometheus
+    (см. orders/metrics.py). Только для суперпользователей; Prometheus
+    может авторизоваться через Basic Auth.
+    """
+    if not request.user.is_superuser:
+        raise PermissionDenied("Метрики доступны только администраторам.")
+    return HttpResponse(metrics_registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
 
 @login_required
 def archive_page_view(request):
@@ -5,6 +5,12 @@ let orders = [];
 let productCatalog = []; 
 let userCatalog = [];
 let currentEditingOrderId = null;
+let nextOrdersUrl = null; // Курсор следующей страницы заказов (от сервера)
+let searchDebounceTimer = null;
+let changesCursor = null; // Курсор ленты изменений /api/orders/changes/
+const CHANGES_POLL_INTERVAL = 5000; // Как часто подтягивать изменения, если нет потока SSE
+let changesPollTimer = null;
+let changesSyncTimer = null;
 
 // Настройки теперь загружаются из 'base.html' (window.USER_SETTINGS)
 let soundEnabled = window.USER_SETTINGS.soundEnabled;
@@ -55,6 +61,7 @@ const resetFiltersBtn = document.getElementById('resetFiltersBtn');
 const searchInput = document.getElementById('searchInput');
 const statusFilter = document.getElementById('statusFilter');
 const urgencyFilter = document.getElementById('urgencyFilter');
+const loadMoreBtn = document.getElementById('loadMoreBtn');
 const avatarBtn = document.getElementById('avatarBtn');
 const profileDropdownMenu = document.getElementById('profileDropdownMenu');
 
@@ -78,27 +85,32 @@ document.addEventListener('DOMContentLoaded', () => {
     });
     if (showReadyBtn) showReadyBtn.addEventListener('click', () => {
         statusFilter.value = 'ready';
-        renderOrders();
+        loadOrders();
         updateQuickFilterButtons('ready');
     });
     if (showNotReadyBtn) showNotReadyBtn.addEventListener('click', () => {
         statusFilter.value = 'not-ready';
-        renderOrders();
+        loadOrders();
         updateQuickFilterButtons('not-ready');
     });
     if (resetFiltersBtn) resetFiltersBtn.addEventListener('click', () => {
         searchInput.value = '';
         statusFilter.value = 'all';
         urgencyFilter.value = 'all';
-        renderOrders();
+        loadOrders();
         updateQuickFilterButtons('all');
     });
-    if (searchInput) searchInput.addEventListener('input', renderOrders);
+    // Поиск идет на сервере, поэтому ждем паузу в наборе текста
+    if (searchInput) searchInput.addEventListener('input', () => {
+        clearTimeout(searchDebounceTimer);
+        searchDebounceTimer = setTimeout(() => loadOrders(), 300);
+    });
     if (statusFilter) statusFilter.addEventListener('change', () => {
-        renderOrders();
+        loadOrders();
         updateQuickFilterButtons('');
     });
-    if (urgencyFilter) urgencyFilter.addEventListener('change', renderOrders);
+    if (urgencyFilter) urgencyFilter.addEventListener('change', () => loadOrders());
+    if (loadMoreBtn) loadMoreBtn.addEventListener('click', () => loadOrders(true));
     if (avatarBtn) avatarBtn.addEventListener('click', () => {
         profileDropdownMenu.style.display = profileDropdownMenu.style.display === 'block' ? 'none' : 'block';
     });
@@ -166,25 +178,30 @@ document.addEventListener('DOMContentLoaded', () => {
     // Периодическая проверка срочных заказов
     setInterval(checkUrgentOrders, 300000); // Каждые 5 минут
 
+    // Изменения заказов (в том числе от других операторов)
+    if (ordersTableBody) connectOrderEvents();
+
 }); // <-- Это закрывающая скобка для 'DOMContentLoaded'
 
 async function initApp() {
     try {
-        const [ordersData, productsData, usersData] = await Promise.all([
-            fetch('/api/orders/'),
+        const [productsData, usersData] = await Promise.all([
             fetch('/api/products/'),
             fetch('/api/users/') 
         ]);
         
-        if (!ordersData.ok) throw new Error('Ошибка загрузки заказов');
         if (!productsData.ok) throw new Error('Ошибка загрузки товаров');
         if (!usersData.ok) throw new Error('Ошибка загрузки пользователей'); 
         
-        orders = await ordersData.json();
         productCatalog = await productsData.json();
         userCatalog = await usersData.json(); 
         
-        renderOrders();
+        // Курсор берется ДО загрузки списка: изменения между ними не потеряются.
+        // Таблица заказов есть только на главной странице
+        if (ordersTableBody) {
+            await resetChangesCursor();
+            await loadOrders();
+        }
         checkUrgentOrders();
         
     } catch (error) {
@@ -192,8 +209,10 @@ async function initApp() {
         showNotification('Ошибка', 'Не удалось загрузить данные с сервера', 'error');
     }
     
+    // Только поля срока товара: фильтры дат на странице архива
+    // должны принимать прошлые даты
     const today = new Date().toISOString().split('T')[0];
-    document.querySelectorAll('input[type="date"]').forEach(input => {
+    document.querySelectorAll('.item-deadline-input').forEach(input => {
         input.setAttribute('min', today);
     });
     resetNotificationTracking();
@@ -202,33 +221,148 @@ async function initApp() {
 
 // --- Основные функции ---
 
+// Собирает URL списка заказов с текущими фильтрами.
+// Фильтрация и поиск выполняются на сервере (SQL). При поиске заказы
+// приходят из /api/orders/search/ - самые релевантные первыми.
+function buildOrdersUrl() {
+    const params = new URLSearchParams();
+    const searchTerm = searchInput ? searchInput.value.trim() : '';
+    if (searchTerm) params.set('q', searchTerm);
+    if (statusFilter && statusFilter.value !== 'all') params.set('status', statusFilter.value);
+    if (urgencyFilter && urgencyFilter.value !== 'all') params.set('urgency', urgencyFilter.value);
+    const query = params.toString();
+    if (searchTerm) return `/api/orders/search/?${query}`;
+    return query ? `/api/orders/?${query}` : '/api/orders/';
+}
+
+// Загружает первую страницу заказов (или следующую, если append = true)
+async function loadOrders(append = false) {
+    const url = append ? nextOrdersUrl : buildOrdersUrl();
+    if (!url) return;
+
+    try {
+        const response = await fetch(url);
+        if (!response.ok) throw new Error('Ошибка загрузки заказов');
+        const page = await response.json();
+
+        orders = append ? orders.concat(page.results) : page.results;
+        nextOrdersUrl = page.next;
+
+        if (loadMoreBtn) loadMoreBtn.style.display = nextOrdersUrl ? 'inline-flex' : 'none';
+        renderOrders();
+    } catch (error) {
+        console.error(error);
+        showNotification('Ошибка', 'Не удалось загрузить заказы', 'error');
+    }
+}
+
+// Есть ли активные фильтры / поиск (список тогда собран на сервере по ним)
+function hasActiveFilters() {
+    return buildOrdersUrl() !== '/api/orders/';
+}
+
+async function resetChangesCursor() {
+    const response = await fetch('/api/orders/changes/');
+    if (response.ok) changesCursor = (await response.json()).cursor;
+}
+
+function startChangesPolling() {
+    if (!changesPollTimer) changesPollTimer = setInterval(syncOrderChanges, CHANGES_POLL_INTERVAL);
+}
+
+function stopChangesPolling() {
+    clearInterval(changesPollTimer);
+    changesPollTimer = null;
+}
+
+// Поток событий SSE: сервер сообщает об изменении заказа, и мы сразу
+// забираем изменения. Если поток недоступен (сервер под WSGI отвечает 204,
+// обрыв сети), работает опрос раз в CHANGES_POLL_INTERVAL.
+function connectOrderEvents() {
+    if (!window.EventSource) {
+        startChangesPolling();
+        return;
+    }
+    const source = new EventSource('/api/order-events/');
+    source.onopen = () => {
+        stopChangesPolling();
+        syncOrderChanges(); // Догоняем то, что могли пропустить до подключения
+    };
+    source.onmessage = () => {
+        // Одно изменение часто порождает несколько событий - объединяем их
+        clearTimeout(changesSyncTimer);
+        changesSyncTimer = setTimeout(syncOrderChanges, 200);
+    };
+    source.onerror = () => startChangesPolling(); // Браузер переподключится сам
+}
+
+// Подтягивает только заказы, измененные или удаленные после changesCursor
+async function syncOrderChanges() {
+    if (!changesCursor) return;
+
+    let data;
+    try {
+        const response = await fetch(`/api/orders/changes/?since=${changesCursor}`);
+        if (!response.ok) return;
+        data = await response.json();
+    } catch (error) {
+        return; // Сеть недоступна - попробуем в следующий раз
+    }
+    changesCursor = data.cursor;
+
+    if (data.reset) {
+        await loadOrders();
+        return;
+    }
+
+    const deleted = new Set(data.deleted);
+    const touchesList = data.deleted.some(id => orders.some(o => o.id === id)) ||
+                        data.orders.some(changed => orders.some(o => o.id === changed.id));
+
+    // В отфильтрованном списке заказ показывает только подходящие товары -
+    // проще перезагрузить первую страницу, чем повторять фильтр на клиенте
+    if (hasActiveFilters()) {
+        if (touchesList) await loadOrders();
+        return;
+    }
+
+    let changed = false;
+    orders = orders.filter(o => {
+        if (!deleted.has(o.id)) return true;
+        changed = true;
+        return false;
+    });
+    data.orders.forEach(updated => {
+        if (deleted.has(updated.id)) return;
+        const index = orders.findIndex(o => o.id === updated.id);
+        if (index === -1) {
+            // Старый заказ за пределами загруженных страниц придет с "Показать еще"
+            const oldest = orders[orders.length - 1];
+            if (nextOrdersUrl && oldest && new Date(updated.created_at) < new Date(oldest.created_at)) return;
+            orders.push(updated);
+            changed = true;
+        } else if (JSON.stringify(orders[index]) !== JSON.stringify(updated)) {
+            orders[index] = updated;
+            changed = true;
+        }
+    });
+
+    if (changed) {
+        orders.sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
+        renderOrders();
+    }
+}
+
 function renderOrders() {
     if (!ordersTableBody) return; 
 
-    const searchTerm = searchInput.value.toLowerCase();
-    const statusValue = statusFilter.value;
-    const urgencyValue = urgencyFilter.value;
-    
     ordersTableBody.innerHTML = '';
     let hasVisibleRows = false; 
     
     orders.forEach(order => {
         
-        // --- 1. СНАЧАЛА ФИЛЬТРУЕМ ТОВАРЫ ---
-        const visibleItems = order.items.filter(item => {
-            const matchesSearch = searchTerm === '' || 
-                order.client.toLowerCase().includes(searchTerm) ||
-                item.name.toLowerCase().includes(searchTerm);
-                
-            const matchesStatus = statusValue === 'all' || item.status === statusValue;
-            
-            const daysUntilDeadline = getDaysUntilDeadline(item.deadline);
-            let matchesUrgency = urgencyValue === 'all';
-            if (urgencyValue === 'urgent') matchesUrgency = daysUntilDeadline <= 2 && daysUntilDeadline >= 0;
-            else if (urgencyValue === 'very-urgent') matchesUrgency = daysUntilDeadline <= 1 && daysUntilDeadline >= 0;
-            
-            return matchesSearch && matchesStatus && matchesUrgency;
-        });
+        // --- 1. Товары уже отфильтрованы сервером ---
+        const visibleItems = order.items;
 
         // --- 2. РЕНДЕРИМ ВИДИМЫЕ ТОВАРЫ ---
         if (visibleItems.length > 0) {
@@ -278,8 +412,7 @@ function renderOrders() {
                     <td class="${cellClasses}">
                         <span class="item-status ${item.status}" 
                               data-order-id="${order.id}" 
-                              data-item-name="${item.name}" 
-                              data-item-quantity="${item.quantity}">
+                              data-item-id="${item.id}">
                             ${getStatusText(item.status)}
                         </span>
                     </td>
@@ -287,8 +420,7 @@ function renderOrders() {
                         <div class="responsible-dropdown">
                             <button class_ ="responsible-current" 
                                     data-order-id="${order.id}" 
-                                    data-item-name="${item.name}" 
-                                    data-item-quantity="${item.quantity}">
+                                    data-item-id="${item.id}">
                                 <span>${responsible}</span>
                                 <i class="fas fa-chevron-down"></i>
                             </button>
@@ -332,9 +464,8 @@ function renderOrders() {
     document.querySelectorAll('.item-status').forEach(span => {
         span.addEventListener('click', function() {
             const orderId = parseInt(this.getAttribute('data-order-id'));
-            const itemName = this.getAttribute('data-item-name');
-            const itemQuantity = parseInt(this.getAttribute('data-item-quantity'));
-            toggleItemStatus(orderId, itemName, itemQuantity); 
+            const itemId = parseInt(this.getAttribute('data-item-id'));
+            toggleItemStatus(orderId, itemId); 
         });
     });
     
@@ -357,10 +488,9 @@ function renderOrders() {
             e.stopPropagation(); 
             
             const orderId = parseInt(this.getAttribute('data-order-id'));
-            const itemName = this.getAttribute('data-item-name');
-            const itemQuantity = parseInt(this.getAttribute('data-item-quantity'));
+            const itemId = parseInt(this.getAttribute('data-item-id'));
             
-            showResponsibleDropdown(this, orderId, itemName, itemQuantity);
+            showResponsibleDropdown(this, orderId, itemId);
         });
     });
 } // --- КОНЕЦ ФУНКЦИИ RENDERORDERS ---
@@ -401,7 +531,8 @@ function openOrderModal(orderId = null) {
                 item.deadline, 
                 index + 1,
                 respId,
-                item.comment
+                item.comment,
+                item.id
             );
             itemsFormContainer.appendChild(itemCard);
         });
@@ -450,9 +581,12 @@ function addItemRow() {
 // 
 // 👇👇👇 ГЛАВНЫЕ ИЗМЕНЕНИЯ - в `createItemFormCard` 👇👇👇
 //
-function createItemFormCard(name, quantity, status, deadline, itemNumber, responsibleUserId, comment = '') {
+function createItemFormCard(name, quantity, status, deadline, itemNumber, responsibleUserId, comment = '', itemId = null) {
     const template = document.getElementById('itemFormTemplate');
     const itemCard = template.content.cloneNode(true).firstElementChild;
+
+    // ID существующего товара: сервер обновит его, а не создаст заново
+    if (itemId) itemCard.dataset.itemId = itemId;
     
     // Находим все нужные элементы внутри карточки
     const badge = itemCard.querySelector('.item-number');
@@ -602,14 +736,18 @@ async function saveOrder() {
             allFieldsValid = false;
         }
         
-        items.push({ 
+        const itemData = { 
             name: productName, 
             quantity, 
             status, 
             deadline,
             comment: comment, 
             responsible_user_id: responsibleUserId ? parseInt(responsibleUserId) : null
-        });
+        };
+        if (currentEditingOrderId && card.dataset.itemId) {
+            itemData.id = parseInt(card.dataset.itemId);
+        }
+        items.push(itemData);
     });
     
     if (items.length === 0) {
@@ -658,8 +796,7 @@ async function saveOrder() {
             orders[orderIndex] = savedOrder;
             showNotification('Успешно', 'Заказ обновлен', 'success');
         } else {
-            orders.push(savedOrder);
-            orders.sort((a, b) => new Date(b.created_at) - new Date(a.created_at)); // Сортируем
+            orders.unshift(savedOrder); // Новые заказы - сверху, как и на сервере
             showNotification('Успешно', 'Заказ добавлен', 'success');
         }
         
@@ -702,17 +839,45 @@ async function deleteOrder(orderId) {
     }
 }
 
-async function toggleItemStatus(orderId, itemName, itemQuantity) {
+// Точечное обновление одного товара через /api/items/<id>/transition/.
+// Возвращает true, если сервер принял изменение.
+async function sendItemTransition(orderId, itemId, changes) {
+    const response = await fetch(`/api/items/${itemId}/transition/`, {
+        method: 'PATCH',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': csrftoken
+        },
+        body: JSON.stringify(changes)
+    });
+
+    // 409 - товар уже изменил кто-то другой: сервер прислал актуальное состояние
+    if (!response.ok && response.status !== 409) {
+        throw new Error('Ошибка обновления товара');
+    }
+
+    const result = await response.json();
+    const order = orders.find(o => o.id === orderId);
+    if (order) {
+        const itemIndex = order.items.findIndex(i => i.id === itemId);
+        if (itemIndex !== -1) order.items[itemIndex] = result.item;
+        order.status = result.order_status;
+    }
+    renderOrders();
+    return response.ok;
+}
+
+async function toggleItemStatus(orderId, itemId) {
     const order = orders.find(o => o.id === orderId);
     if (!order) return;
 
-    // Находим правильный товар (по имени и кол-ву, как раньше)
-    const item = order.items.find(i => i.name === itemName && i.quantity === itemQuantity);
+    const item = order.items.find(i => i.id === itemId);
     if (!item) return;
     
     // Логика смены статуса
-    if (item.status === 'not-ready') item.status = 'in-progress';
-    else if (item.status === 'in-progress') item.status = 'ready';
+    const oldStatus = item.status;
+    if (oldStatus === 'not-ready') item.status = 'in-progress';
+    else if (oldStatus === 'in-progress') item.status = 'ready';
     else item.status = 'not-ready';
 
     // Обновляем вид
@@ -720,49 +885,22 @@ async function toggleItemStatus(orderId, itemName, itemQuantity) {
             
     if (soundEnabled) playNotificationSound();
 
-    // Отправляем изменения на сервер
+    // Отправляем на сервер только этот товар
     try {
-        const itemsForApi = order.items.map(i => {
-            return {
-                name: i.name,
-                quantity: i.quantity,
-                status: i.status,
-                deadline: i.deadline,
-                comment: i.comment, 
-                responsible_user_id: i.responsible_user ? i.responsible_user.id : null
-            };
-        });
-    
-        const response = await fetch(`/api/orders/${orderId}/`, {
-            method: 'PUT',
-            headers: {
-                'Content-Type': 'application/json',
-                'X-CSRFToken': csrftoken
-            },
-            body: JSON.stringify({
-                client: order.client,
-                items_write: itemsForApi
-            })
+        const accepted = await sendItemTransition(orderId, itemId, {
+            status: item.status,
+            expected_status: oldStatus
         });
-
-        if (!response.ok) {
-            throw new Error('Ошибка обновления статуса');
+        if (!accepted) {
+            showNotification('Внимание', 'Статус товара уже изменил другой пользователь', 'warning');
         }
-        
-        const updatedOrderFromServer = await response.json();
-        const orderIndex = orders.findIndex(o => o.id === orderId);
-        if (orderIndex !== -1) {
-            orders[orderIndex] = updatedOrderFromServer;
-        }
-        renderOrders();
-
     } catch (error) {
         console.error(error);
         showNotification('Ошибка', 'Не удалось обновить статус на сервере', 'error');
     }
 }
 
-function showResponsibleDropdown(buttonElement, orderId, itemName, itemQuantity) {
+function showResponsibleDropdown(buttonElement, orderId, itemId) {
     document.querySelectorAll('.responsible-menu').forEach(menu => menu.remove());
 
     const menu = document.createElement('div');
@@ -779,7 +917,7 @@ function showResponsibleDropdown(buttonElement, orderId, itemName, itemQuantity)
         
         userBtn.onclick = (e) => {
             e.stopPropagation();
-            updateResponsibleUser(orderId, itemName, itemQuantity, user.id);
+            updateResponsibleUser(orderId, itemId, user.id);
             menu.remove();
         };
         menu.appendChild(userBtn);
@@ -804,11 +942,11 @@ function showResponsibleDropdown(buttonElement, orderId, itemName, itemQuantity)
 }
 
 
-async function updateResponsibleUser(orderId, itemName, itemQuantity, newUserId) {
+async function updateResponsibleUser(orderId, itemId, newUserId) {
     const order = orders.find(o => o.id === orderId);
     if (!order) return;
 
-    const item = order.items.find(i => i.name === itemName && i.quantity === itemQuantity);
+    const item = order.items.find(i => i.id === itemId);
     if (!item) return;
 
     const newUser = userCatalog.find(u => u.id === newUserId);
@@ -824,36 +962,7 @@ async function updateResponsibleUser(orderId, itemName, itemQuantity, newUserId)
     renderOrders(); // Сначала обновляем локально
 
     try {
-        const itemsForApi = order.items.map(i => ({
-            name: i.name,
-            quantity: i.quantity,
-            status: i.status,
-            deadline: i.deadline,
-            comment: i.comment, 
-            responsible_user_id: i.responsible_user ? i.responsible_user.id : null
-        }));
-
-        const response = await fetch(`/api/orders/${orderId}/`, {
-            method: 'PUT',
-            headers: {
-                'Content-Type': 'application/json',
-                'X-CSRFToken': csrftoken
-            },
-            body: JSON.stringify({
-                client: order.client,
-                items_write: itemsForApi
-            })
-        });
-
-        if (!response.ok) throw new Error('Ошибка обновления ответственного');
-
-        const updatedOrderFromServer = await response.json();
-        const orderIndex = orders.findIndex(o => o.id === orderId);
-        if (orderIndex !== -1) {
-            orders[orderIndex] = updatedOrderFromServer;
-        }
-        renderOrders(); // Повторно рендерим с данными с сервера
-
+        await sendItemTransition(orderId, itemId, { responsible_user_id: newUserId });
     } catch (error) {
         console.error(error);
         showNotification('Ошибка', 'Не удалось обновить ответственного', 'error');
@@ -894,39 +1003,33 @@ function getDaysUntilDeadline(deadline) {
     return Math.ceil(diffTime / (1000 * 60 * 60 * 24));
 }
 
-function checkUrgentOrders() {
-    const today = new Date();
-    today.setHours(0, 0, 0, 0);
-    const tomorrow = new Date(today);
-    tomorrow.setDate(tomorrow.getDate() + 1);
+// Срочные товары считает сервер (/api/items/urgent/): не нужно держать
+// в памяти все заказы, чтобы найти сроки на сегодня и завтра
+async function checkUrgentOrders() {
+    let urgentItems;
+    try {
+        const response = await fetch(`/api/items/urgent/?days=${dayBeforeEnabled ? 1 : 0}`);
+        if (!response.ok) return;
+        urgentItems = await response.json();
+    } catch (error) {
+        return;
+    }
+
     let urgentOrders = [];
-    
-    orders.forEach(order => {
-        order.items.forEach(item => {
-            if (item.status === 'ready') return; // Игнорируем готовые
-            
-            const deadlineDate = new Date(item.deadline);
-            deadlineDate.setHours(0, 0, 0, 0);
-            
-            if (deadlineDate.getTime() === today.getTime()) {
-                if (!notificationShownToday.has(`today-${order.id}-${item.name}`)) {
-                    urgentOrders.push({ order, item, type: 'today' });
-                    notificationShownToday.add(`today-${order.id}-${item.name}`);
-                }
-            } else if (deadlineDate.getTime() === tomorrow.getTime() && dayBeforeEnabled) {
-                if (!notificationShownToday.has(`tomorrow-${order.id}-${item.name}`)) {
-                    urgentOrders.push({ order, item, type: 'tomorrow' });
-                    notificationShownToday.add(`tomorrow-${order.id}-${item.name}`);
-                }
-            }
-        });
+    urgentItems.forEach(item => {
+        const type = item.days_left === 0 ? 'today' : 'tomorrow';
+        const key = `${type}-${item.id}`;
+        if (!notificationShownToday.has(key)) {
+            urgentOrders.push({ item, type });
+            notificationShownToday.add(key);
+        }
     });
     
     if (urgentOrders.length > 0 && popupEnabled) {
         let message = '';
-        urgentOrders.forEach(({ order, item, type }) => {
+        urgentOrders.forEach(({ item, type }) => {
             const deadlineText = type === 'today' ? 'сегодня' : 'завтра';
-            message += `Заказ №${order.id} (${order.client}) - "${item.name}" - ${deadlineText}\n`;
+            message += `Заказ №${item.order_id} (${item.client}) - "${item.name}" - ${deadlineText}\n`;
         });
         showNotification('Внимание! Срок сдачи товаров', message.trim(), 'warning');
         if (soundEnabled) playNotificationSound();
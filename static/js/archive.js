@@ -0,0 +1,77 @@
+// D:\Projects\EcoPrint\static\js\archive.js
+
+// Архив читается постранично по курсору (/api/archive/): следующую
+// страницу сервер отдает ссылкой 'next', весь архив никогда не грузится
+let archiveNextUrl = null;
+let archiveDebounceTimer = null;
+
+document.addEventListener('DOMContentLoaded', () => {
+    const clientInput = document.getElementById('archiveClientInput');
+    const dateFrom = document.getElementById('archiveDateFrom');
+    const dateTo = document.getElementById('archiveDateTo');
+    const loadMoreBtn = document.getElementById('archiveLoadMoreBtn');
+
+    clientInput.addEventListener('input', () => {
+        clearTimeout(archiveDebounceTimer);
+        archiveDebounceTimer = setTimeout(() => loadArchive(), 300);
+    });
+    dateFrom.addEventListener('change', () => loadArchive());
+    dateTo.addEventListener('change', () => loadArchive());
+    loadMoreBtn.addEventListener('click', () => loadArchive(true));
+
+    loadArchive();
+});
+
+function buildArchiveUrl() {
+    const params = new URLSearchParams();
+    const client = document.getElementById('archiveClientInput').value.trim();
+    const dateFrom = document.getElementById('archiveDateFrom').value;
+    const dateTo = document.getElementById('archiveDateTo').value;
+    if (client) params.set('client', client);
+    if (dateFrom) params.set('date_from', dateFrom);
+    if (dateTo) params.set('date_to', dateTo);
+    const query = params.toString();
+    return query ? `/api/archive/?${query}` : '/api/archive/';
+}
+
+async function loadArchive(append = false) {
+    const url = append ? archiveNextUrl : buildArchiveUrl();
+    if (!url) return;
+
+    const tableBody = document.getElementById('archiveTableBody');
+    try {
+        const response = await fetch(url);
+        if (!response.ok) throw new Error(`Ошибка сети: ${response.status}`);
+        const page = await response.json();
+
+        if (!append) tableBody.innerHTML = '';
+        page.results.forEach(item => tableBody.appendChild(renderArchiveRow(item)));
+        archiveNextUrl = page.next;
+
+        document.getElementById('archiveLoadMoreBtn').style.display = archiveNextUrl ? 'inline-flex' : 'none';
+        document.getElementById('archiveEmptyState').style.display = tableBody.children.length ? 'none' : 'block';
+    } catch (error) {
+        console.error('Не удалось загрузить архив:', error);
+        showNotification('Ошибка', 'Не удалось загрузить архив', 'error');
+    }
+}
+
+function renderArchiveRow(item) {
+    const row = document.createElement('tr');
+    const cells = [
+        `№${item.order_id}`,
+        item.client,
+        item.name,
+        item.quantity,
+        formatDate(item.deadline),
+        getStatusText(item.status),
+        formatDate(item.ready_at),
+        formatDate(item.archived_at),
+    ];
+    cells.forEach(value => {
+        const cell = document.createElement('td');
+        cell.textContent = value;
+        row.appendChild(cell);
+    });
+    return row;
+}